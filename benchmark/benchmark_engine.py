@@ -0,0 +1,101 @@
+# -*- coding: latin-1 -*-
+
+import copy
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import simulation, converter, engine
+
+'''
+    benchmark_engine
+    ~~~~~~~~~~~~~~~~
+
+    Measure the time taken by the engine of Senesc-Wheat on a large canopy.
+
+    The engine is timed on states built once, outside of the timed runs, so that the numbers of threads can be compared.
+    The time of :meth:`simulation.Simulation.run_steps`, which also converts the inputs to states and the states to outputs, is reported apart.
+
+    The canopy is built by replicating the test inputs: each plant gets the element of the test inputs, turned into
+    senescing elements of all the ranks. Run this script from the directory `benchmark` with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+'''
+
+# inputs paths
+INPUTS_DIRPATH = os.path.join('..', 'test', 'inputs')
+
+ROOTS_INPUTS_FILENAME = 'roots_inputs.csv'
+AXES_INPUTS_FILENAME = 'axes_inputs.csv'
+ELEMENTS_INPUTS_FILENAME = 'elements_inputs.csv'
+
+# size of the canopy and of the run
+NB_PLANTS = 2000
+NB_STEPS = 50
+
+# the numbers of threads to benchmark
+NB_THREADS = (1, 2, 4, 8)
+
+
+def make_canopy_inputs(nb_plants):
+    """Replicate the test inputs to get a canopy of `nb_plants` plants with 11 senescing blades and sheaths by plant."""
+    roots_inputs_df = pd.read_csv(os.path.join(INPUTS_DIRPATH, ROOTS_INPUTS_FILENAME))
+    axes_inputs_df = pd.read_csv(os.path.join(INPUTS_DIRPATH, AXES_INPUTS_FILENAME))
+    elements_inputs_df = pd.read_csv(os.path.join(INPUTS_DIRPATH, ELEMENTS_INPUTS_FILENAME))
+    elements_inputs_df['is_growing'] = False
+    elements_inputs_df['senesced_length_element'] = 0.
+    elements_inputs_df['age'] = 500.
+    plants = np.arange(1, nb_plants + 1)
+    all_inputs_df = []
+    for inputs_df, metamers, organs in ((roots_inputs_df, [None], [None]),
+                                        (axes_inputs_df, [None], [None]),
+                                        (elements_inputs_df, range(1, 12), ('blade', 'sheath'))):
+        index = pd.MultiIndex.from_product([plants, metamers, organs], names=['plant', 'metamer', 'organ']).to_frame(index=False)
+        canopy_inputs_df = inputs_df.drop(columns=[column for column in ('plant', 'metamer', 'organ') if column in inputs_df]).merge(index, how='cross')
+        if 'proteins' in canopy_inputs_df:
+            canopy_inputs_df['proteins'] *= np.random.RandomState(0).uniform(0.5, 1.5, len(canopy_inputs_df))
+        all_inputs_df.append(canopy_inputs_df.drop(columns=[column for column in ('metamer', 'organ') if column not in inputs_df]))
+    return converter.from_dataframes(*all_inputs_df)
+
+
+def make_states(inputs):
+    """Convert the inputs to the states of the engine, with the forcings and the parameters of the run."""
+    roots_state = engine.RootsState.from_dict(inputs['roots'])
+    elements_state = engine.ElementsState.from_dict(inputs['elements'])
+    resolved_parameters = engine.resolve_parameters(elements_state)
+    roots_delta_teq = engine.axes_forcings(inputs['axes'], roots_state.axes_ids, 'delta_teq_roots')
+    elements_delta_teq = engine.axes_forcings(inputs['axes'], elements_state.axes_ids, 'delta_teq')
+    return roots_state, elements_state, roots_delta_teq, elements_delta_teq, resolved_parameters
+
+
+if __name__ == '__main__':
+
+    inputs = make_canopy_inputs(NB_PLANTS)
+    nb_elements = len(inputs['elements'])
+    print('{} elements, {} steps'.format(nb_elements, NB_STEPS))
+
+    # the conversions between the inputs and the states, which do not depend on the number of threads, are timed apart
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(inputs))
+    start_time = time.time()
+    simulation_.run_steps(NB_STEPS)
+    simulation_time = time.time() - start_time
+    start_time = time.time()
+    roots_state, elements_state, roots_delta_teq, elements_delta_teq, resolved_parameters = make_states(inputs)
+    conversion_time = time.time() - start_time
+
+    reference_time = None
+    for nb_threads in NB_THREADS:
+        run_roots_state, run_elements_state = roots_state.copy(), elements_state.copy()
+        start_time = time.time()
+        engine.run_steps(run_roots_state, run_elements_state, roots_delta_teq, elements_delta_teq, resolved_parameters, NB_STEPS, nb_threads=nb_threads)
+        elapsed_time = time.time() - start_time
+        reference_time = reference_time or elapsed_time
+        print('{} thread(s): {:.3f} s, {:.0f} element steps/s, speed-up {:.2f}'.format(nb_threads, elapsed_time, nb_elements * NB_STEPS / elapsed_time,
+                                                                                      reference_time / elapsed_time))
+
+    print('Simulation.run_steps, 1 thread: {:.3f} s, of which inputs to states: {:.3f} s'.format(simulation_time, conversion_time))
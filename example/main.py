@@ -55,6 +55,8 @@ if __name__ == '__main__':
     simulation_.initialize(inputs)
     # run the simulation
     simulation_.run()
+    # use the outputs as the inputs of a next step
+    simulation_.apply_outputs()
     # convert the outputs to Pandas dataframes
     roots_outputs_df, SAM_outputs_df, elements_outputs_df = converter.to_dataframes(simulation_.outputs)
     # write the dataframes to CSV
@@ -0,0 +1,249 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+import json
+import struct
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import converter
+
+"""
+    senescwheat.archive
+    ~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.archive` defines a compressed on-disk archive of the outputs of the steps of a run,
+    which can be queried by variable, by roots or element, and by time window.
+
+    An archive holds one table, for example the outputs of the elements, in the layout of :func:`converter.to_dataframes`
+    with the column :attr:`converter.TIME_COLUMN`. The steps are grouped in chunks of consecutive steps.
+    Each variable of a chunk is stored as a block of (steps x ids) values, compressed independently, so that a query
+    only reads and decompresses the blocks of the variables and the chunks it needs.
+    An index at the end of the file gives the ids (the topology), the times of each chunk and the position of each block.
+
+    The layout of the file is::
+
+        MAGIC | block | block | ... | index (JSON) | index position (uint64) | MAGIC
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the bytes at the start and at the end of an archive
+MAGIC = b'SWARCH01'
+
+#: the default number of steps by chunk
+DEFAULT_CHUNK_STEPS = 64
+
+#: the name of the block which tells the ids present at each step of a chunk
+PRESENT_BLOCK = '__present__'
+
+_INDEX_POSITION = struct.Struct('<Q')
+
+
+class ArchiveWriter(object):
+    """Write the outputs of the steps of a run to an archive, chunk by chunk.
+
+    The archive is only readable once the writer is closed, which writes the index.
+    """
+
+    def __init__(self, filepath, topology_columns, chunk_steps=DEFAULT_CHUNK_STEPS, compression_level=6):
+        """
+        :param str filepath: the path of the archive. An existing file is overwritten.
+        :param list topology_columns: the columns which define the topology of a row, for example :attr:`converter.ELEMENTS_TOPOLOGY_COLUMNS`.
+        :param int chunk_steps: the number of steps by chunk.
+        :param int compression_level: the zlib compression level, from 0 (no compression) to 9.
+        """
+        #: the path of the archive
+        self.filepath = filepath
+        #: the columns which define the topology of a row
+        self.topology_columns = list(topology_columns)
+        #: the number of steps by chunk
+        self.chunk_steps = chunk_steps
+        self.compression_level = compression_level
+        self._file = open(filepath, 'wb')
+        self._file.write(MAGIC)
+        self._ids = []
+        self._index = {}
+        self._variables = []
+        self._dtypes = {}
+        self._chunks = []
+        self._buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, dataframe):
+        """
+        Append the outputs of one or several steps.
+
+        :param pandas.DataFrame dataframe: the outputs, with one line by step and id: the column :attr:`converter.TIME_COLUMN`,
+                                           the topology columns and one column by variable. The variables of the first
+                                           dataframe written define the variables of the archive.
+        """
+        if not self._variables and not self._ids:
+            self._variables = [column for column in dataframe.columns if column != converter.TIME_COLUMN and column not in self.topology_columns]
+            for name in self._variables:
+                dtype = dataframe[name].dtype
+                self._dtypes[name] = np.dtype(bool) if dtype == bool else np.dtype(float)
+        for t, step_df in dataframe.groupby(converter.TIME_COLUMN, sort=False):
+            positions = []
+            for id_ in step_df[self.topology_columns].itertuples(index=False, name=None):
+                position = self._index.get(id_)
+                if position is None:
+                    position = self._index[id_] = len(self._ids)
+                    self._ids.append(id_)
+                positions.append(position)
+            values = {name: step_df[name].values.astype(self._dtypes[name]) if name in step_df else None for name in self._variables}
+            self._buffer.append((t.item() if hasattr(t, 'item') else t, np.array(positions, dtype=int), values))
+            if len(self._buffer) == self.chunk_steps:
+                self.flush()
+
+    def _write_block(self, array):
+        """Compress and write an array, and return its position and its size in the file."""
+        data = zlib.compress(np.ascontiguousarray(array).tobytes(), self.compression_level)
+        position = self._file.tell()
+        self._file.write(data)
+        return [position, len(data)]
+
+    def flush(self):
+        """Write the steps not written yet as a chunk."""
+        if not self._buffer:
+            return
+        shape = (len(self._buffer), len(self._ids))
+        present = np.zeros(shape, dtype=bool)
+        for step, (_, positions, _) in enumerate(self._buffer):
+            present[step, positions] = True
+        blocks = {PRESENT_BLOCK: self._write_block(present)}
+        for name in self._variables:
+            dtype = self._dtypes[name]
+            block = np.zeros(shape, dtype=dtype) if dtype == bool else np.full(shape, np.nan)
+            for step, (_, positions, values) in enumerate(self._buffer):
+                if values[name] is not None:
+                    block[step, positions] = values[name]
+            blocks[name] = self._write_block(block)
+        self._chunks.append({'times': [t for t, _, _ in self._buffer], 'nb_ids': len(self._ids), 'blocks': blocks})
+        self._buffer = []
+
+    def close(self):
+        """Write the last chunk and the index, and close the archive."""
+        if self._file.closed:
+            return
+        self.flush()
+        index = {'topology_columns': self.topology_columns,
+                 'ids': self._ids,
+                 'variables': [[name, self._dtypes[name].str] for name in self._variables],
+                 'chunks': self._chunks}
+        index_position = self._file.tell()
+        self._file.write(json.dumps(index).encode('utf-8'))
+        self._file.write(_INDEX_POSITION.pack(index_position))
+        self._file.write(MAGIC)
+        self._file.close()
+
+
+class Archive(object):
+    """Read an archive written by :class:`ArchiveWriter`.
+    """
+
+    def __init__(self, filepath):
+        """
+        :param str filepath: the path of the archive.
+        """
+        #: the path of the archive
+        self.filepath = filepath
+        with open(filepath, 'rb') as archive_file:
+            if archive_file.read(len(MAGIC)) != MAGIC:
+                raise ValueError('Not an archive: {}'.format(filepath))
+            archive_file.seek(-(_INDEX_POSITION.size + len(MAGIC)), 2)
+            trailer = archive_file.read()
+            if trailer[_INDEX_POSITION.size:] != MAGIC:
+                raise ValueError('Incomplete archive, its writer was not closed: {}'.format(filepath))
+            index_position, = _INDEX_POSITION.unpack(trailer[:_INDEX_POSITION.size])
+            archive_file.seek(index_position)
+            index = json.loads(archive_file.read()[:-len(trailer)].decode('utf-8'))
+        #: the columns which define the topology of a row
+        self.topology_columns = index['topology_columns']
+        #: the ids of the rows, in the order of their first step
+        self.ids = [tuple(id_) for id_ in index['ids']]
+        #: the position of each id in :attr:`ids`
+        self.index = {id_: position for position, id_ in enumerate(self.ids)}
+        #: the variables, in the order of the columns of the written dataframes
+        self.variables = [name for name, _ in index['variables']]
+        self._dtypes = {name: np.dtype(dtype) for name, dtype in index['variables']}
+        self._chunks = index['chunks']
+        #: the number of blocks decompressed by the queries
+        self.nb_blocks_read = 0
+
+    @property
+    def times(self):
+        """The times of the steps, in writing order."""
+        return [t for chunk in self._chunks for t in chunk['times']]
+
+    def _read_block(self, archive_file, chunk, name):
+        """Read and decompress a block of a chunk."""
+        position, size = chunk['blocks'][name]
+        archive_file.seek(position)
+        self.nb_blocks_read += 1
+        dtype = np.dtype(bool) if name == PRESENT_BLOCK else self._dtypes[name]
+        return np.frombuffer(zlib.decompress(archive_file.read(size)), dtype=dtype).reshape(len(chunk['times']), chunk['nb_ids'])
+
+    def read(self, variables=None, ids=None, start=None, stop=None):
+        """
+        Read a slice of the archive.
+
+        :param list variables: the variables to read. All the variables by default.
+        :param list ids: the ids of the rows to read, for example elements ids. All the ids by default.
+        :param start: the first time to read. From the first step by default.
+        :param stop: the time after the last time to read (excluded). Until the last step by default.
+
+        :return: The outputs, with one line by step and id, sorted by time and topology: the column :attr:`converter.TIME_COLUMN`,
+                 the topology columns and the variables, in the order of the written dataframes.
+        :rtype: pandas.DataFrame
+        """
+        if variables is None:
+            variables = self.variables
+        else:
+            unknown_variables = set(variables).difference(self.variables)
+            if unknown_variables:
+                raise ValueError('Unknown variables: {}'.format(', '.join(sorted(unknown_variables))))
+            variables = [name for name in self.variables if name in variables]
+        if ids is not None:
+            positions = np.array(sorted(self.index[tuple(id_)] for id_ in ids if tuple(id_) in self.index), dtype=int)
+
+        lines_times, lines_positions = [], []
+        data = {name: [] for name in variables}
+        with open(self.filepath, 'rb') as archive_file:
+            for chunk in self._chunks:
+                times = np.array(chunk['times'])
+                steps = np.ones(len(times), dtype=bool)
+                if start is not None:
+                    steps &= times >= start
+                if stop is not None:
+                    steps &= times < stop
+                if not steps.any():
+                    continue
+                chunk_positions = np.arange(chunk['nb_ids']) if ids is None else positions[positions < chunk['nb_ids']]
+                if not len(chunk_positions):
+                    continue
+                present = self._read_block(archive_file, chunk, PRESENT_BLOCK)[steps][:, chunk_positions]
+                step_rows, columns = np.nonzero(present)
+                lines_times.append(times[steps][step_rows])
+                lines_positions.append(chunk_positions[columns])
+                for name in variables:
+                    data[name].append(self._read_block(archive_file, chunk, name)[steps][:, chunk_positions][step_rows, columns])
+
+        lines_positions = np.concatenate(lines_positions) if lines_positions else np.array([], dtype=int)
+        dataframe = pd.DataFrame([self.ids[position] for position in lines_positions], columns=self.topology_columns)
+        dataframe.insert(0, converter.TIME_COLUMN, np.concatenate(lines_times) if lines_times else [])
+        for name in variables:
+            dataframe[name] = np.concatenate(data[name]) if data[name] else np.array([], dtype=self._dtypes[name])
+        dataframe.sort_values([converter.TIME_COLUMN] + self.topology_columns, inplace=True, kind='stable')
+        dataframe.reset_index(drop=True, inplace=True)
+        return dataframe
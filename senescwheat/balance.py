@@ -0,0 +1,182 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import converter
+from senescwheat import parameters
+
+"""
+    senescwheat.balance
+    ~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.balance` checks that the steps of Senesc-Wheat conserve the carbon, the structural mass and the nitrogen of the elements.
+
+    The senescence moves matter between the pools of an element: the starch and the fructan are remobilised as sucrose,
+    the mstruct becomes senesced mstruct, the proteins are remobilised as amino acids or become residual N, and the lost Nstruct is added to the residual N.
+    The sum of the pools of each balance of :attr:`BALANCES` is thus the same before and after a step. The nitrates and the cytokinins
+    of the senesced tissues are lost by the model, and are not part of the balances.
+
+    :class:`BalanceChecker` computes the balances of all the elements at once from the state of the :mod:`engine <senescwheat.engine>`,
+    and their sums by axis. It can check only one step out of `sampling`, to be left on in production.
+    See :attr:`simulation.Simulation.balance_checker`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the balances checked, with the pools of each balance: {balance_name: [(variable_name, factor), ...], ...}.
+#: The factors convert the pools to the same unit: mol C for the carbon, g for the structural mass and g N for the nitrogen.
+BALANCES = {'carbon': [('starch', 1.), ('fructan', 1.), ('sucrose', 1.)],
+            'mstruct': [('mstruct', 1.), ('senesced_mstruct', 1.)],
+            'nitrogen': [('proteins', 'N_MOLAR_MASS'), ('amino_acids', 'N_MOLAR_MASS'), ('Nresidual', 1.), ('Nstruct', 1.)]}
+
+#: the default relative tolerance of the balances
+DEFAULT_RTOL = 1E-9
+
+#: the columns of the dataframes of the violations, after the time and the topology columns
+VIOLATIONS_COLUMNS = ['balance', 'before', 'after']
+
+
+class BalanceChecker(object):
+    """Check the balances of :attr:`BALANCES` for the elements and the axes, and keep the violations.
+
+    A balance is violated when ``abs(after - before) > atol + rtol * abs(before)``. The rows with NaN pools are not checked.
+    """
+
+    def __init__(self, rtol=DEFAULT_RTOL, atol=0., sampling=1, strict=False):
+        """
+        :param float rtol: the relative tolerance of the balances.
+        :param float atol: the absolute tolerance of the balances, in the unit of each balance.
+        :param int sampling: check one step out of `sampling`, from the first one.
+        :param bool strict: True to raise a ValueError at the first step with violations, False to only keep the violations.
+        """
+        #: the relative tolerance of the balances
+        self.rtol = rtol
+        #: the absolute tolerance of the balances
+        self.atol = atol
+        #: check one step out of `sampling`
+        self.sampling = sampling
+        #: True to raise a ValueError at the first step with violations
+        self.strict = strict
+        #: the number of steps offered to :meth:`sample`
+        self.nb_steps = 0
+        #: the number of steps checked
+        self.nb_checked_steps = 0
+        #: the violations of the elements: (t, element_id, balance_name, before, after)
+        self.elements_violations = []
+        #: the violations of the axes: (t, axis_id, balance_name, before, after)
+        self.axes_violations = []
+
+    def sample(self):
+        """
+        Count a step, and tell whether it must be checked.
+
+        :return: True if the step must be checked.
+        :rtype: bool
+        """
+        sampled = self.nb_steps % self.sampling == 0
+        self.nb_steps += 1
+        return sampled
+
+    def pools(self, elements_state):
+        """
+        Compute the balances of the elements.
+
+        :param engine.ElementsState elements_state: the state of the elements, without ensemble dimension.
+
+        :return: The sum of the pools of each element, by balance name.
+        :rtype: dict
+        """
+        columns = elements_state.columns
+        balances = {}
+        for balance_name, pools in BALANCES.items():
+            total = np.zeros(len(elements_state))
+            for variable_name, factor in pools:
+                if factor == 'N_MOLAR_MASS':  # mol N to g N
+                    factor = 1E-6 * parameters.N_MOLAR_MASS
+                total += columns[variable_name] * factor
+            balances[balance_name] = total
+        return balances
+
+    def _violations(self, before, after):
+        with np.errstate(invalid='ignore'):
+            return np.abs(after - before) > self.atol + self.rtol * np.abs(before)
+
+    def check(self, t, elements_state, pools_before):
+        """
+        Check the balances of a step, and keep the violations in :attr:`elements_violations` and :attr:`axes_violations`.
+
+        :param t: the time of the step.
+        :param engine.ElementsState elements_state: the state of the elements after the step, without ensemble dimension.
+        :param dict pools_before: the balances of the elements before the step, as returned by :meth:`pools`.
+
+        :return: The number of violations of the step.
+        :rtype: int
+
+        :raises ValueError: if the balances are violated and :attr:`strict` is True.
+        """
+        self.nb_checked_steps += 1
+        pools_after = self.pools(elements_state)
+        nb_axes = len(elements_state.unique_axes_ids)
+        nb_violations = 0
+        for balance_name in sorted(BALANCES):
+            before, after = pools_before[balance_name], pools_after[balance_name]
+            elements_violations = self._violations(before, after)
+            checked = ~(np.isnan(before) | np.isnan(after))
+            axes_before = np.bincount(elements_state.axes_positions, weights=np.where(checked, before, 0.), minlength=nb_axes)
+            axes_after = np.bincount(elements_state.axes_positions, weights=np.where(checked, after, 0.), minlength=nb_axes)
+            axes_violations = self._violations(axes_before, axes_after)
+            if elements_violations.any() or axes_violations.any():
+                for row in np.flatnonzero(elements_violations):
+                    self.elements_violations.append((t, elements_state.ids[row], balance_name, before[row].item(), after[row].item()))
+                for position in np.flatnonzero(axes_violations):
+                    self.axes_violations.append((t, elements_state.unique_axes_ids[position], balance_name, axes_before[position].item(), axes_after[position].item()))
+                nb_violations += int(elements_violations.sum() + axes_violations.sum())
+        if nb_violations and self.strict:
+            violated_ids = sorted(set(violation[1] for violation in self.elements_violations if violation[0] == t))
+            raise ValueError('Mass balance violated at t={} by the elements: {}'.format(t, ', '.join(map(str, violated_ids))))
+        return nb_violations
+
+    def empty_copy(self):
+        """
+        Return a checker with the same settings and count of steps, but without violations. See :meth:`merge`.
+
+        :return: The new checker.
+        :rtype: BalanceChecker
+        """
+        balance_checker = BalanceChecker(self.rtol, self.atol, self.sampling, self.strict)
+        balance_checker.nb_steps = self.nb_steps
+        balance_checker.nb_checked_steps = self.nb_checked_steps
+        return balance_checker
+
+    def merge(self, other):
+        """
+        Append the violations found by another checker, for example the checker of a worker process, and take its count of steps.
+
+        :param BalanceChecker other: the other checker, as returned by :meth:`empty_copy`.
+        """
+        self.nb_steps = other.nb_steps
+        self.nb_checked_steps = other.nb_checked_steps
+        self.elements_violations.extend(other.elements_violations)
+        self.axes_violations.extend(other.axes_violations)
+
+    def to_dataframes(self):
+        """
+        Convert the violations to dataframes, sorted by time and id.
+
+        :return: One dataframe for the violations of the axes, one dataframe for the violations of the elements,
+                 with the columns :attr:`converter.TIME_COLUMN`, the topology columns and :attr:`VIOLATIONS_COLUMNS`.
+        :rtype: (pandas.DataFrame, pandas.DataFrame)
+        """
+        dataframes = []
+        for violations, topology_columns in ((self.axes_violations, converter.AXES_TOPOLOGY_COLUMNS), (self.elements_violations, converter.ELEMENTS_TOPOLOGY_COLUMNS)):
+            violations_df = pd.DataFrame([(t,) + tuple(id_) + (balance_name, before, after) for t, id_, balance_name, before, after in violations],
+                                         columns=[converter.TIME_COLUMN] + topology_columns + VIOLATIONS_COLUMNS)
+            violations_df.sort_values([converter.TIME_COLUMN] + topology_columns + ['balance'], inplace=True, kind='stable')
+            violations_df.reset_index(drop=True, inplace=True)
+            dataframes.append(violations_df)
+        return tuple(dataframes)
@@ -0,0 +1,239 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+import hashlib
+import inspect
+import numbers
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+from senescwheat import __version__
+from senescwheat import parameters
+
+"""
+    senescwheat.cache
+    ~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.cache` defines a persistent cache of the results of simulations.
+
+    Calibration and regression workflows often run the same simulation several times. :class:`ResultCache` stores the results
+    of :meth:`simulation.Simulation.run` and :meth:`simulation.Simulation.run_steps` in a directory, under a key which hashes
+    everything the results depend on: the inputs, the values of :mod:`senescwheat.parameters` and of the parameters of the plants,
+    the delta t, the outputs requested, the forced green area, the log of the events and the arguments of the run. A run whose key is in the cache loads its results instead of computing them.
+
+    The size of the cache can be bounded: the least recently used results are then evicted.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the arguments of :meth:`simulation.Simulation.run_steps` which do not change the results, and are not part of the keys
+PERFORMANCE_ARGUMENTS = ['nb_workers', 'nb_threads', 'chunk_size']
+
+#: the extension of the files of the results
+RESULT_EXTENSION = '.pickle'
+
+
+def _canonical(value):
+    """Convert a value to a canonical form, where the dictionaries and the sets are sorted and the numbers other than the booleans are Python floats,
+    to hash it. The inputs read from dataframes, which hold integers or numpy numbers, and the same inputs written back by the runs, which hold Python floats,
+    thus have the same key, which does not depend on the version of numpy."""
+    if hasattr(value, 'items'):
+        return tuple(sorted((_canonical(key), _canonical(item)) for key, item in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(_canonical(item) for item in value))
+    if isinstance(value, (list, tuple)):
+        return tuple(_canonical(item) for item in value)
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, numbers.Real) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def _cached(simulation_):
+    """Return True if the runs of a simulation can be cached: its observers must see each step and may stop the run, and its checkers
+    (:attr:`simulation.Simulation.balance_checker` and :attr:`simulation.Simulation.reference_verifier`) must check the steps."""
+    return not len(simulation_.observers) and simulation_.balance_checker is None and simulation_.reference_verifier is None
+
+
+class ResultCache(object):
+    """Persistent cache of the results of simulations, with a least recently used eviction.
+    """
+
+    def __init__(self, dirpath, max_size=None):
+        """
+        :param str dirpath: the directory of the cache. It is created if needed.
+        :param int max_size: the maximal size of the results stored in the cache (bytes), None for an unbounded cache.
+        """
+        #: the directory of the cache
+        self.dirpath = dirpath
+        if not os.path.exists(dirpath):
+            os.makedirs(dirpath)
+        #: the maximal size of the results stored in the cache (bytes), None for an unbounded cache
+        self.max_size = max_size
+        #: the number of results loaded from the cache, and the number of results computed
+        self.statistics = {'hits': 0, 'misses': 0}
+
+    def key(self, simulation_, method_name, run_kwargs):
+        """
+        Compute the key of the results of a run.
+
+        :param simulation.Simulation simulation_: the simulation before the run.
+        :param str method_name: the name of the method of the run, `run` or `run_steps`.
+        :param dict run_kwargs: the arguments of the method. The arguments not given take their default values, so that
+                                an argument given with its default value does not change the key.
+
+        :return: The key, as an hexadecimal string.
+        :rtype: str
+        """
+        bound_arguments = inspect.signature(getattr(simulation_, method_name)).bind(**run_kwargs)
+        bound_arguments.apply_defaults()
+        run_kwargs = {name: value for name, value in bound_arguments.arguments.items() if name not in PERFORMANCE_ARGUMENTS}
+        if 'dtype' in run_kwargs:
+            run_kwargs['dtype'] = np.dtype(run_kwargs['dtype']).str
+        parameters_values = {name: getattr(parameters, name) for name in dir(parameters) if name.isupper()}
+        forced_green_area = simulation_.forced_green_area
+        if forced_green_area is not None:
+            forced_green_area = (forced_green_area.times, forced_green_area.ids, forced_green_area.values.tobytes())
+        event_log = simulation_.event_log
+        if event_log is not None:
+            # the events already logged, and the elements whose senescence has started, which are not logged again
+            event_log = (event_log.ids, event_log._started.tobytes()) + tuple(array.tobytes() for array in event_log.to_arrays())
+        description = (__version__, method_name, simulation_.delta_t, run_kwargs, parameters_values, simulation_.plants_parameters, simulation_.outputs_variables, forced_green_area, event_log,
+                       simulation_.aggregations, simulation_.inputs)
+        return hashlib.sha256(pickle.dumps(_canonical(description), protocol=2)).hexdigest()
+
+    def _filepath(self, key):
+        return os.path.join(self.dirpath, key + RESULT_EXTENSION)
+
+    def __contains__(self, key):
+        return os.path.exists(self._filepath(key))
+
+    @property
+    def size(self):
+        """The size of the results stored in the cache (bytes)."""
+        return sum(os.path.getsize(os.path.join(self.dirpath, filename)) for filename in os.listdir(self.dirpath) if filename.endswith(RESULT_EXTENSION))
+
+    def load(self, key):
+        """
+        Load results from the cache, and mark them as recently used.
+
+        :param str key: the key of the results, see :meth:`key`.
+
+        :return: The results, or None if the key is not in the cache.
+        :rtype: dict
+        """
+        filepath = self._filepath(key)
+        try:
+            with open(filepath, 'rb') as result_file:
+                result = pickle.load(result_file)
+            os.utime(filepath, None)
+        except (IOError, OSError):
+            return None
+        return result
+
+    def store(self, key, result):
+        """
+        Store results in the cache, then evict the least recently used results if the cache is too large.
+
+        :param str key: the key of the results, see :meth:`key`.
+        :param dict result: the results.
+        """
+        # write to a temporary file then rename it, so that a concurrent run never reads partial results
+        result_file_descriptor, result_temporary_filepath = tempfile.mkstemp(dir=self.dirpath, suffix='.tmp')
+        try:
+            with os.fdopen(result_file_descriptor, 'wb') as result_file:
+                pickle.dump(result, result_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(result_temporary_filepath, self._filepath(key))
+        except BaseException:
+            os.remove(result_temporary_filepath)
+            raise
+        if self.max_size is not None:
+            self.evict(self.max_size)
+
+    def evict(self, max_size=0):
+        """
+        Remove the least recently used results until the size of the cache is at most `max_size`.
+
+        :param int max_size: the size to reach (bytes). 0 empties the cache.
+        """
+        results = []
+        for filename in os.listdir(self.dirpath):
+            if filename.endswith(RESULT_EXTENSION):
+                file_stat = os.stat(os.path.join(self.dirpath, filename))
+                results.append((file_stat.st_mtime_ns, filename, file_stat.st_size))
+        size = sum(result_size for _, _, result_size in results)
+        for _, filename, result_size in sorted(results):
+            if size <= max_size:
+                break
+            try:
+                os.remove(os.path.join(self.dirpath, filename))
+            except OSError:
+                continue
+            size -= result_size
+
+    def _restore(self, simulation_, result):
+        """Set the state of a simulation from results loaded from the cache."""
+        if 'inputs' in result:
+            simulation_.initialize(result['inputs'])
+        simulation_.outputs.update(result['outputs'])
+        simulation_.event_log = result['event_log']
+
+    def run(self, simulation_, **run_kwargs):
+        """
+        Call :meth:`simulation.Simulation.run`, or load its outputs from the cache.
+        The runs of a simulation with a checker of the steps are not cached, see :meth:`run_steps`.
+
+        :param simulation.Simulation simulation_: the simulation to run. It is updated in place.
+        :param run_kwargs: the arguments of :meth:`simulation.Simulation.run`.
+
+        :return: True if the outputs were loaded from the cache, False if the step was run.
+        :rtype: bool
+        """
+        if not _cached(simulation_):
+            simulation_.run(**run_kwargs)
+            return False
+        key = self.key(simulation_, 'run', run_kwargs)
+        result = self.load(key)
+        if result is not None:
+            self.statistics['hits'] += 1
+            self._restore(simulation_, result)
+            return True
+        self.statistics['misses'] += 1
+        simulation_.run(**run_kwargs)
+        self.store(key, {'outputs': simulation_.outputs, 'event_log': simulation_.event_log})
+        return False
+
+    def run_steps(self, simulation_, nb_steps, **run_kwargs):
+        """
+        Call :meth:`simulation.Simulation.run_steps`, or load the state it reaches from the cache.
+        The runs of a simulation with observers (see :meth:`simulation.Simulation.add_observer`) are not cached: the observers must see each step,
+        and may stop the run. Neither are the runs of a simulation with a :attr:`simulation.Simulation.balance_checker`
+        or a :attr:`simulation.Simulation.reference_verifier`, which must check the steps.
+
+        :param simulation.Simulation simulation_: the simulation to run. It is updated in place.
+        :param int nb_steps: the number of steps to run.
+        :param run_kwargs: the other arguments of :meth:`simulation.Simulation.run_steps`.
+
+        :return: The aggregates returned by :meth:`simulation.Simulation.run_steps`.
+        :rtype: pandas.DataFrame
+        """
+        run_kwargs = dict(run_kwargs, nb_steps=nb_steps)
+        if not _cached(simulation_):
+            return simulation_.run_steps(**run_kwargs)
+        key = self.key(simulation_, 'run_steps', run_kwargs)
+        result = self.load(key)
+        if result is not None:
+            self.statistics['hits'] += 1
+            self._restore(simulation_, result)
+            return result['aggregates']
+        self.statistics['misses'] += 1
+        aggregates = simulation_.run_steps(**run_kwargs)
+        self.store(key, {'inputs': simulation_.inputs, 'outputs': simulation_.outputs, 'event_log': simulation_.event_log, 'aggregates': aggregates})
+        return aggregates
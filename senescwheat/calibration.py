@@ -0,0 +1,207 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import converter
+from senescwheat import engine
+
+"""
+    senescwheat.calibration
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.calibration` defines the calibration of the parameters of :mod:`senescwheat.parameters`
+    against observed time series of the elements, for example green area kinetics or residual N.
+
+    The search uses a differential evolution: at each generation, all the candidates of the population are run together
+    as the members of an ensemble of the :mod:`engine <senescwheat.engine>`.
+    The costs of the candidates already evaluated are cached, and a candidate is abandoned during the run
+    as soon as its partial cost exceeds the cost of the candidate it competes with.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+class Calibration(object):
+    """The Calibration class permits to calibrate parameters against observed time series.
+    """
+
+    def __init__(self, inputs, observations, search_space, divergence_factor=1., forced_max_protein_elements=None, opt_full_remob=False, postflowering_stages=False):
+        """
+        :param dict inputs: the inputs of the simulation, with the same structure as :attr:`simulation.Simulation.inputs`.
+        :param pandas.DataFrame observations: the observations, with one line by step and element: the column :attr:`converter.TIME_COLUMN`,
+                                              the columns :attr:`converter.ELEMENTS_TOPOLOGY_COLUMNS`, and one column by observed variable.
+                                              Missing observations are NaN.
+        :param dict search_space: the parameters to calibrate, with their bounds: ``{parameter_name: (lower_bound, upper_bound), ...}``.
+                                  See :func:`engine.resolve_parameters` for the parameter names.
+        :param float divergence_factor: a candidate is abandoned when its partial cost exceeds `divergence_factor` times the cost
+                                        of the candidate it competes with.
+        :param set forced_max_protein_elements: The elements ids with fixed max proteins.
+        :param bool opt_full_remob: whether all proteins should be remobilised.
+        :param bool postflowering_stages: True to run a simulation with postflo parameter.
+        """
+        #: the inputs of the simulation
+        self.inputs = inputs
+        #: the parameters to calibrate, with their bounds
+        self.search_space = search_space
+        #: the factor applied to the cost of the competitor of a candidate to decide if the candidate diverges
+        self.divergence_factor = divergence_factor
+        #: the arguments of the runs
+        self.run_kwargs = {'opt_full_remob': opt_full_remob, 'postflowering_stages': postflowering_stages}
+
+        self._roots_state = engine.RootsState.from_dict(inputs['roots'])
+        self._elements_state = engine.ElementsState.from_dict(inputs['elements'])
+        self._roots_delta_teq = engine.axes_forcings(inputs['axes'], self._roots_state.axes_ids, 'delta_teq_roots')
+        self._elements_delta_teq = engine.axes_forcings(inputs['axes'], self._elements_state.axes_ids, 'delta_teq')
+        forced_max_protein_elements = forced_max_protein_elements or set()
+        self._update_max_protein = np.array([id_ not in forced_max_protein_elements for id_ in self._elements_state.ids], dtype=bool)
+
+        # the observations by step: {step: [(variable, rows, observed values, normalization), ...]}
+        variables = observations.columns.difference([converter.TIME_COLUMN] + converter.ELEMENTS_TOPOLOGY_COLUMNS)
+        normalizations = {variable: np.nansum(observations[variable].values ** 2) or 1. for variable in variables}
+        self._observations = {}
+        for t, observations_t in observations.groupby(converter.TIME_COLUMN):
+            ids = [tuple(id_) for id_ in observations_t[converter.ELEMENTS_TOPOLOGY_COLUMNS].values.tolist()]
+            rows = np.array([self._elements_state.index[id_] for id_ in ids], dtype=int)
+            for variable in variables:
+                values = observations_t[variable].values.astype(float)
+                observed = ~np.isnan(values)
+                if observed.any():
+                    self._observations.setdefault(int(t), []).append((variable, rows[observed], values[observed], normalizations[variable]))
+        #: the number of steps to run to reach the last observation
+        self.nb_steps = max(self._observations) + 1 if self._observations else 0
+
+        #: the costs of the candidates already evaluated
+        self.cache = {}
+        #: the number of candidates run, the number of candidates found in :attr:`cache`, the number of candidates abandoned
+        self.statistics = {'runs': 0, 'cache_hits': 0, 'abandoned': 0}
+        #: the best candidate of each generation of the last call to :meth:`run`
+        self.history = []
+
+    @staticmethod
+    def _cache_key(candidate):
+        return tuple(float('{:.12g}'.format(value)) for value in candidate)
+
+    def evaluate(self, candidates, competitors_costs=None):
+        """
+        Compute the cost of candidates: the sum, over the observed variables, of the squared residuals normalized by
+        the sum of the squared observations.
+
+        The candidates not found in :attr:`cache` are run at once, as the members of one ensemble.
+
+        :param numpy.ndarray candidates: the candidates, with one row by candidate and one column by parameter of :attr:`search_space`.
+        :param numpy.ndarray competitors_costs: the cost each candidate has to beat. A candidate is abandoned, with an infinite cost,
+                                                as soon as its partial cost exceeds :attr:`divergence_factor` times this cost.
+
+        :return: The cost of each candidate.
+        :rtype: numpy.ndarray
+        """
+        candidates = np.atleast_2d(candidates)
+        costs = np.empty(len(candidates))
+        keys = [self._cache_key(candidate) for candidate in candidates]
+        to_run = {}
+        for i, key in enumerate(keys):
+            if key in self.cache:
+                costs[i] = self.cache[key]
+                self.statistics['cache_hits'] += 1
+            else:
+                to_run.setdefault(key, []).append(i)
+        if not to_run:
+            return costs
+
+        first_indices = np.array([indices[0] for indices in to_run.values()], dtype=int)
+        if competitors_costs is None:
+            thresholds = np.full(len(first_indices), np.inf)
+        else:
+            thresholds = np.asarray(competitors_costs, dtype=float)[first_indices] * self.divergence_factor
+        run_costs = self._run(candidates[first_indices], thresholds)
+        self.statistics['runs'] += len(first_indices)
+        self.statistics['abandoned'] += int(np.isinf(run_costs).sum())
+
+        for (key, indices), cost in zip(to_run.items(), run_costs):
+            costs[indices] = cost
+            if np.isfinite(cost):
+                self.cache[key] = cost
+        return costs
+
+    def _run(self, candidates, thresholds):
+        """Run the candidates as one ensemble, abandoning the ones whose partial cost exceeds their threshold."""
+        nb_candidates = len(candidates)
+        parameters_sets = {name: candidates[:, i] for i, name in enumerate(self.search_space)}
+        roots_state = self._roots_state.replicate(nb_candidates)
+        elements_state = self._elements_state.replicate(nb_candidates)
+        resolved_parameters = engine.resolve_parameters(elements_state, parameters_sets)
+        running = np.arange(nb_candidates)
+        partial_costs = np.zeros(nb_candidates)
+
+        for step in range(self.nb_steps):
+            engine.run_roots(roots_state, self._roots_delta_teq, resolved_parameters, self.run_kwargs['postflowering_stages'])
+            engine.run_elements(elements_state, self._elements_delta_teq, resolved_parameters, self._update_max_protein, **self.run_kwargs)
+            if step not in self._observations:
+                continue
+            for variable, rows, observed_values, normalization in self._observations[step]:
+                residuals = elements_state.columns[variable][:, rows] - observed_values
+                partial_costs += np.sum(residuals ** 2, axis=1) / normalization
+            diverging = ~(partial_costs <= thresholds[running])
+            if diverging.any():
+                kept = np.flatnonzero(~diverging)
+                running = running[kept]
+                partial_costs = partial_costs[kept]
+                roots_state.take_members(kept)
+                elements_state.take_members(kept)
+                resolved_parameters = engine.take_members(resolved_parameters, kept)
+                if not len(running):
+                    break
+
+        costs = np.full(nb_candidates, np.inf)
+        costs[running] = partial_costs
+        return costs
+
+    def run(self, population_size=20, nb_generations=50, mutation=0.8, crossover=0.9, tolerance=1e-8, seed=None):
+        """
+        Calibrate the parameters with a differential evolution (DE/rand/1/bin).
+
+        :param int population_size: the number of candidates of the population.
+        :param int nb_generations: the maximal number of generations.
+        :param float mutation: the differential weight.
+        :param float crossover: the crossover probability.
+        :param float tolerance: the search stops when the spread of the costs of the population is below `tolerance`.
+        :param int seed: the seed of the random generator.
+
+        :return: The best parameters found, and their cost.
+        :rtype: tuple [dict, float]
+        """
+        random_state = np.random.RandomState(seed)
+        bounds = np.array(list(self.search_space.values()), dtype=float).reshape(-1, 2)
+        nb_parameters = len(bounds)
+        population = bounds[:, 0] + random_state.random_sample((population_size, nb_parameters)) * (bounds[:, 1] - bounds[:, 0])
+        costs = self.evaluate(population)
+        self.history = []
+
+        for generation in range(nb_generations):
+            # mutation and crossover
+            trials = np.empty_like(population)
+            for i in range(population_size):
+                a, b, c = random_state.choice([j for j in range(population_size) if j != i], 3, replace=False)
+                mutant = np.clip(population[a] + mutation * (population[b] - population[c]), bounds[:, 0], bounds[:, 1])
+                crossed = random_state.random_sample(nb_parameters) < crossover
+                crossed[random_state.randint(nb_parameters)] = True
+                trials[i] = np.where(crossed, mutant, population[i])
+            # selection
+            trials_costs = self.evaluate(trials, costs)
+            improved = trials_costs <= costs
+            population[improved] = trials[improved]
+            costs[improved] = trials_costs[improved]
+
+            best = np.argmin(costs)
+            self.history.append(dict(zip(self.search_space, population[best]), generation=generation, cost=costs[best]))
+            if np.ptp(costs) < tolerance:
+                break
+
+        self.history = pd.DataFrame(self.history)
+        best = np.argmin(costs)
+        return dict(zip(self.search_space, population[best])), costs[best]
@@ -0,0 +1,212 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+import argparse
+import itertools
+import os
+import sys
+import time
+
+import pandas as pd
+
+from senescwheat import archive
+from senescwheat import converter
+from senescwheat import engine
+from senescwheat import parameters
+from senescwheat import simulation
+
+"""
+    senescwheat.cli
+    ~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.cli` defines the command line interface of Senesc-Wheat, installed as the command `senescwheat`.
+
+    The command runs a simulation over several steps (see :meth:`simulation.Simulation.iter_run`) from an inputs directory
+    which contains the files `roots_inputs.csv`, `axes_inputs.csv` and `elements_inputs.csv`, and writes the outputs
+    of each step. The axes inputs can be forced at each step by a forcing file (see :func:`converter.iter_axes_forcings`).
+    The duration of a step is given by the temperature-compensated times `delta_teq` and `delta_teq_roots` of the axes inputs.
+
+    Run `senescwheat --help` for the list of the options.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the file names of the inputs
+ROOTS_INPUTS_FILENAME = 'roots_inputs.csv'
+AXES_INPUTS_FILENAME = 'axes_inputs.csv'
+ELEMENTS_INPUTS_FILENAME = 'elements_inputs.csv'
+
+#: the file names of the outputs, without extension
+ROOTS_OUTPUTS_FILENAME = 'roots_outputs'
+ELEMENTS_OUTPUTS_FILENAME = 'elements_outputs'
+
+#: the formats of the outputs files. The CSV files are written step by step, the archives (see :mod:`senescwheat.archive`)
+#: chunk by chunk, the other formats at the end of the run.
+OUTPUTS_FORMATS = ['csv', 'archive', 'pickle', 'parquet']
+
+
+def parse_parameters(assignments):
+    """
+    Convert assignments of parameters of :mod:`senescwheat.parameters` to a dictionary to update the parameters with.
+
+    The entries of the dictionary parameters are designated with a dotted name, for example ``FRACTION_N_MAX.blade=0.45``
+    or ``RATIO_N_MSTRUCT.5=0.02``.
+
+    :param list assignments: the assignments, as strings ``NAME=VALUE``.
+
+    :return: The new values of the parameters, by parameter name, see the parameter `update_parameters` of :class:`simulation.Simulation`.
+    :rtype: dict
+    """
+    update_parameters = {}
+    for assignment in assignments:
+        name, separator, value = assignment.partition('=')
+        parameter_name, _, key = name.strip().partition('.')
+        if not separator or not parameter_name.isupper() or not hasattr(parameters, parameter_name):
+            raise ValueError('Invalid parameter assignment: {}'.format(assignment))
+        value = float(value)
+        if not key:
+            update_parameters[parameter_name] = value
+            continue
+        parameter_value = update_parameters.get(parameter_name, getattr(parameters, parameter_name))
+        if not isinstance(parameter_value, dict):
+            raise ValueError('Parameter {} has no entries: {}'.format(parameter_name, assignment))
+        parameter_value = dict(parameter_value)
+        parameter_value[int(key) if key.isdigit() else key] = value
+        update_parameters[parameter_name] = parameter_value
+    return update_parameters
+
+
+class _OutputsWriter(object):
+    """Write the outputs of the steps to a file, step by step for CSV, chunk by chunk for an archive, at the end otherwise."""
+
+    def __init__(self, filepath, outputs_format, topology_columns):
+        self.filepath = filepath
+        self.outputs_format = outputs_format
+        self.dataframes = []
+        self.header = True
+        self.archive_writer = archive.ArchiveWriter(filepath, topology_columns) if outputs_format == 'archive' else None
+
+    def write(self, dataframe):
+        if self.outputs_format == 'csv':
+            dataframe.to_csv(self.filepath, mode='w' if self.header else 'a', header=self.header, index=False, na_rep='NA')
+            self.header = False
+        elif self.archive_writer is not None:
+            self.archive_writer.write(dataframe)
+        else:
+            self.dataframes.append(dataframe)
+
+    def close(self):
+        if self.outputs_format == 'csv':
+            return
+        if self.archive_writer is not None:
+            self.archive_writer.close()
+            return
+        dataframe = pd.concat(self.dataframes, ignore_index=True) if self.dataframes else pd.DataFrame()
+        if self.outputs_format == 'pickle':
+            dataframe.to_pickle(self.filepath)
+        else:
+            dataframe.to_parquet(self.filepath, index=False)
+
+
+def make_parser():
+    """Create the parser of the command line arguments."""
+    parser = argparse.ArgumentParser(prog='senescwheat', description='Run Senesc-Wheat over several steps.')
+    parser.add_argument('inputs_dirpath', help='the directory of the inputs files ({}, {}, {})'.format(ROOTS_INPUTS_FILENAME, AXES_INPUTS_FILENAME, ELEMENTS_INPUTS_FILENAME))
+    parser.add_argument('-f', '--forcings', dest='forcings_filepath',
+                        help='a CSV file of axes inputs forced at each step, with the columns {}, {} and the forced axes inputs'.format(
+                            converter.TIME_COLUMN, ', '.join(converter.AXES_TOPOLOGY_COLUMNS)))
+    parser.add_argument('-n', '--steps', dest='nb_steps', type=int,
+                        help='the number of steps to run (by default, 1 step, or one step by time of the forcings)')
+    parser.add_argument('--postflowering', action='store_true', help='run with the postflowering parameters')
+    parser.add_argument('-p', '--parameter', dest='parameters', action='append', default=[], metavar='NAME=VALUE',
+                        help='set a parameter of senescwheat.parameters, for example FRACTION_N_MAX.blade=0.45 (repeatable)')
+    parser.add_argument('-o', '--outputs', dest='outputs_dirpath', default='outputs', help='the directory of the outputs files (default: %(default)s)')
+    parser.add_argument('--variables', help='comma-separated list of the output variables to write, the only ones computed with the variables they depend on (default: all)')
+    parser.add_argument('--format', dest='outputs_format', choices=OUTPUTS_FORMATS, default='csv', help='the format of the outputs files (default: %(default)s)')
+    parser.add_argument('--threads', dest='nb_threads', type=int, default=1, help='the number of threads computing the elements (default: %(default)s)')
+    return parser
+
+
+def main(argv=None):
+    """
+    Run the command line interface.
+
+    :param list argv: the command line arguments. `sys.argv[1:]` by default.
+
+    :return: The exit status.
+    :rtype: int
+    """
+    parser = make_parser()
+    args = parser.parse_args(argv)
+
+    try:
+        update_parameters = parse_parameters(args.parameters)
+    except ValueError as error:
+        parser.error(str(error))
+    variables = None
+    if args.variables:
+        variables = set(variable.strip() for variable in args.variables.split(','))
+        try:
+            engine.computed_variables(variables)
+        except ValueError as error:
+            parser.error(str(error))
+
+    # read the inputs
+    start_time = time.time()
+    roots_inputs_df = pd.read_csv(os.path.join(args.inputs_dirpath, ROOTS_INPUTS_FILENAME))
+    axes_inputs_df = pd.read_csv(os.path.join(args.inputs_dirpath, AXES_INPUTS_FILENAME))
+    elements_inputs_df = pd.read_csv(os.path.join(args.inputs_dirpath, ELEMENTS_INPUTS_FILENAME))
+    inputs = converter.from_dataframes(roots_inputs_df, axes_inputs_df, elements_inputs_df)
+    if args.forcings_filepath:
+        forcings = converter.iter_axes_forcings(pd.read_csv(args.forcings_filepath))
+        if args.nb_steps is not None:
+            forcings = itertools.islice(forcings, args.nb_steps)
+    else:
+        forcings = itertools.repeat({}, 1 if args.nb_steps is None else args.nb_steps)
+
+    # only the variables written, and the variables they depend on, are computed
+    simulation_ = simulation.Simulation(update_parameters=update_parameters, outputs_variables=variables)
+    simulation_.initialize(inputs)
+    reading_time = time.time() - start_time
+
+    # run the steps and write their outputs
+    if not os.path.exists(args.outputs_dirpath):
+        os.makedirs(args.outputs_dirpath)
+    roots_writer = _OutputsWriter(os.path.join(args.outputs_dirpath, '{}.{}'.format(ROOTS_OUTPUTS_FILENAME, args.outputs_format)), args.outputs_format,
+                                  converter.ROOTS_TOPOLOGY_COLUMNS)
+    elements_writer = _OutputsWriter(os.path.join(args.outputs_dirpath, '{}.{}'.format(ELEMENTS_OUTPUTS_FILENAME, args.outputs_format)), args.outputs_format,
+                                     converter.ELEMENTS_TOPOLOGY_COLUMNS)
+    nb_steps = 0
+    writing_time = 0.
+    start_time = time.time()
+    for step_outputs in simulation_.iter_run(forcings, postflowering_stages=args.postflowering, nb_threads=args.nb_threads):
+        writing_start_time = time.time()
+        for writer, dataframe, topology_columns in zip((roots_writer, elements_writer), step_outputs.to_dataframes(),
+                                                       (converter.ROOTS_TOPOLOGY_COLUMNS, converter.ELEMENTS_TOPOLOGY_COLUMNS)):
+            dataframe.insert(0, converter.TIME_COLUMN, step_outputs.step)
+            if variables is not None:
+                dataframe = converter.select_columns(dataframe, [converter.TIME_COLUMN] + topology_columns, variables)
+            writer.write(dataframe)
+        writing_time += time.time() - writing_start_time
+        nb_steps += 1
+    writing_start_time = time.time()
+    roots_writer.close()
+    elements_writer.close()
+    writing_time += time.time() - writing_start_time
+    total_time = time.time() - start_time
+
+    # summary
+    nb_elements = len(inputs['elements'])
+    running_time = total_time - writing_time
+    print('{} steps, {} roots, {} elements'.format(nb_steps, len(inputs['roots']), nb_elements))
+    print('reading: {:.3f} s, running: {:.3f} s, writing: {:.3f} s'.format(reading_time, running_time, writing_time))
+    print('throughput: {:.1f} steps/s, {:.0f} element steps/s'.format(nb_steps / total_time if total_time else float('inf'),
+                                                                      nb_steps * nb_elements / running_time if running_time else float('inf')))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -53,6 +53,9 @@ AXES_TOPOLOGY_COLUMNS = ['plant', 'axis']
 #: the columns which define the topology of an element in the input/output dataframe
 ELEMENTS_TOPOLOGY_COLUMNS = ['plant', 'axis', 'metamer', 'organ', 'element']
 
+#: the column which gives the step of a time series (the outputs of the first step are at t=0)
+TIME_COLUMN = 't'
+
 
 def from_dataframes(roots_inputs, axes_inputs, elements_inputs):
     """
@@ -62,33 +65,52 @@ def from_dataframes(roots_inputs, axes_inputs, elements_inputs):
     :param pandas.DataFrame axes_inputs: axes inputs dataframe to convert, with one line by axis.
     :param pandas.DataFrame elements_inputs: Elements inputs dataframe to convert, with one line by element.
 
-    :return: The inputs/outputs in a dictionary.
+    :return: The inputs/outputs in a dictionary. The inputs/outputs of each roots and each element are stored in
+             a :class:`records.RootsRecord` and a :class:`records.ElementRecord` respectively.
     :rtype: dict [str, dict]
 
     seealso:: see :attr:`simulation.Simulation.inputs` and :attr:`simulation.Simulation.outputs`
        for the structure of Senesc-Wheat inputs/outputs.
 
     """
+    from senescwheat import records  # the records are defined from the variables of this module
+
     all_roots_dict = {}
     all_axes_dict = {}
     all_elements_dict = {}
-    for (all_current_dict, current_dataframe, current_topology_columns) in ((all_roots_dict, roots_inputs, ROOTS_TOPOLOGY_COLUMNS),
-                                                                            (all_axes_dict, axes_inputs, AXES_TOPOLOGY_COLUMNS),
-                                                                            (all_elements_dict, elements_inputs, ELEMENTS_TOPOLOGY_COLUMNS)):
+    for (all_current_dict, current_dataframe, current_topology_columns, current_record_type) in ((all_roots_dict, roots_inputs, ROOTS_TOPOLOGY_COLUMNS, records.RootsRecord),
+                                                                                                 (all_axes_dict, axes_inputs, AXES_TOPOLOGY_COLUMNS, dict),
+                                                                                                 (all_elements_dict, elements_inputs, ELEMENTS_TOPOLOGY_COLUMNS, records.ElementRecord)):
         current_columns = current_dataframe.columns.difference(current_topology_columns)
         for current_id, current_group in current_dataframe.groupby(current_topology_columns):
             current_series = current_group.loc[current_group.first_valid_index()]
-            current_dict = current_series[current_columns].to_dict()
+            current_dict = current_record_type(current_series[current_columns].to_dict())
             all_current_dict[current_id] = current_dict
 
     return {'roots': all_roots_dict, 'axes': all_axes_dict, 'elements': all_elements_dict}
 
 
-def to_dataframes(data_dict):
+def select_columns(dataframe, topology_columns, variables):
+    """
+    Keep only the topology columns and some variables of a dataframe of inputs/outputs.
+
+    :param pandas.DataFrame dataframe: the dataframe.
+    :param list topology_columns: the topology columns of the dataframe.
+    :param set variables: the names of the variables to keep.
+
+    :return: The dataframe with the topology columns and the variables of `variables` found in `dataframe`, in the order of `dataframe`.
+    :rtype: pandas.DataFrame
+    """
+    return dataframe[topology_columns + [column for column in dataframe.columns if column in variables and column not in topology_columns]]
+
+
+def to_dataframes(data_dict, variables=None):
     """
     Convert inputs/outputs from Senesc-Wheat format to Pandas dataframe.
 
     :param dict data_dict: The inputs/outputs in Senesc-Wheat format.
+    :param set variables: the names of the variables to convert, for example the outputs requested with
+                          :attr:`simulation.Simulation.outputs_variables`. All the variables by default.
 
     :return: One dataframe for roots inputs/outputs, one dataframe for axes inputs/outputs,  one dataframe for elements inputs/outputs.
     :rtype: (pandas.DataFrame, pandas.DataFrame, pandas.DataFrame)
@@ -102,13 +124,40 @@ def to_dataframes(data_dict):
                                                                                   ('axes', AXES_TOPOLOGY_COLUMNS, SENESCWHEAT_AXES_INPUTS_OUTPUTS),
                                                                                   ('elements', ELEMENTS_TOPOLOGY_COLUMNS, SENESCWHEAT_ELEMENTS_INPUTS_OUTPUTS)):
         current_data_dict = data_dict[current_key]
-        current_ids_df = pd.DataFrame(current_data_dict.keys(), columns=current_topology_columns)
-        current_data_df = pd.DataFrame(current_data_dict.values())
-        current_df = pd.concat([current_ids_df, current_data_df], axis=1)
+        if hasattr(current_data_dict, 'to_dataframe'):  # a view on the outputs of the engine, see :class:`views.OutputsView`
+            current_df = current_data_dict.to_dataframe()
+        else:
+            current_ids_df = pd.DataFrame(list(current_data_dict.keys()), columns=current_topology_columns)
+            current_data_df = pd.DataFrame(list(current_data_dict.values()))
+            current_df = pd.concat([current_ids_df, current_data_df], axis=1)
         current_df.sort_values(by=current_topology_columns, inplace=True)
         current_columns_sorted = current_topology_columns + [input_output for input_output in current_inputs_outputs_names if input_output in current_df.columns]
         current_df = current_df.reindex(current_columns_sorted, axis=1, copy=False)
         current_df.reset_index(drop=True, inplace=True)
+        if variables is not None:
+            current_df = select_columns(current_df, current_topology_columns, variables)
         dataframes_dict[current_key] = current_df
 
     return dataframes_dict['roots'], dataframes_dict['axes'], dataframes_dict['elements']
+
+
+def iter_axes_forcings(axes_forcings):
+    """
+    Convert a time series of axes inputs from Pandas dataframe to a sequence of Senesc-Wheat axes inputs, one by step.
+
+    :param pandas.DataFrame axes_forcings: the axes inputs, with one line by step and axis: the column :attr:`TIME_COLUMN`,
+                                           the columns :attr:`AXES_TOPOLOGY_COLUMNS`, and one column by axis input.
+
+    :return: A generator of the axes inputs of each step, in time order, with the same structure as the axes inputs of
+             :attr:`simulation.Simulation.inputs`. Missing values are skipped.
+    :rtype: generator [dict]
+
+    seealso:: see :meth:`simulation.Simulation.iter_run`.
+
+    """
+    columns = axes_forcings.columns.difference([TIME_COLUMN] + AXES_TOPOLOGY_COLUMNS)
+    for _, axes_forcings_t in axes_forcings.groupby(TIME_COLUMN, sort=True):
+        axes_dict = {}
+        for axis_id, axis_values in zip(axes_forcings_t[AXES_TOPOLOGY_COLUMNS].itertuples(index=False, name=None), axes_forcings_t[columns].to_dict('records')):
+            axes_dict[axis_id] = {name: value for name, value in axis_values.items() if not pd.isnull(value)}
+        yield axes_dict
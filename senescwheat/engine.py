@@ -0,0 +1,975 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import converter
+from senescwheat import events
+from senescwheat import model
+from senescwheat import parameters
+from senescwheat import records
+
+"""
+    senescwheat.engine
+    ~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.engine` defines a vectorized implementation of the Senesc-Wheat :mod:`model <senescwheat.model>`.
+
+    The state of the roots and of the elements is stored by variable, in NumPy arrays with one row by roots or element.
+    The arrays may have a leading dimension to hold several members of an ensemble, typically one member by parameter set.
+    One step of the engine gives the same results as one call to :meth:`simulation.Simulation.run`.
+    The senescence of the elements is computed by the batch functions of :class:`model.SenescenceModel`, given the parameters resolved by element.
+
+    The state can be stored in float32 to save memory, some variables being kept in float64 (see :meth:`State.from_dict`).
+    The kernels then compute in float32 wherever they do not combine float64 variables.
+    :func:`precision_report` gives the maximal deviation of such a reduced precision run from the float64 run.
+
+    NumPy releases the GIL in the array operations of the kernels: :func:`iter_steps` can split the elements in chunks
+    which are computed by a pool of threads.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the label of the axis on which the elements are computed (see :meth:`simulation.Simulation.run`)
+COMPUTED_AXIS_LABEL = 'MS'
+
+#: the variables kept in float64 when the state is stored with a reduced precision (see :meth:`State.from_dict`)
+DEFAULT_FULL_PRECISION_VARIABLES = ['Nstruct', 'Nresidual']
+
+#: the default number of elements by chunk when the elements are computed by several threads (see :func:`run_steps`)
+DEFAULT_CHUNK_SIZE = 4096
+
+#: the reductions available to aggregate the elements by axis (see :func:`aggregate_by_axis`)
+REDUCTIONS = ['sum', 'mean', 'count', 'min', 'max']
+
+#: the parameters of :mod:`senescwheat.parameters` used by the engine
+ENGINE_PARAMETERS = ['N_MOLAR_MASS', 'SENESCENCE_ROOTS_POSTFLOWERING', 'SENESCENCE_ROOTS_PREFLOWERING', 'FRACTION_N_MAX', 'SENESCENCE_MAX_RATE', 'SENESCENCE_LENGTH_MAX_RATE',
+                     'RATIO_N_MSTRUCT', 'DEFAULT_RATIO_N_MSTRUCT', 'AGE_EFFECT_SENESCENCE', 'MIN_GREEN_AREA']
+
+#: the parameters of the elements, which can differ from one plant to another (see :func:`resolve_parameters`)
+PLANTS_PARAMETERS = ['FRACTION_N_MAX', 'SENESCENCE_MAX_RATE', 'SENESCENCE_LENGTH_MAX_RATE', 'RATIO_N_MSTRUCT', 'DEFAULT_RATIO_N_MSTRUCT', 'AGE_EFFECT_SENESCENCE',
+                     'MIN_GREEN_AREA']
+
+#: the variables of the previous state read by the computation of each variable of a step of the roots
+ROOTS_DEPENDENCIES = {'rate_mstruct_death': ['mstruct'],
+                      'mstruct': ['mstruct'],
+                      'senesced_mstruct': ['mstruct', 'senesced_mstruct'],
+                      'Nstruct': ['Nstruct'],
+                      'cytokinins': ['mstruct', 'cytokinins']}
+
+# the variables read to compute the senescence of an element, i.e. the relative variation of its green area
+_SENESCENCE_DEPENDENCIES = ['green_area', 'senesced_length_element', 'length', 'proteins', 'mstruct', 'max_proteins', 'age', 'is_growing']
+# the variables read to compute the remobilisation of the proteins of an element (see SenescenceModel.calculate_N_content_total)
+_PROTEINS_DEPENDENCIES = _SENESCENCE_DEPENDENCIES + ['amino_acids', 'nitrates', 'Nstruct', 'max_mstruct', 'Nresidual']
+
+#: the variables of the previous state read by the computation of each variable of a step of the elements
+ELEMENTS_DEPENDENCIES = {'green_area': _SENESCENCE_DEPENDENCIES,
+                         'senesced_length_element': _SENESCENCE_DEPENDENCIES,
+                         'max_proteins': _SENESCENCE_DEPENDENCIES,
+                         'mstruct': _SENESCENCE_DEPENDENCIES,
+                         'is_over': _SENESCENCE_DEPENDENCIES,
+                         'senesced_mstruct': _SENESCENCE_DEPENDENCIES + ['senesced_mstruct'],
+                         'Nstruct': _SENESCENCE_DEPENDENCIES + ['Nstruct'],
+                         'starch': _SENESCENCE_DEPENDENCIES + ['starch'],
+                         'fructan': _SENESCENCE_DEPENDENCIES + ['fructan'],
+                         'sucrose': _SENESCENCE_DEPENDENCIES + ['starch', 'fructan', 'sucrose'],
+                         'proteins': _PROTEINS_DEPENDENCIES,
+                         'amino_acids': _PROTEINS_DEPENDENCIES,
+                         'Nresidual': _PROTEINS_DEPENDENCIES,
+                         'N_content_total': _PROTEINS_DEPENDENCIES,
+                         'cytokinins': _SENESCENCE_DEPENDENCIES + ['cytokinins'],
+                         'nitrates': _SENESCENCE_DEPENDENCIES + ['nitrates']}
+
+#: the variables of the elements computed together, by remobilised pool: a pool is computed if one of its variables is computed
+ELEMENTS_POOLS = {'carbon': ['starch', 'fructan', 'sucrose'],
+                  'proteins': ['proteins', 'amino_acids', 'Nresidual', 'N_content_total'],
+                  'cytokinins': ['cytokinins'],
+                  'nitrates': ['nitrates']}
+
+
+class State(object):
+    """Columnar state of a set of roots or elements: one array by variable, one row by roots or element.
+
+    Variables listed in :attr:`VARIABLES` are stored as floating point arrays, variables listed in :attr:`FLAGS`
+    as boolean arrays. Any other variable found in the inputs is kept unchanged in :attr:`extra`.
+    """
+
+    #: the variables stored as floating point arrays
+    VARIABLES = []
+
+    #: the variables stored as boolean arrays
+    FLAGS = []
+
+    #: the columns which define the topology of a row
+    TOPOLOGY_COLUMNS = []
+
+    #: the type of the records returned by :meth:`to_dict`
+    RECORD_TYPE = dict
+
+    def __init__(self, ids, columns, present=None, extra=None):
+        #: the ids of the rows, in rows order
+        self.ids = list(ids)
+        #: the row of each id
+        self.index = {id_: row for row, id_ in enumerate(self.ids)}
+        #: the arrays of the state, by variable name
+        self.columns = columns
+        #: the names of the variables which were given in the inputs
+        self.present = set(present) if present is not None else set(columns)
+        #: the variables not handled by the engine, by variable name, in rows order
+        self.extra = extra if extra is not None else {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nb_members(self):
+        """The number of members of the ensemble, or None if the state has no ensemble dimension."""
+        for array in self.columns.values():
+            return array.shape[0] if array.ndim == 2 else None
+        return None
+
+    @property
+    def dtype(self):
+        """The floating point type of the state, i.e. the type of the variables not kept in full precision."""
+        return min([array.dtype for name, array in self.columns.items() if name in self.VARIABLES] or [np.dtype(float)], key=lambda dtype: dtype.itemsize)
+
+    @property
+    def nbytes(self):
+        """The memory used by the arrays of the state (bytes)."""
+        return sum(array.nbytes for array in self.columns.values())
+
+    @classmethod
+    def from_dict(cls, data_dict, dtype=float, full_precision_variables=DEFAULT_FULL_PRECISION_VARIABLES):
+        """
+        Create a state from the inputs/outputs of Senesc-Wheat at one scale level.
+
+        :param dict data_dict: the inputs/outputs by id, for example :attr:`simulation.Simulation.inputs['elements'] <simulation.Simulation.inputs>`.
+        :param numpy.dtype dtype: the floating point type of the variables, for example `numpy.float32` to save memory.
+        :param list full_precision_variables: the variables stored in float64 whatever `dtype`.
+
+        :return: The state.
+        :rtype: State
+        """
+        ids = list(data_dict.keys())
+        rows = [data_dict[id_] for id_ in ids]
+        present = set()
+        for row in rows:
+            present.update(row.keys())
+        columns = {}
+        for name in cls.VARIABLES:
+            variable_dtype = float if name in full_precision_variables else dtype
+            columns[name] = np.array([row.get(name, np.nan) for row in rows], dtype=variable_dtype)
+        for name in cls.FLAGS:
+            columns[name] = np.array([bool(row.get(name, False)) for row in rows], dtype=bool)
+        extra = {name: [row.get(name) for row in rows] for name in present.difference(cls.VARIABLES, cls.FLAGS)}
+        return cls(ids, columns, present, extra)
+
+    def to_dict(self, member=None, rows=None):
+        """
+        Convert the state to the inputs/outputs format of Senesc-Wheat.
+
+        :param int member: the member of the ensemble to convert. Must be given if the state has an ensemble dimension.
+        :param list rows: the rows to convert. All the rows by default.
+
+        :return: The inputs/outputs by id, each one stored in a :attr:`RECORD_TYPE`.
+        :rtype: dict
+        """
+        if rows is None:
+            rows = range(len(self.ids))
+        columns = {name: (array if member is None else array[member]) for name, array in self.columns.items() if name in self.present}
+        data_dict = {}
+        for row in rows:
+            row_dict = self.RECORD_TYPE()
+            for name, array in columns.items():
+                row_dict[name] = array[row].item()
+            for name, values in self.extra.items():
+                row_dict[name] = values[row]
+            data_dict[self.ids[row]] = row_dict
+        return data_dict
+
+    def to_dataframe(self, member=None, rows=None, extra_columns=None):
+        """
+        Convert the state to a dataframe, with the layout of the dataframes of :func:`converter.to_dataframes`.
+
+        :param int member: the member of the ensemble to convert. Must be given if the state has an ensemble dimension.
+        :param list rows: the rows to convert. All the rows by default.
+        :param dict extra_columns: other variables to add, by variable name, with one value by row of the state.
+
+        :return: The state, with one line by row.
+        :rtype: pandas.DataFrame
+        """
+        rows = np.arange(len(self.ids)) if rows is None else np.asarray(rows, dtype=int)
+        data = {name: (array if member is None else array[member])[rows] for name, array in self.columns.items() if name in self.present}
+        data.update({name: [values[row] for row in rows] for name, values in self.extra.items()})
+        data.update({name: np.asarray(values)[rows] for name, values in (extra_columns or {}).items()})
+        dataframe = pd.DataFrame([self.ids[row] for row in rows], columns=self.TOPOLOGY_COLUMNS)
+        names = getattr(self.RECORD_TYPE, 'KEYS', sorted(data))
+        for name in names:
+            if name in data:
+                dataframe[name] = data[name]
+        dataframe.sort_values(by=self.TOPOLOGY_COLUMNS, inplace=True)
+        dataframe.reset_index(drop=True, inplace=True)
+        return dataframe
+
+    def copy(self):
+        """Return a copy of the state. The arrays are copied, the ids and the extra variables are shared."""
+        new_state = self.__class__.__new__(self.__class__)
+        new_state.__dict__.update(self.__dict__)
+        new_state.columns = {name: array.copy() for name, array in self.columns.items()}
+        new_state.present = set(self.present)
+        return new_state
+
+    def replicate(self, nb_members):
+        """
+        Return a copy of the state with an ensemble dimension of size `nb_members`.
+
+        :param int nb_members: the number of members of the ensemble.
+
+        :return: The replicated state.
+        :rtype: State
+        """
+        new_state = self.copy()
+        new_state.columns = {name: np.repeat(array[np.newaxis], nb_members, axis=0) for name, array in self.columns.items()}
+        return new_state
+
+    def slice(self, start, stop):
+        """
+        Return the state of the rows [start:stop]. The arrays of the returned state are views on the arrays of this state.
+
+        :param int start: the first row.
+        :param int stop: the row after the last row.
+
+        :return: The state of the rows.
+        :rtype: State
+        """
+        return self.__class__(self.ids[start:stop], {name: array[..., start:stop] for name, array in self.columns.items()}, self.present,
+                              {name: values[start:stop] for name, values in self.extra.items()})
+
+    def take_members(self, members):
+        """
+        Keep only some members of the ensemble. The state is updated in place.
+
+        :param numpy.ndarray members: the indices of the members to keep.
+        """
+        self.columns = {name: array[members] for name, array in self.columns.items()}
+
+
+class RootsState(State):
+    """Columnar state of the roots."""
+
+    VARIABLES = converter.SENESCWHEAT_ROOTS_INPUTS
+
+    TOPOLOGY_COLUMNS = converter.ROOTS_TOPOLOGY_COLUMNS
+
+    RECORD_TYPE = records.RootsRecord
+
+    def __init__(self, ids, columns, present=None, extra=None):
+        super(RootsState, self).__init__(ids, columns, present, extra)
+        #: the axis id of each row
+        self.axes_ids = list(self.ids)
+
+
+class ElementsState(State):
+    """Columnar state of the elements."""
+
+    VARIABLES = [name for name in converter.SENESCWHEAT_ELEMENTS_INPUTS if name != 'is_growing']
+
+    FLAGS = ['is_growing', 'is_over']
+
+    TOPOLOGY_COLUMNS = converter.ELEMENTS_TOPOLOGY_COLUMNS
+
+    RECORD_TYPE = records.ElementRecord
+
+    def __init__(self, ids, columns, present=None, extra=None):
+        super(ElementsState, self).__init__(ids, columns, present, extra)
+        #: the axis id of each row
+        self.axes_ids = [id_[:2] for id_ in self.ids]
+        #: the metamer index of each row
+        self.metamers = np.array([id_[2] for id_ in self.ids], dtype=object)
+        #: the organ label of each row
+        self.organs = np.array([id_[3] for id_ in self.ids], dtype=object)
+        #: True for the elements which belong to a blade
+        self.is_blade = self.organs == 'blade'
+        #: True for the elements which belong to an internode
+        self.is_internode = self.organs == 'internode'
+        #: True for the elements computed by the model
+        self.is_computed = np.array([id_[1] == COMPUTED_AXIS_LABEL for id_ in self.ids], dtype=bool)
+        #: the ids of the axes, sorted
+        self.unique_axes_ids = sorted(set(self.axes_ids))
+        axes_positions = {axis_id: position for position, axis_id in enumerate(self.unique_axes_ids)}
+        #: the position of the axis of each row in :attr:`unique_axes_ids`
+        self.axes_positions = np.array([axes_positions[axis_id] for axis_id in self.axes_ids], dtype=int)
+
+
+def computed_variables(outputs_variables):
+    """
+    Find the variables to compute at each step so that some outputs are exact at all the steps: the outputs themselves
+    and, recursively, the variables of the state they are computed from (see :attr:`ROOTS_DEPENDENCIES` and :attr:`ELEMENTS_DEPENDENCIES`).
+
+    For example, the green area depends on the proteins, and the remobilisation of the proteins depends on the amino acids,
+    the nitrates, the Nstruct and the Nresidual: all of them must be computed to get the green area, but not the carbon pools nor the cytokinins.
+
+    :param set outputs_variables: the names of the outputs needed, of the roots or of the elements.
+
+    :return: The variables to compute, by scale: ``{'roots': set, 'elements': set}``.
+    :rtype: dict
+
+    :raises ValueError: if a name is not an output of the roots nor of the elements.
+    """
+    unknown_variables = set(outputs_variables).difference(ROOTS_DEPENDENCIES, ELEMENTS_DEPENDENCIES)
+    if unknown_variables:
+        raise ValueError('Unknown outputs: {}'.format(', '.join(sorted(unknown_variables))))
+    variables = {}
+    for scale, dependencies in (('roots', ROOTS_DEPENDENCIES), ('elements', ELEMENTS_DEPENDENCIES)):
+        scale_variables = set()
+        pending = [name for name in outputs_variables if name in dependencies]
+        while pending:
+            name = pending.pop()
+            if name not in scale_variables:
+                scale_variables.add(name)
+                pending.extend(dependency for dependency in dependencies[name] if dependency in dependencies)
+        variables[scale] = scale_variables
+    return variables
+
+
+def computes_pool(variables, pool):
+    """
+    Tell whether a pool of :attr:`ELEMENTS_POOLS` must be computed.
+
+    :param set variables: the variables of the elements to compute, as returned by :func:`computed_variables`, or None for all the variables.
+    :param str pool: the name of the pool.
+
+    :return: True if one of the variables of the pool is computed.
+    :rtype: bool
+    """
+    return variables is None or not variables.isdisjoint(ELEMENTS_POOLS[pool])
+
+
+def _as_member_column(value, dtype=float):
+    """Convert a parameter value to an array which broadcasts against (nb_members, nb_rows) arrays."""
+    value = np.asarray(value, dtype=dtype)
+    if value.ndim == 1:
+        value = value[:, np.newaxis]
+    return value
+
+
+def resolve_parameters(elements_state, overrides=None, dtype=None, plants_parameters=None):
+    """
+    Resolve the parameters of the model for the rows of `elements_state`.
+
+    The values are read from :mod:`senescwheat.parameters`, then overwritten by `overrides`.
+    A value of `overrides` is either a scalar, or an array with one value by member of the ensemble.
+    The entries of the dictionary parameters are designated with a dotted name, for example
+    ``'FRACTION_N_MAX.blade'`` or ``'RATIO_N_MSTRUCT.5'``.
+
+    The parameters of the elements of some plants can then be overwritten by `plants_parameters`, for example to simulate
+    a mixture of cultivars. Their values have the structure of the values of :mod:`senescwheat.parameters`,
+    and are the same for all the members of the ensemble. The parameters given for a plant are then resolved by element.
+
+    :param ElementsState elements_state: the state of the elements.
+    :param dict overrides: the values to use instead of the ones of :mod:`senescwheat.parameters`.
+    :param numpy.dtype dtype: the floating point type of the parameters. The type of `elements_state` by default.
+    :param dict plants_parameters: the values of the parameters of the elements of some plants: ``{plant_index: {parameter_name: value, ...}, ...}``,
+                                   the parameter names being among :attr:`PLANTS_PARAMETERS`.
+
+    :return: The values of the parameters, by parameter name. `FRACTION_N_MAX` and `RATIO_N_MSTRUCT`, and the parameters
+             given in `plants_parameters`, are resolved by element.
+    :rtype: dict
+    """
+    overrides = dict(overrides or {})
+    dtype = dtype or elements_state.dtype
+    for name in overrides:
+        if name.split('.')[0] not in ENGINE_PARAMETERS:
+            raise ValueError('Unknown parameter: {}'.format(name))
+
+    resolved = {}
+    for name in ENGINE_PARAMETERS:
+        if name in ('FRACTION_N_MAX', 'RATIO_N_MSTRUCT'):
+            continue
+        resolved[name] = _as_member_column(overrides.get(name, getattr(parameters, name)), dtype)
+
+    # fraction of N max, by organ
+    fraction_N_max = parameters.FRACTION_N_MAX
+    blade_value = _as_member_column(overrides.get('FRACTION_N_MAX.blade', fraction_N_max['blade']), dtype)
+    stem_value = _as_member_column(overrides.get('FRACTION_N_MAX.stem', fraction_N_max['stem']), dtype)
+    resolved['FRACTION_N_MAX'] = np.where(elements_state.is_blade, blade_value, stem_value)
+
+    # ratio N / mstruct, by phytomer rank
+    nb_members = [np.size(value) for value in overrides.values() if np.ndim(value) == 1]
+    ratio_N_mstruct = np.empty(tuple(nb_members[:1]) + elements_state.is_blade.shape, dtype=dtype)
+    ratio_N_mstruct[...] = resolved['DEFAULT_RATIO_N_MSTRUCT']
+    for metamer in set(elements_state.metamers):
+        key = 'RATIO_N_MSTRUCT.{}'.format(metamer)
+        if key in overrides:
+            value = overrides[key]
+        elif metamer in parameters.RATIO_N_MSTRUCT:
+            value = parameters.RATIO_N_MSTRUCT[metamer]
+        else:
+            continue
+        rows = elements_state.metamers == metamer
+        ratio_N_mstruct[..., rows] = _as_member_column(value)
+    resolved['RATIO_N_MSTRUCT'] = ratio_N_mstruct
+
+    # parameters by plant
+    if plants_parameters:
+        plants = np.array([id_[0] for id_ in elements_state.ids])
+        for plant, plant_parameters in plants_parameters.items():
+            unknown_parameters = set(plant_parameters).difference(PLANTS_PARAMETERS)
+            if unknown_parameters:
+                raise ValueError('Parameters which cannot differ between plants: {}'.format(', '.join(sorted(unknown_parameters))))
+            rows = plants == plant
+            for name, value in plant_parameters.items():
+                if name == 'FRACTION_N_MAX':
+                    value = np.where(elements_state.is_blade[rows], value['blade'], value['stem'])
+                elif name in ('RATIO_N_MSTRUCT', 'DEFAULT_RATIO_N_MSTRUCT'):
+                    name = 'RATIO_N_MSTRUCT'
+                    ratio_N_mstruct = plant_parameters.get('RATIO_N_MSTRUCT', parameters.RATIO_N_MSTRUCT)
+                    default_ratio_N_mstruct = plant_parameters.get('DEFAULT_RATIO_N_MSTRUCT', parameters.DEFAULT_RATIO_N_MSTRUCT)
+                    value = [ratio_N_mstruct.get(metamer, default_ratio_N_mstruct) for metamer in elements_state.metamers[rows]]
+                resolved_value = resolved[name]
+                if resolved_value.ndim == 0 or resolved_value.shape[-1] != len(elements_state):
+                    # resolve the parameter by element
+                    resolved_value = resolved[name] = np.repeat(resolved_value, len(elements_state), axis=-1) if resolved_value.ndim else \
+                        np.full(len(elements_state), resolved_value, dtype=resolved_value.dtype)
+                resolved_value[..., rows] = value
+
+    return resolved
+
+
+def take_members(resolved_parameters, members):
+    """
+    Keep only some members of the ensemble in parameters resolved by :func:`resolve_parameters`.
+
+    :param dict resolved_parameters: the parameters, as returned by :func:`resolve_parameters`.
+    :param numpy.ndarray members: the indices of the members to keep.
+
+    :return: The parameters of the kept members.
+    :rtype: dict
+    """
+    return {name: (value[members] if value.ndim == 2 else value) for name, value in resolved_parameters.items()}
+
+
+def take_rows(resolved_parameters, rows, nb_rows):
+    """
+    Keep only some rows in parameters resolved by :func:`resolve_parameters` for a state without ensemble dimension.
+
+    :param dict resolved_parameters: the parameters, as returned by :func:`resolve_parameters`.
+    :param numpy.ndarray rows: the rows to keep.
+    :param int nb_rows: the number of rows of the state the parameters were resolved for.
+
+    :return: The parameters of the kept rows.
+    :rtype: dict
+    """
+    return {name: (value[..., rows] if value.ndim and value.shape[-1] == nb_rows else value) for name, value in resolved_parameters.items()}
+
+
+def axes_forcings(axes_inputs, axes_ids, name, dtype=float):
+    """
+    Gather the values of an axis input for each row of a state.
+
+    :param dict axes_inputs: the inputs of the axes, for example :attr:`simulation.Simulation.inputs['axes'] <simulation.Simulation.inputs>`.
+    :param list axes_ids: the axis id of each row.
+    :param str name: the name of the axis input, for example `delta_teq`.
+    :param numpy.dtype dtype: the floating point type of the values.
+
+    :return: The value of the axis input by row.
+    :rtype: numpy.ndarray
+    """
+    values = {axis_id: axis_inputs[name] for axis_id, axis_inputs in axes_inputs.items()}
+    return np.array([values[axis_id] for axis_id in axes_ids], dtype=dtype)
+
+
+def run_roots(roots_state, delta_teq, resolved_parameters, postflowering_stages=False):
+    """
+    Run one step of the model on the roots. `roots_state` is updated in place.
+
+    :param RootsState roots_state: the state of the roots.
+    :param numpy.ndarray delta_teq: the temperature-compensated time of each roots (s).
+    :param dict resolved_parameters: the parameters, as returned by :func:`resolve_parameters`.
+    :param bool postflowering_stages: True to use the parameters calibrated for post flowering stages.
+
+    :return: The rate of mstruct loss of each roots (g mstruct s-1).
+    :rtype: numpy.ndarray
+    """
+    columns = roots_state.columns
+    if postflowering_stages:
+        rate_senescence = resolved_parameters['SENESCENCE_ROOTS_POSTFLOWERING']
+    else:
+        rate_senescence = resolved_parameters['SENESCENCE_ROOTS_PREFLOWERING']
+    mstruct = columns['mstruct']
+    rate_mstruct_death = mstruct * rate_senescence
+    rate_Nstruct_death = columns['Nstruct'] * rate_senescence
+    relative_delta_mstruct = (rate_mstruct_death * delta_teq) / mstruct
+    delta_mstruct = rate_mstruct_death * delta_teq
+    delta_Nstruct = rate_Nstruct_death * delta_teq
+    loss_cytokinins = columns['cytokinins'] * relative_delta_mstruct
+
+    columns['mstruct'][...] = mstruct - delta_mstruct
+    columns['senesced_mstruct'][...] = columns['senesced_mstruct'] + delta_mstruct
+    columns['Nstruct'][...] = columns['Nstruct'] - delta_Nstruct
+    columns['cytokinins'][...] = columns['cytokinins'] - loss_cytokinins
+    roots_state.present.update(converter.SENESCWHEAT_ROOTS_OUTPUTS)
+    return rate_mstruct_death
+
+
+def elements_phases(elements_state, columns, resolved_parameters):
+    """
+    Split the elements in the three cases of :func:`run_elements`.
+
+    :param ElementsState elements_state: the state of the elements.
+    :param dict columns: the arrays of the variables of the elements, :attr:`elements_state.columns <State.columns>` or views on them.
+    :param dict resolved_parameters: the parameters, as returned by :func:`resolve_parameters`.
+
+    :return: The elements which are over, i.e. fully senescent, and the elements which senesce. The other elements grow.
+    :rtype: tuple [numpy.ndarray, numpy.ndarray]
+    """
+    is_over = model.SenescenceModel.calculate_if_element_is_over(columns['green_area'], columns['is_growing'], columns['mstruct'], resolved_parameters['MIN_GREEN_AREA'])
+    is_over &= elements_state.is_computed
+    is_senescing = ~is_over & ~columns['is_growing'] & elements_state.is_computed
+    return is_over, is_senescing
+
+
+def senescence(elements_state, columns, is_senescing, delta_teq, resolved_parameters, update_max_protein=True, postflowering_stages=False, forced_green_area=None,
+               step_events=None):
+    """
+    Compute the senescence of the elements, i.e. the variation of their green area, as in :func:`run_elements`. The state is not updated.
+
+    :param ElementsState elements_state: the state of the elements.
+    :param dict columns: the arrays of the variables of the elements, :attr:`elements_state.columns <State.columns>` or views on them.
+    :param numpy.ndarray is_senescing: the elements which senesce, as returned by :func:`elements_phases`.
+    :param numpy.ndarray delta_teq: the temperature-compensated time of each element (s).
+    :param dict resolved_parameters: the parameters, as returned by :func:`resolve_parameters`.
+    :param numpy.ndarray update_max_protein: False for the elements with fixed max proteins.
+    :param bool postflowering_stages: True to run a simulation with postflo parameter.
+    :param numpy.ndarray forced_green_area: the green area forced on each element (m2), NaN for the elements not forced.
+    :param dict step_events: if not None, filled with the senescence events of the step, see :func:`run_elements`.
+
+    :return: The new green area, the new senesced length, the relative variation of the green area and the new max proteins of each element.
+             The values are only relevant for the senescing elements.
+    :rtype: tuple [numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]
+    """
+    green_area = columns['green_area']
+    mstruct = columns['mstruct']
+    proteins = columns['proteins']
+    max_proteins = columns['max_proteins']
+    length = columns['length']
+    senesced_length_element = columns['senesced_length_element']
+
+    # Senescence
+    with np.errstate(divide='ignore', invalid='ignore'):
+        proteins_concentration = proteins / mstruct
+    if postflowering_stages:
+        new_green_area, relative_delta_green_area, new_max_proteins = model.SenescenceModel.calculate_relative_delta_green_area(elements_state.organs, green_area,
+                                                                                                                                proteins_concentration, max_proteins, delta_teq,
+                                                                                                                                update_max_protein,
+                                                                                                                                resolved_parameters['FRACTION_N_MAX'],
+                                                                                                                                resolved_parameters['SENESCENCE_MAX_RATE'])
+        if 'senesced_length_element' in elements_state.present:
+            prev_senesced_length = np.where(np.isnan(senesced_length_element), 0., senesced_length_element)
+        else:
+            prev_senesced_length = 0.
+        new_senesced_length = relative_delta_green_area * (length - prev_senesced_length)
+        if step_events is not None:
+            triggered_by_proteins = relative_delta_green_area > 0
+            triggered_by_age = np.zeros(np.shape(triggered_by_proteins), dtype=bool)
+    else:
+        new_senesced_length, relative_delta_green_area, new_max_proteins = model.SenescenceModel.calculate_relative_delta_senesced_length(elements_state.organs,
+                                                                                                                                          senesced_length_element, length,
+                                                                                                                                          proteins_concentration, max_proteins,
+                                                                                                                                          delta_teq, update_max_protein,
+                                                                                                                                          resolved_parameters['FRACTION_N_MAX'],
+                                                                                                                                          resolved_parameters['SENESCENCE_LENGTH_MAX_RATE'])
+        # Senescence with element age
+        aged = ~elements_state.is_internode & (relative_delta_green_area == 0) & (columns['age'] > resolved_parameters['AGE_EFFECT_SENESCENCE'])
+        aged_senesced_length, aged_relative_delta, _ = model.SenescenceModel.calculate_relative_delta_senesced_length(elements_state.organs, senesced_length_element,
+                                                                                                                       length, 0., new_max_proteins, delta_teq,
+                                                                                                                       update_max_protein, resolved_parameters['FRACTION_N_MAX'],
+                                                                                                                       resolved_parameters['SENESCENCE_LENGTH_MAX_RATE'])
+        if step_events is not None:
+            triggered_by_proteins = relative_delta_green_area > 0
+            triggered_by_age = aged & (aged_relative_delta > 0)
+        new_senesced_length = np.where(aged, aged_senesced_length, new_senesced_length)
+        relative_delta_green_area = np.where(aged, aged_relative_delta, relative_delta_green_area)
+        new_green_area = green_area * (1 - relative_delta_green_area)
+
+    # Forced green area
+    if forced_green_area is not None:
+        forced = ~np.isnan(forced_green_area)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            forced_relative_delta = (green_area - forced_green_area) / green_area
+        prev_senesced_length = np.where(np.isnan(senesced_length_element), 0., senesced_length_element)
+        new_senesced_length = np.where(forced, prev_senesced_length + forced_relative_delta * (length - prev_senesced_length), new_senesced_length)
+        relative_delta_green_area = np.where(forced, forced_relative_delta, relative_delta_green_area)
+        new_green_area = np.where(forced, forced_green_area, new_green_area)
+        new_max_proteins = np.where(forced, max_proteins, new_max_proteins)
+        if step_events is not None:
+            triggered_by_proteins &= ~forced
+            triggered_by_age &= ~forced
+            step_events[events.SENESCENCE_FORCED] = (is_senescing & forced & (relative_delta_green_area > 0), forced_green_area)
+
+    if step_events is not None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step_events[events.SENESCENCE_PROTEINS] = (is_senescing & triggered_by_proteins, proteins_concentration / max_proteins)
+        step_events[events.SENESCENCE_AGE] = (is_senescing & triggered_by_age, columns['age'])
+        step_events[events.MAX_PROTEINS_OVERWRITTEN] = (is_senescing & (new_max_proteins != max_proteins), new_max_proteins)
+
+    return new_green_area, new_senesced_length, relative_delta_green_area, new_max_proteins
+
+
+def run_elements(elements_state, delta_teq, resolved_parameters, update_max_protein=True, opt_full_remob=False, postflowering_stages=False, forced_green_area=None,
+                 step_events=None, variables=None):
+    """
+    Run one step of the model on the elements. `elements_state` is updated in place.
+
+    The elements are split in the three cases of :meth:`simulation.Simulation.run`:
+
+        * the elements which are over, i.e. fully senescent,
+        * the elements which senesce, i.e. neither growing nor over,
+        * the elements which grow, which are left unchanged.
+
+    :param ElementsState elements_state: the state of the elements.
+    :param numpy.ndarray delta_teq: the temperature-compensated time of each element (s).
+    :param dict resolved_parameters: the parameters, as returned by :func:`resolve_parameters`.
+    :param numpy.ndarray update_max_protein: False for the elements with fixed max proteins.
+    :param bool opt_full_remob: whether all proteins should be remobilised.
+    :param bool postflowering_stages: True to run a simulation with postflo parameter.
+    :param numpy.ndarray forced_green_area: the green area forced on each element (m2), NaN for the elements not forced.
+    :param dict step_events: if not None, filled with the events of the step, see :mod:`senescwheat.events`:
+                             ``{event_code: (elements mask, values), ...}``. The senescence events are given at each step where the senescence is triggered.
+    :param set variables: the variables to compute, as returned by :func:`computed_variables`, or None for all the variables.
+                          The other variables of the state are left unchanged.
+
+    :return: The N content of each element (NaN for the elements which do not senesce), the elements which are over, the elements which senesce.
+    :rtype: tuple [numpy.ndarray, numpy.ndarray, numpy.ndarray]
+    """
+    if postflowering_stages:
+        opt_full_remob = True
+
+    columns = elements_state.columns
+    mstruct = columns['mstruct']
+    proteins = columns['proteins']
+    length = columns['length']
+    Nstruct = columns['Nstruct']
+
+    is_over, is_senescing = elements_phases(elements_state, columns, resolved_parameters)
+    new_green_area, new_senesced_length, relative_delta_green_area, new_max_proteins = senescence(elements_state, columns, is_senescing, delta_teq, resolved_parameters,
+                                                                                                  update_max_protein, postflowering_stages, forced_green_area,
+                                                                                                  step_events)
+    if step_events is not None:
+        was_over = columns['is_over'].copy()
+
+    # Loss of mstruct and Nstruct
+    delta_mstruct = mstruct * relative_delta_green_area
+    delta_Nstruct = Nstruct * relative_delta_green_area
+    new_mstruct = mstruct - delta_mstruct
+    new_Nstruct = Nstruct - delta_Nstruct
+
+    senescing_updates = {'green_area': new_green_area,
+                         'senesced_length_element': new_senesced_length,
+                         'mstruct': new_mstruct,
+                         'senesced_mstruct': columns['senesced_mstruct'] + delta_mstruct,
+                         'Nstruct': new_Nstruct,
+                         'max_proteins': new_max_proteins}
+
+    # Remobilisation, of the pools needed only
+    N_content_total = np.full(np.shape(mstruct), np.nan)
+    if computes_pool(variables, 'proteins'):
+        N_content_total = ((proteins + columns['amino_acids'] + columns['nitrates']) * 1E-6 * resolved_parameters['N_MOLAR_MASS'] + columns['Nresidual'] + Nstruct) / columns['max_mstruct']
+        partial_remob_proteins = proteins * relative_delta_green_area
+        if opt_full_remob:
+            residual_proteins = np.zeros(np.shape(N_content_total), dtype=bool)
+        else:
+            residual_proteins = elements_state.is_blade & (N_content_total <= resolved_parameters['RATIO_N_MSTRUCT'])
+        remob_proteins = np.where(residual_proteins, proteins, partial_remob_proteins)
+        delta_aa = np.where(residual_proteins, 0., partial_remob_proteins)
+        delta_Nresidual = np.where(residual_proteins, proteins * 1E-6 * resolved_parameters['N_MOLAR_MASS'], 0.)
+        delta_Nresidual += Nstruct - new_Nstruct
+        senescing_updates.update({'proteins': proteins - remob_proteins,
+                                  'amino_acids': columns['amino_acids'] + delta_aa,
+                                  'Nresidual': columns['Nresidual'] + delta_Nresidual})
+    if computes_pool(variables, 'carbon'):
+        remob_starch = columns['starch'] * relative_delta_green_area
+        remob_fructan = columns['fructan'] * relative_delta_green_area
+        senescing_updates.update({'starch': columns['starch'] - remob_starch,
+                                  'sucrose': columns['sucrose'] + remob_starch + remob_fructan,
+                                  'fructan': columns['fructan'] - remob_fructan})
+    if computes_pool(variables, 'cytokinins'):
+        senescing_updates['cytokinins'] = columns['cytokinins'] - columns['cytokinins'] * relative_delta_green_area
+    if computes_pool(variables, 'nitrates'):
+        senescing_updates['nitrates'] = columns['nitrates'] - columns['nitrates'] * relative_delta_green_area
+
+    # Update of the state
+    over_updates = {'green_area': 0.,
+                    'senesced_length_element': length,
+                    'mstruct': 0.,
+                    'senesced_mstruct': columns['senesced_mstruct'] + mstruct}
+    if variables is not None:
+        senescing_updates = {name: value for name, value in senescing_updates.items() if name in variables}
+        over_updates = {name: value for name, value in over_updates.items() if name in variables}
+    for name, array in columns.items():
+        if name in senescing_updates or name in over_updates:
+            new_array = np.where(is_senescing, senescing_updates.get(name, array), array)
+            array[...] = np.where(is_over, over_updates.get(name, new_array), new_array)
+    columns['is_over'][...] = np.where(is_senescing, new_mstruct == 0, columns['is_over']) | is_over
+    if step_events is not None:
+        step_events[events.OVER] = (columns['is_over'] & ~was_over, columns['senesced_mstruct'])
+    if is_over.any():
+        elements_state.present.update(over_updates, ['is_over'])
+    if is_senescing.any():
+        elements_state.present.update(senescing_updates, ['is_over'])
+
+    return np.where(is_senescing, N_content_total, np.nan), is_over, is_senescing
+
+
+def aggregate_by_axis(elements_state, aggregations):
+    """
+    Aggregate the variables of the elements by axis.
+
+    :param ElementsState elements_state: the state of the elements, without ensemble dimension.
+    :param dict aggregations: the aggregations to compute: ``{aggregate_name: (variable_name, reduction), ...}``,
+                              `reduction` being one of :attr:`REDUCTIONS`. `count` counts the rows where the variable is True.
+
+    :return: The aggregates by name, with one value by axis of :attr:`ElementsState.unique_axes_ids`.
+    :rtype: dict
+    """
+    nb_axes = len(elements_state.unique_axes_ids)
+    positions = elements_state.axes_positions
+    nb_elements = np.bincount(positions, minlength=nb_axes)
+    aggregates = {}
+    for aggregate_name, (variable_name, reduction) in aggregations.items():
+        values = elements_state.columns[variable_name]
+        if reduction == 'count':
+            aggregates[aggregate_name] = np.bincount(positions, weights=values.astype(bool), minlength=nb_axes).astype(int)
+        elif reduction in ('sum', 'mean'):
+            sums = np.bincount(positions, weights=np.where(np.isnan(values), 0., values), minlength=nb_axes)
+            if reduction == 'mean':
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    sums = sums / nb_elements
+            aggregates[aggregate_name] = sums
+        elif reduction in ('min', 'max'):
+            ufunc = np.fmin if reduction == 'min' else np.fmax
+            extrema = np.full(nb_axes, np.nan)
+            ufunc.at(extrema, positions, values)
+            aggregates[aggregate_name] = extrema
+        else:
+            raise ValueError('Unknown reduction: {}. Must be one of {}'.format(reduction, REDUCTIONS))
+    return aggregates
+
+
+def iter_steps(roots_state, elements_state, roots_delta_teq, elements_delta_teq, resolved_parameters, update_max_protein=True, opt_full_remob=False,
+               postflowering_stages=False, nb_threads=1, chunk_size=DEFAULT_CHUNK_SIZE, forced_green_area=None, event_log=None, t=0, variables=None):
+    """
+    Run steps of the model as long as the generator is iterated, the outputs of each step being the inputs of the next step.
+    The states are updated in place.
+
+    The temperature-compensated times and the forced green area are read at each step: they can be updated in place between two steps to force the next step.
+
+    :param RootsState roots_state: the state of the roots.
+    :param ElementsState elements_state: the state of the elements.
+    :param numpy.ndarray roots_delta_teq: the temperature-compensated time of each roots (s).
+    :param numpy.ndarray elements_delta_teq: the temperature-compensated time of each element (s).
+    :param dict resolved_parameters: the parameters, as returned by :func:`resolve_parameters`.
+    :param numpy.ndarray update_max_protein: False for the elements with fixed max proteins.
+    :param bool opt_full_remob: whether all proteins should be remobilised.
+    :param bool postflowering_stages: True to run a simulation with postflo parameter.
+    :param int nb_threads: the number of threads computing the elements.
+    :param int chunk_size: the number of elements computed at once by a thread.
+    :param numpy.ndarray forced_green_area: the green area forced on each element (m2), NaN for the elements not forced. None to force no element.
+    :param events.EventLog event_log: the log to append the events of the elements to, or None to log no event.
+    :param int t: the time of the first step, in `event_log`.
+    :param set variables: the variables of the elements to compute, see :func:`run_elements`.
+
+    :return: A generator of the rate of mstruct loss of each roots and of the N content of each element, at each step.
+    :rtype: generator [tuple [numpy.ndarray, numpy.ndarray]]
+    """
+    nb_elements = len(elements_state)
+    update_max_protein = np.broadcast_to(update_max_protein, (nb_elements,))
+    if nb_threads > 1 and nb_elements > chunk_size:
+        # the chunks are views on the state and on the forcings
+        chunks = [(start, elements_state.slice(start, start + chunk_size), elements_delta_teq[start:start + chunk_size],
+                   take_rows(resolved_parameters, slice(start, start + chunk_size), nb_elements), update_max_protein[start:start + chunk_size],
+                   None if forced_green_area is None else forced_green_area[start:start + chunk_size])
+                  for start in range(0, nb_elements, chunk_size)]
+        executor = ThreadPoolExecutor(nb_threads)
+    else:
+        chunks = [(0, elements_state, elements_delta_teq, resolved_parameters, update_max_protein, forced_green_area)]
+        executor = None
+    events_positions = None if event_log is None else event_log.positions(elements_state.ids)
+
+    def run_chunk(chunk):
+        _, chunk_state, chunk_delta_teq, chunk_parameters, chunk_update_max_protein, chunk_forced_green_area = chunk
+        step_events = None if event_log is None else {}
+        N_content_total = run_elements(chunk_state, chunk_delta_teq, chunk_parameters, chunk_update_max_protein, opt_full_remob, postflowering_stages,
+                                       chunk_forced_green_area, step_events, variables)[0]
+        return N_content_total, step_events
+
+    try:
+        while True:
+            rate_mstruct_death = run_roots(roots_state, roots_delta_teq, resolved_parameters, postflowering_stages)
+            if executor is None:
+                chunks_results = [run_chunk(chunks[0])]
+            else:
+                chunks_results = list(executor.map(run_chunk, chunks))
+            N_content_total = np.concatenate([chunk_N_content_total for chunk_N_content_total, _ in chunks_results], axis=-1)
+            if event_log is not None:
+                for (start, _, _, _, _, _), (_, step_events) in zip(chunks, chunks_results):
+                    for code, (mask, values) in sorted(step_events.items()):
+                        rows = np.flatnonzero(mask)
+                        event_log.extend(t, events_positions[start + rows], code, np.broadcast_to(values, mask.shape)[rows])
+            t += 1
+            yield rate_mstruct_death, N_content_total
+    finally:
+        if executor is not None:
+            executor.shutdown()
+            for _, chunk_state, _, _, _, _ in chunks:
+                elements_state.present.update(chunk_state.present)
+
+
+def run_steps(roots_state, elements_state, roots_delta_teq, elements_delta_teq, resolved_parameters, nb_steps, update_max_protein=True, opt_full_remob=False,
+              postflowering_stages=False, aggregations=None, nb_threads=1, chunk_size=DEFAULT_CHUNK_SIZE, forced_green_area=None, event_log=None, t=0,
+              balance_checker=None, variables=None, reference_verifier=None, observers=None):
+    """
+    Run several steps of the model, the outputs of each step being the inputs of the next step. The states are updated in place.
+
+    :param RootsState roots_state: the state of the roots.
+    :param ElementsState elements_state: the state of the elements.
+    :param numpy.ndarray roots_delta_teq: the temperature-compensated time of each roots (s).
+    :param numpy.ndarray elements_delta_teq: the temperature-compensated time of each element (s).
+    :param dict resolved_parameters: the parameters, as returned by :func:`resolve_parameters`.
+    :param int nb_steps: the number of steps to run.
+    :param numpy.ndarray update_max_protein: False for the elements with fixed max proteins.
+    :param bool opt_full_remob: whether all proteins should be remobilised.
+    :param bool postflowering_stages: True to run a simulation with postflo parameter.
+    :param dict aggregations: the aggregations of the elements by axis to compute at each step, see :func:`aggregate_by_axis`.
+    :param int nb_threads: the number of threads computing the elements, see :func:`iter_steps`.
+    :param int chunk_size: the number of elements computed at once by a thread.
+    :param numpy.ndarray forced_green_area: the green area forced on each element at each step (m2), with one row by step
+                                            and one column by element, NaN for the elements not forced. None to force no element.
+    :param events.EventLog event_log: the log to append the events of the elements to, or None to log no event.
+    :param int t: the time of the first step, in `event_log`.
+    :param balance.BalanceChecker balance_checker: the checker of the mass balances of the steps, or None to check nothing.
+    :param set variables: the variables of the elements to compute, see :func:`run_elements`.
+    :param verification.ReferenceVerifier reference_verifier: the verifier of samples of the elements against the reference simulation, or None to verify nothing.
+    :param observers.Observers observers: the observers of the steps, which can stop the run before `nb_steps` steps, or None.
+
+    :return: The rate of mstruct loss of each roots and the N content of each element at the last step run (None if no step was run),
+             and the aggregates of each step run.
+    :rtype: tuple [numpy.ndarray, numpy.ndarray, list]
+    """
+    all_aggregates = []
+    rate_mstruct_death = N_content_total = None
+    step_forced_green_area = None if forced_green_area is None else np.empty(len(elements_state))
+    steps = iter_steps(roots_state, elements_state, roots_delta_teq, elements_delta_teq, resolved_parameters, update_max_protein, opt_full_remob,
+                       postflowering_stages, nb_threads, chunk_size, step_forced_green_area, event_log, t, variables)
+    if observers is not None:
+        observers.stopped_step = None
+    try:
+        for step in range(nb_steps):
+            if observers is not None and observers.notify_before_step(step, t + step, roots_state, elements_state):
+                break
+            if forced_green_area is not None:
+                step_forced_green_area[...] = forced_green_area[step]
+            pools_before = balance_checker.pools(elements_state) if balance_checker is not None and balance_checker.sample() else None
+            sample = None
+            if reference_verifier is not None:
+                sample = reference_verifier.sample(t + step, roots_state, elements_state, roots_delta_teq, elements_delta_teq, update_max_protein, step_forced_green_area,
+                                                   opt_full_remob, postflowering_stages)
+            rate_mstruct_death, N_content_total = next(steps)
+            if pools_before is not None:
+                balance_checker.check(t + step, elements_state, pools_before)
+            if sample is not None:
+                reference_verifier.check(sample, roots_state, elements_state, rate_mstruct_death, N_content_total)
+            if aggregations:
+                all_aggregates.append(aggregate_by_axis(elements_state, aggregations))
+            if observers is not None and observers.notify_after_step(step, t + step, roots_state, elements_state, rate_mstruct_death, N_content_total):
+                break
+    finally:
+        steps.close()
+    return rate_mstruct_death, N_content_total, all_aggregates
+
+
+def run_ensemble(inputs, parameters_sets=None, nb_steps=1, forced_max_protein_elements=None, opt_full_remob=False, postflowering_stages=False, callback=None,
+                 dtype=float, full_precision_variables=DEFAULT_FULL_PRECISION_VARIABLES):
+    """
+    Run the model on an ensemble of parameter sets, all the members of the ensemble being computed at once.
+
+    At each step, the outputs of the previous step are used as inputs; the inputs of the axes are constant.
+
+    :param dict inputs: the inputs of the simulation, with the same structure as :attr:`simulation.Simulation.inputs`.
+    :param dict parameters_sets: the values of the parameters by parameter name, see :func:`resolve_parameters`.
+                                 Each value is an array with one value by member of the ensemble.
+    :param int nb_steps: the number of steps to run.
+    :param set forced_max_protein_elements: The elements ids with fixed max proteins.
+    :param bool opt_full_remob: whether all proteins should be remobilised.
+    :param bool postflowering_stages: True to run a simulation with postflo parameter.
+    :param callback: a function called after each step as ``callback(step, roots_state, elements_state)``.
+    :param numpy.dtype dtype: the floating point type of the state, see :meth:`State.from_dict`.
+    :param list full_precision_variables: the variables stored in float64 whatever `dtype`.
+
+    :return: The state of the roots and the state of the elements at the end of the run, with an ensemble dimension.
+    :rtype: tuple [RootsState, ElementsState]
+    """
+    parameters_sets = parameters_sets or {}
+    nb_members = max([np.size(values) for values in parameters_sets.values()] or [1])
+
+    roots_state = RootsState.from_dict(inputs['roots'], dtype, full_precision_variables).replicate(nb_members)
+    elements_state = ElementsState.from_dict(inputs['elements'], dtype, full_precision_variables).replicate(nb_members)
+
+    resolved_parameters = resolve_parameters(elements_state, parameters_sets, dtype)
+    roots_delta_teq = axes_forcings(inputs['axes'], roots_state.axes_ids, 'delta_teq_roots', dtype)
+    elements_delta_teq = axes_forcings(inputs['axes'], elements_state.axes_ids, 'delta_teq', dtype)
+    forced_max_protein_elements = forced_max_protein_elements or set()
+    update_max_protein = np.array([id_ not in forced_max_protein_elements for id_ in elements_state.ids], dtype=bool)
+
+    for step in range(nb_steps):
+        run_roots(roots_state, roots_delta_teq, resolved_parameters, postflowering_stages)
+        run_elements(elements_state, elements_delta_teq, resolved_parameters, update_max_protein, opt_full_remob, postflowering_stages)
+        if callback is not None:
+            callback(step, roots_state, elements_state)
+
+    return roots_state, elements_state
+
+
+def precision_report(inputs, nb_steps=1, dtype=np.float32, full_precision_variables=DEFAULT_FULL_PRECISION_VARIABLES, **run_kwargs):
+    """
+    Run the model in float64 and with a reduced precision state, and report the maximal deviation between both runs.
+
+    :param dict inputs: the inputs of the simulation, for example the regression inputs of the tests.
+    :param int nb_steps: the number of steps to run.
+    :param numpy.dtype dtype: the floating point type of the reduced precision state.
+    :param list full_precision_variables: the variables stored in float64 whatever `dtype`.
+    :param run_kwargs: the other arguments of :func:`run_ensemble`.
+
+    :return: The maximal absolute and relative deviations over the steps and the rows, with one line by (scale, variable).
+    :rtype: pandas.DataFrame
+    """
+    deviations = {}
+
+    def record(step, roots_state, elements_state):
+        reference_states[step] = (roots_state.copy(), elements_state.copy())
+
+    def compare(step, roots_state, elements_state):
+        for scale, state, reference_state in (('roots', roots_state, reference_states[step][0]), ('elements', elements_state, reference_states[step][1])):
+            for name in state.VARIABLES:
+                reference_values = reference_state.columns[name]
+                absolute_deviation = np.abs(state.columns[name].astype(float) - reference_values)
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    relative_deviation = np.where(absolute_deviation == 0, 0., absolute_deviation / np.abs(reference_values))
+                previous_deviation = deviations.get((scale, name), (0., 0., state.columns[name].dtype))
+                deviations[(scale, name)] = (max(previous_deviation[0], np.nanmax(absolute_deviation, initial=0.)),
+                                             max(previous_deviation[1], np.nanmax(relative_deviation, initial=0.)),
+                                             state.columns[name].dtype)
+
+    reference_states = {}
+    run_ensemble(inputs, nb_steps=nb_steps, callback=record, **run_kwargs)
+    run_ensemble(inputs, nb_steps=nb_steps, callback=compare, dtype=dtype, full_precision_variables=full_precision_variables, **run_kwargs)
+
+    return pd.DataFrame([(scale, name, str(variable_dtype), absolute_deviation, relative_deviation)
+                         for (scale, name), (absolute_deviation, relative_deviation, variable_dtype) in sorted(deviations.items())],
+                        columns=['scale', 'variable', 'dtype', 'max_absolute_deviation', 'max_relative_deviation'])
@@ -0,0 +1,207 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import converter
+
+"""
+    senescwheat.events
+    ~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.events` defines the log of the senescence events of the elements:
+
+        * the start of the senescence of an element, triggered by its proteins (:attr:`SENESCENCE_PROTEINS`),
+          by its age (:attr:`SENESCENCE_AGE`) or by a forced green area (:attr:`SENESCENCE_FORCED`),
+        * the end of an element, when it becomes fully senescent (:attr:`OVER`),
+        * the overwriting of the max proteins of an element (:attr:`MAX_PROTEINS_OVERWRITTEN`).
+
+    The events are appended to preallocated arrays, one by field, which grow by doubling.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the senescence of the element starts because its proteins fall below the threshold; the value is the ratio proteins / max_proteins
+SENESCENCE_PROTEINS = 1
+#: the senescence of the element starts because of its age (see :attr:`parameters.AGE_EFFECT_SENESCENCE`); the value is the age
+SENESCENCE_AGE = 2
+#: the senescence of the element starts because its green area is forced (see :meth:`simulation.Simulation.force_green_area`); the value is the green area
+SENESCENCE_FORCED = 3
+#: the element becomes fully senescent; the value is the senesced mstruct
+OVER = 4
+#: the max proteins of the element are overwritten; the value is the new max proteins
+MAX_PROTEINS_OVERWRITTEN = 5
+
+#: the name of each event code
+EVENTS_NAMES = {SENESCENCE_PROTEINS: 'senescence_proteins',
+                SENESCENCE_AGE: 'senescence_age',
+                SENESCENCE_FORCED: 'senescence_forced',
+                OVER: 'over',
+                MAX_PROTEINS_OVERWRITTEN: 'max_proteins_overwritten'}
+
+#: the codes of the events which start the senescence, only logged once by element
+SENESCENCE_EVENTS = [SENESCENCE_PROTEINS, SENESCENCE_AGE, SENESCENCE_FORCED]
+
+#: the columns of the dataframe of the events, after the topology columns
+EVENTS_COLUMNS = ['event', 'value']
+
+
+class EventLog(object):
+    """Append-only log of the events of the elements: one (time, element, event code, value) record by event.
+    """
+
+    def __init__(self, capacity=1024):
+        """
+        :param int capacity: the initial number of events which can be stored without growing the arrays.
+        """
+        #: the ids of the elements, in the order of their registration
+        self.ids = []
+        #: the position of each element id in :attr:`ids`
+        self.index = {}
+        self._started = np.zeros(0, dtype=bool)
+        self._size = 0
+        self._times = np.empty(capacity, dtype=np.int64)
+        self._positions = np.empty(capacity, dtype=np.int64)
+        self._codes = np.empty(capacity, dtype=np.int8)
+        self._values = np.empty(capacity, dtype=float)
+
+    def __len__(self):
+        return self._size
+
+    def positions(self, ids):
+        """
+        Return the positions of elements ids in :attr:`ids`, registering the new ones.
+
+        :param list ids: the elements ids.
+
+        :return: The positions of the elements.
+        :rtype: numpy.ndarray
+        """
+        positions = np.empty(len(ids), dtype=np.int64)
+        for i, id_ in enumerate(ids):
+            position = self.index.get(id_)
+            if position is None:
+                position = self.index[id_] = len(self.ids)
+                self.ids.append(id_)
+            positions[i] = position
+        if len(self._started) < len(self.ids):
+            self._started = np.concatenate([self._started, np.zeros(len(self.ids) - len(self._started), dtype=bool)])
+        return positions
+
+    def _reserve(self, nb_events):
+        """Grow the arrays to store `nb_events` more events."""
+        size = self._size + nb_events
+        if size <= len(self._times):
+            return
+        capacity = max(size, 2 * len(self._times))
+        for name in ('_times', '_positions', '_codes', '_values'):
+            array = getattr(self, name)
+            new_array = np.empty(capacity, dtype=array.dtype)
+            new_array[:self._size] = array[:self._size]
+            setattr(self, name, new_array)
+
+    def extend(self, t, positions, code, values):
+        """
+        Append one event of the same code for several elements.
+
+        The events which start the senescence (:attr:`SENESCENCE_EVENTS`) are only appended for the elements
+        whose senescence has not started yet.
+
+        :param int t: the time of the events.
+        :param numpy.ndarray positions: the positions of the elements, as returned by :meth:`positions`.
+        :param int code: the code of the event.
+        :param numpy.ndarray values: the value of the event of each element.
+        """
+        values = np.broadcast_to(values, np.shape(positions))
+        if code in SENESCENCE_EVENTS:
+            not_started = ~self._started[positions]
+            positions = positions[not_started]
+            values = values[not_started]
+            self._started[positions] = True
+        nb_events = len(positions)
+        if not nb_events:
+            return
+        self._reserve(nb_events)
+        events = slice(self._size, self._size + nb_events)
+        self._times[events] = t
+        self._positions[events] = positions
+        self._codes[events] = code
+        self._values[events] = values
+        self._size += nb_events
+
+    def append(self, t, element_id, code, value):
+        """
+        Append one event, see :meth:`extend`.
+
+        :param int t: the time of the event.
+        :param tuple element_id: the element id.
+        :param int code: the code of the event.
+        :param float value: the value of the event.
+        """
+        self.extend(t, self.positions([element_id]), code, [value])
+
+    def subset(self, ids):
+        """
+        Return an empty log for some elements, which knows the elements whose senescence has started. See :meth:`merge`.
+
+        :param list ids: the elements ids.
+
+        :return: The new log.
+        :rtype: EventLog
+        """
+        positions = self.positions(ids)
+        event_log = EventLog()
+        event_log.positions(ids)
+        event_log._started[:] = self._started[positions]
+        return event_log
+
+    def merge(self, other):
+        """
+        Append the events of another log.
+
+        :param EventLog other: the other log, for example a log returned by :meth:`subset`.
+        """
+        positions = self.positions(other.ids)
+        self._started[positions] |= other._started
+        self._reserve(len(other))
+        events = slice(self._size, self._size + len(other))
+        self._times[events] = other._times[:len(other)]
+        self._positions[events] = positions[other._positions[:len(other)]]
+        self._codes[events] = other._codes[:len(other)]
+        self._values[events] = other._values[:len(other)]
+        self._size += len(other)
+
+    def clear(self):
+        """Remove all the events, and forget the elements whose senescence has started."""
+        self._size = 0
+        self._started[:] = False
+
+    def to_arrays(self):
+        """
+        Return the events as arrays: the times, the positions of the elements in :attr:`ids`, the codes and the values.
+
+        :return: The arrays, which are views on the log.
+        :rtype: tuple [numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray]
+        """
+        return self._times[:self._size], self._positions[:self._size], self._codes[:self._size], self._values[:self._size]
+
+    def to_dataframe(self):
+        """
+        Convert the events to a dataframe, sorted by time, element and event.
+
+        :return: The events, with the columns :attr:`converter.TIME_COLUMN`, :attr:`converter.ELEMENTS_TOPOLOGY_COLUMNS` and :attr:`EVENTS_COLUMNS`.
+        :rtype: pandas.DataFrame
+        """
+        times, positions, codes, values = self.to_arrays()
+        events_df = pd.DataFrame([self.ids[position] for position in positions], columns=converter.ELEMENTS_TOPOLOGY_COLUMNS)
+        events_df.insert(0, converter.TIME_COLUMN, times)
+        events_df['code'] = codes
+        events_df['value'] = values
+        events_df.sort_values([converter.TIME_COLUMN] + converter.ELEMENTS_TOPOLOGY_COLUMNS + ['code'], inplace=True, kind='stable')
+        events_df['event'] = events_df['code'].map(EVENTS_NAMES)
+        events_df.reset_index(drop=True, inplace=True)
+        return events_df[[converter.TIME_COLUMN] + converter.ELEMENTS_TOPOLOGY_COLUMNS + EVENTS_COLUMNS]
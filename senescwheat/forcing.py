@@ -0,0 +1,97 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+import numpy as np
+
+from senescwheat import converter
+
+"""
+    senescwheat.forcing
+    ~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.forcing` defines the forcing of the green area of the elements by observed kinetics.
+
+    The observations are loaded once in a dense array with one row by time and one column by element,
+    so that the forced green area of all the elements at one step is read with a single gather.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+class ForcedGreenArea(object):
+    """Observed green area of the elements, indexed by time and element id.
+
+    The missing observations are NaN: the green area of an element is only forced at the times it is observed.
+    """
+
+    def __init__(self, observations):
+        """
+        :param pandas.DataFrame observations: the observed green area, with one line by time and element: the column :attr:`converter.TIME_COLUMN`,
+                                              the columns :attr:`converter.ELEMENTS_TOPOLOGY_COLUMNS` and the column `green_area`.
+        """
+        observations = observations.dropna(subset=['green_area'])
+        times = observations[converter.TIME_COLUMN].values
+        ids = list(observations[converter.ELEMENTS_TOPOLOGY_COLUMNS].itertuples(index=False, name=None))
+        #: the observed times, sorted
+        self.times = sorted(set(times.tolist()))
+        #: the row of each time in :attr:`values`
+        self.times_index = {t: row for row, t in enumerate(self.times)}
+        #: the ids of the observed elements
+        self.ids = sorted(set(ids))
+        #: the column of each element id in :attr:`values`
+        self.index = {id_: column for column, id_ in enumerate(self.ids)}
+        #: The observed green area (m2), with one row by time and one column by element.
+        #: The last row and the last column are NaN, to gather the times and the elements which are not observed.
+        self.values = np.full((len(self.times) + 1, len(self.ids) + 1), np.nan)
+        self.values[[self.times_index[t] for t in times.tolist()], [self.index[id_] for id_ in ids]] = observations['green_area'].values
+
+    def positions(self, ids):
+        """
+        Return the columns of :attr:`values` of elements. The elements which are not observed get the NaN column.
+
+        :param list ids: the elements ids.
+
+        :return: The columns of the elements.
+        :rtype: numpy.ndarray
+        """
+        return np.array([self.index.get(id_, -1) for id_ in ids], dtype=int)
+
+    def at(self, t, positions):
+        """
+        Return the forced green area at time `t`.
+
+        :param t: the time.
+        :param numpy.ndarray positions: the columns of the elements, as returned by :meth:`positions`.
+
+        :return: The forced green area of the elements (m2), NaN for the elements not observed at `t`.
+        :rtype: numpy.ndarray
+        """
+        return self.values[self.times_index.get(t, -1), positions]
+
+    def table(self, times, positions):
+        """
+        Return the forced green area at several times.
+
+        :param list times: the times.
+        :param numpy.ndarray positions: the columns of the elements, as returned by :meth:`positions`.
+
+        :return: The forced green area (m2), with one row by time and one column by element, NaN for the missing observations.
+        :rtype: numpy.ndarray
+        """
+        rows = np.array([self.times_index.get(t, -1) for t in times], dtype=int)
+        return self.values[np.ix_(rows, positions)]
+
+    def get(self, t, element_id):
+        """
+        Return the forced green area of one element at time `t`.
+
+        :param t: the time.
+        :param tuple element_id: the element id.
+
+        :return: The forced green area (m2), NaN if the element is not observed at `t`.
+        :rtype: float
+        """
+        return self.values[self.times_index.get(t, -1), self.index.get(element_id, -1)].item()
@@ -1,6 +1,9 @@
 # -*- coding: latin-1 -*-
 
 from __future__ import division  # use '//' to do integer division
+
+import numpy as np
+
 from senescwheat import parameters
 
 """
@@ -9,12 +12,43 @@ from senescwheat import parameters
 
     Model of senescence.
 
+    The functions of :class:`SenescenceModel` accept either scalars, for one element, or arrays of the same shape, for a batch of elements,
+    in which case the names of the organs, the indices of the metamers and the flags are arrays too. The results are then arrays of the same shape,
+    equal to the results computed element by element. The computations on scalars are unchanged.
+
+    The parameters which can differ from one plant to another (see :attr:`engine.PLANTS_PARAMETERS`) can be given to the functions,
+    for the element or by element for a batch. They are read from :mod:`senescwheat.parameters` otherwise.
+
     :copyright: Copyright 2014-2015 INRA-ECOSYS, see AUTHORS.
     :license: see LICENSE for details.
 
 """
 
 
+def _is_batch(*values):
+    """Return True if one of the values is an array or a sequence, i.e. if a function is called on a batch of elements."""
+    for value in values:
+        if isinstance(value, np.ndarray) or (hasattr(value, '__len__') and not isinstance(value, str)):
+            return True
+    return False
+
+
+def _as_float_array(value):
+    """Convert a value of a batch to a floating point array, keeping the type of the floating point arrays, for example float32.
+    The scalars are kept as Python floats, so that they take the type of the arrays they are combined with."""
+    if np.ndim(value) == 0 and not isinstance(value, np.ndarray):
+        return float(value)
+    value = np.asarray(value)
+    return value if value.dtype.kind == 'f' else value.astype(float)
+
+
+def _fraction_N_max(organ_name, fraction_N_max):
+    """The fraction of the max proteins under which each element of a batch senesces, from the names of their organs if not given."""
+    if fraction_N_max is None:
+        return np.where(np.asarray(organ_name) == 'blade', parameters.FRACTION_N_MAX['blade'], parameters.FRACTION_N_MAX['stem'])
+    return fraction_N_max
+
+
 class SenescenceModel(object):
 
     @classmethod
@@ -45,11 +79,25 @@ class SenescenceModel(object):
         :rtype: tuple [float, float]
         """
         new_green_area = green_area_df.get_group(group_id).green_area.values[0]
+        return cls.calculate_relative_delta_forced_green_area(prev_green_area, new_green_area)
+
+    @classmethod
+    def calculate_relative_delta_forced_green_area(cls, prev_green_area, forced_green_area):
+        """relative green_area variation when the green area is forced
+
+        :param float prev_green_area: previous value of an organ green area (m-2)
+        :param float forced_green_area: forced value of the organ green area (m-2)
+
+        :return: new_green_area (m-2), relative_delta_green_area (dimensionless)
+        :rtype: tuple [float, float]
+        """
+        new_green_area = forced_green_area
         relative_delta_green_area = (prev_green_area - new_green_area) / prev_green_area
         return new_green_area, relative_delta_green_area
 
     @classmethod
-    def calculate_relative_delta_green_area(cls, organ_name, prev_green_area, proteins, max_proteins, delta_t, update_max_protein):
+    def calculate_relative_delta_green_area(cls, organ_name, prev_green_area, proteins, max_proteins, delta_t, update_max_protein, fraction_N_max=None,
+                                            senescence_max_rate=None):
         """relative green_area variation due to senescence
 
         :param str organ_name: name of the organ to which belongs the element (used to distinguish lamina from stem organs)
@@ -58,17 +106,32 @@ class SenescenceModel(object):
         :param float max_proteins: maximal protein concentrations experienced by the organ (mol N proteins g-1 mstruct)
         :param float delta_t: value of the timestep (s)
         :param bool update_max_protein: whether to update the max proteins or not.
+        :param float fraction_N_max: fraction of the max proteins under which the element senesces. The value of `parameters.FRACTION_N_MAX` for the organ by default.
+        :param float senescence_max_rate: maximal senescence rate (m2 s-1). `parameters.SENESCENCE_MAX_RATE` by default.
 
         :return: new_green_area (m-2), relative_delta_green_area (dimensionless)
         :rtype: tuple [float, float]
 
         .. todo:: remove update_max_protein
         """
-
-        if organ_name == 'blade':
-            fraction_N_max = parameters.FRACTION_N_MAX['blade']
-        else:
-            fraction_N_max = parameters.FRACTION_N_MAX['stem']
+        if senescence_max_rate is None:
+            senescence_max_rate = parameters.SENESCENCE_MAX_RATE
+
+        if _is_batch(organ_name, prev_green_area, proteins, max_proteins, delta_t, update_max_protein):
+            prev_green_area, proteins, max_proteins = _as_float_array(prev_green_area), _as_float_array(proteins), _as_float_array(max_proteins)
+            overwritten = (max_proteins < proteins) & np.asarray(update_max_protein, dtype=bool)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                senescing = ~overwritten & ((max_proteins == 0) | ((proteins / max_proteins) < _fraction_N_max(organ_name, fraction_N_max)))
+                senesced_area = np.minimum(prev_green_area, senescence_max_rate * _as_float_array(delta_t))
+                new_green_area = np.where(senescing, np.maximum(0., prev_green_area - senesced_area), prev_green_area)
+                relative_delta_green_area = np.where(senescing, senesced_area / prev_green_area, 0.)
+            return new_green_area, relative_delta_green_area, np.where(overwritten, proteins, max_proteins)
+
+        if fraction_N_max is None:
+            if organ_name == 'blade':
+                fraction_N_max = parameters.FRACTION_N_MAX['blade']
+            else:
+                fraction_N_max = parameters.FRACTION_N_MAX['stem']
 
         # Overwrite max proteins
         if max_proteins < proteins and update_max_protein:
@@ -77,7 +140,7 @@ class SenescenceModel(object):
             relative_delta_green_area = 0
         # Senescence if (actual proteins/max_proteins) < fraction_N_max
         elif max_proteins == 0 or (proteins / max_proteins) < fraction_N_max:
-            senesced_area = min(prev_green_area, parameters.SENESCENCE_MAX_RATE * delta_t)
+            senesced_area = min(prev_green_area, senescence_max_rate * delta_t)
             new_green_area = max(0., prev_green_area - senesced_area)
             relative_delta_green_area = senesced_area / prev_green_area
         else:
@@ -87,7 +150,8 @@ class SenescenceModel(object):
 
     # Temporaire
     @classmethod
-    def calculate_relative_delta_senesced_length(cls, organ_name, prev_senesced_length, length, proteins, max_proteins, delta_t, update_max_protein):
+    def calculate_relative_delta_senesced_length(cls, organ_name, prev_senesced_length, length, proteins, max_proteins, delta_t, update_max_protein, fraction_N_max=None,
+                                                 senescence_length_max_rate=None):
         """relative senesced length variation
 
         :param str organ_name: name of the organ to which belongs the element (used to distinguish lamina from stem organs)
@@ -97,17 +161,34 @@ class SenescenceModel(object):
         :param float max_proteins: maximal protein concentrations experienced by the organ (mol N proteins g-1 mstruct)
         :param float delta_t: value of the timestep (s)
         :param bool update_max_protein: whether to update the max proteins or not.
+        :param float fraction_N_max: fraction of the max proteins under which the element senesces. The value of `parameters.FRACTION_N_MAX` for the organ by default.
+        :param float senescence_length_max_rate: maximal senescence rate (m s-1). `parameters.SENESCENCE_LENGTH_MAX_RATE` by default.
 
         :return: new_senesced_length (m), relative_delta_senesced_length (dimensionless), max_proteins (mol N proteins g-1 mstruct)
         :rtype: tuple [float, float, float]
         
         .. todo:: remove update_max_protein
         """
-
-        if organ_name == 'blade':
-            fraction_N_max = parameters.FRACTION_N_MAX['blade']
-        else:
-            fraction_N_max = parameters.FRACTION_N_MAX['stem']
+        if senescence_length_max_rate is None:
+            senescence_length_max_rate = parameters.SENESCENCE_LENGTH_MAX_RATE
+
+        if _is_batch(organ_name, prev_senesced_length, length, proteins, max_proteins, delta_t, update_max_protein):
+            prev_senesced_length, length = _as_float_array(prev_senesced_length), _as_float_array(length)
+            proteins, max_proteins = _as_float_array(proteins), _as_float_array(max_proteins)
+            overwritten = (max_proteins < proteins) & np.asarray(update_max_protein, dtype=bool)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                senescing = ~overwritten & ((max_proteins == 0) | ((proteins / max_proteins) < _fraction_N_max(organ_name, fraction_N_max)))
+                new_senesced_length = np.where(senescing,
+                                               np.minimum(length, prev_senesced_length + senescence_length_max_rate * _as_float_array(delta_t)),
+                                               prev_senesced_length)
+                relative_delta_senesced_length = np.where(length == new_senesced_length, 1., 1 - (length - new_senesced_length) / (length - prev_senesced_length))
+            return new_senesced_length, np.where(senescing, relative_delta_senesced_length, 0.), np.where(overwritten, proteins, max_proteins)
+
+        if fraction_N_max is None:
+            if organ_name == 'blade':
+                fraction_N_max = parameters.FRACTION_N_MAX['blade']
+            else:
+                fraction_N_max = parameters.FRACTION_N_MAX['stem']
 
         # Overwrite max proteins
         if max_proteins < proteins and update_max_protein:
@@ -116,7 +197,7 @@ class SenescenceModel(object):
             relative_delta_senesced_length = 0
         # Senescence if (actual proteins/max_proteins) < fraction_N_max
         elif max_proteins == 0 or (proteins / max_proteins) < fraction_N_max:
-            senesced_length = parameters.SENESCENCE_LENGTH_MAX_RATE * delta_t
+            senesced_length = senescence_length_max_rate * delta_t
             new_senesced_length = min(length, prev_senesced_length + senesced_length)
             if length == new_senesced_length:
                 relative_delta_senesced_length = 1
@@ -155,23 +236,30 @@ class SenescenceModel(object):
         return metabolite * relative_delta_structure
 
     @classmethod
-    def calculate_if_element_is_over(cls, green_area, is_growing, mstruct):
+    def calculate_if_element_is_over(cls, green_area, is_growing, mstruct, min_green_area=None):
         """Define is an element is fully senescent
 
         :param float green_area: Green area of the element (m2)
         :param bool is_growing: flag is the element is still growing
         :param float mstruct: Strucural mass of the element (g)
+        :param float min_green_area: Minimal green area of the element (m2). `parameters.MIN_GREEN_AREA` by default.
 
         :return: is_over which indicates if the element is fully senescent
         :rtype: bool
         """
+        if min_green_area is None:
+            min_green_area = parameters.MIN_GREEN_AREA
+
+        if _is_batch(green_area, is_growing, mstruct):
+            return ((np.asarray(green_area) < min_green_area) | (np.asarray(mstruct) == 0)) & ~np.asarray(is_growing, dtype=bool)
+
         is_over = False
-        if (green_area < parameters.MIN_GREEN_AREA or mstruct == 0) and not is_growing:
+        if (green_area < min_green_area or mstruct == 0) and not is_growing:
             is_over = True
         return is_over
 
     @classmethod
-    def calculate_remobilisation_proteins(cls, organ, element_index, proteins, relative_delta_green_area, ratio_N_mstruct_max, full_remob):
+    def calculate_remobilisation_proteins(cls, organ, element_index, proteins, relative_delta_green_area, ratio_N_mstruct_max, full_remob, ratio_N_mstruct=None):
         """Protein remobilisation due to senescence over DELTA_T. Part is remobilised as amino_acids (mol N), the rest is increasing Nresidual (g).
         
         :param str organ: name of the organ
@@ -180,18 +268,34 @@ class SenescenceModel(object):
         :param float relative_delta_green_area: relative variation of a photosynthetic element green area
         :param float ratio_N_mstruct_max: N content in the whole element (both green and senesced tissues).
         :param bool full_remob: whether all proteins should be remobilised
+        :param float ratio_N_mstruct: residual mass of N in 1 g of mstruct at full senescence of the blade.
+                                      The value of `parameters.RATIO_N_MSTRUCT` for the phytomer rank by default.
         
         :return: Quantity of proteins remobilised either in amino acids, either in residual N (mol),
                  Quantity of proteins converted into amino_acids (mol N), 
                  Increment of Nresidual (g)
         :rtype: tuple [float, float, float]
         """
+        if _is_batch(organ, element_index, proteins, relative_delta_green_area, ratio_N_mstruct_max, full_remob):
+            proteins, element_index = np.asarray(proteins, dtype=float), np.asarray(element_index)
+            if ratio_N_mstruct is None:
+                # the ratios of the phytomer ranks of the batch, looked up once by rank
+                ranks, ranks_positions = np.unique(element_index, return_inverse=True)
+                ranks_ratios = np.array([parameters.RATIO_N_MSTRUCT.get(rank, parameters.DEFAULT_RATIO_N_MSTRUCT) for rank in ranks.tolist()])
+                ratio_N_mstruct = ranks_ratios[ranks_positions].reshape(element_index.shape)
+            # the elements whose proteins are all converted into Nresidual
+            residual = ~np.asarray(full_remob, dtype=bool) & (np.asarray(organ) == 'blade') & (np.asarray(ratio_N_mstruct_max) <= ratio_N_mstruct)
+            partial_remob_proteins = proteins * relative_delta_green_area
+            return (np.where(residual, proteins, partial_remob_proteins), np.where(residual, 0., partial_remob_proteins),
+                    np.where(residual, proteins * 1E-6 * parameters.N_MOLAR_MASS, 0.))
 
         if full_remob or organ != 'blade':
             remob_proteins = delta_amino_acids = proteins * relative_delta_green_area
             delta_Nresidual = 0
         else:
-            if ratio_N_mstruct_max <= parameters.RATIO_N_MSTRUCT.get(element_index, parameters.DEFAULT_RATIO_N_MSTRUCT):  # all the proteins are converted into Nresidual
+            if ratio_N_mstruct is None:
+                ratio_N_mstruct = parameters.RATIO_N_MSTRUCT.get(element_index, parameters.DEFAULT_RATIO_N_MSTRUCT)
+            if ratio_N_mstruct_max <= ratio_N_mstruct:  # all the proteins are converted into Nresidual
                 remob_proteins = proteins
                 delta_Nresidual = remob_proteins * 1E-6 * parameters.N_MOLAR_MASS
                 delta_amino_acids = 0
@@ -211,7 +315,9 @@ class SenescenceModel(object):
         :return: Rate of mstruct loss by root senescence (g mstruct s-1), rate of Nstruct loss by root senescence (g Nstruct s-1)
         :rtype: tuple [float, float]
         """
-        if postflowering_stages:
+        if _is_batch(postflowering_stages):
+            rate_senescence = np.where(postflowering_stages, parameters.SENESCENCE_ROOTS_POSTFLOWERING, parameters.SENESCENCE_ROOTS_PREFLOWERING)
+        elif postflowering_stages:
             rate_senescence = parameters.SENESCENCE_ROOTS_POSTFLOWERING
         else:
             rate_senescence = parameters.SENESCENCE_ROOTS_PREFLOWERING
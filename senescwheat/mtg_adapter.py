@@ -0,0 +1,185 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+import math
+
+from senescwheat import converter
+from senescwheat import records
+from senescwheat import views
+
+"""
+    senescwheat.mtg_adapter
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.mtg_adapter` exchanges the inputs and outputs of Senesc-Wheat with an
+    `OpenAlea MTG <https://mtg.readthedocs.io>`_ which describes the canopy, as in the coupling of the models of a plant architecture platform.
+
+    The MTG has the scales plant / axis / metamer / organ / element: the topology of an element, as defined by
+    :attr:`converter.ELEMENTS_TOPOLOGY_COLUMNS`, is the index of its plant, the label of its axis, the index of its metamer,
+    the label of its organ and its own label. The inputs of the roots of an axis are a dictionary in the property
+    :attr:`ROOTS_PROPERTY` of the axis.
+
+    :class:`MTGAdapter` walks the MTG once to map the vertices to the ids of Senesc-Wheat, and keeps this mapping while
+    the MTG has the same number of vertices. The properties are then read and written by property, for all the vertices
+    at once, and only the values which changed are written.
+
+    OpenAlea is not a dependency of Senesc-Wheat: the adapter only uses the interface of :class:`openalea.mtg.MTG`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the property of the axes which holds the properties of their roots, as a dictionary
+ROOTS_PROPERTY = 'roots'
+
+_MISSING = object()
+
+
+def _same(value, other_value):
+    """Return True if two values of a property are equal, NaN being equal to NaN."""
+    if value is _MISSING or other_value is _MISSING:
+        return value is other_value
+    if isinstance(value, float) and isinstance(other_value, float) and math.isnan(value) and math.isnan(other_value):
+        return True
+    return value == other_value
+
+
+class MTGAdapter(object):
+    """Read the inputs of Senesc-Wheat from an MTG, and write its outputs to the MTG.
+    """
+
+    def __init__(self, g):
+        """
+        :param openalea.mtg.MTG g: the MTG of the canopy.
+        """
+        #: the MTG of the canopy
+        self.g = g
+        #: the ids of the axes, in the order of the MTG
+        self.axes_ids = []
+        #: the vertex of each axis of :attr:`axes_ids`
+        self.axes_vids = []
+        #: the ids of the elements, in the order of the MTG
+        self.elements_ids = []
+        #: the vertex of each element of :attr:`elements_ids`
+        self.elements_vids = []
+        #: the vertex of each axis id and of each element id
+        self.vids = {}
+        self._nb_vertices = None
+
+    def refresh(self):
+        """Walk the MTG to map its vertices to the ids of the axes and of the elements."""
+        g = self.g
+        self.axes_ids, self.axes_vids, self.elements_ids, self.elements_vids = [], [], [], []
+        for plant_vid in g.components_iter(g.root):
+            plant_index = int(g.index(plant_vid))
+            for axis_vid in g.components_iter(plant_vid):
+                axis_id = (plant_index, g.label(axis_vid))
+                self.axes_ids.append(axis_id)
+                self.axes_vids.append(axis_vid)
+                for metamer_vid in g.components_iter(axis_vid):
+                    metamer_index = int(g.index(metamer_vid))
+                    for organ_vid in g.components_iter(metamer_vid):
+                        organ_label = g.label(organ_vid)
+                        for element_vid in g.components_iter(organ_vid):
+                            self.elements_ids.append(axis_id + (metamer_index, organ_label, g.label(element_vid)))
+                            self.elements_vids.append(element_vid)
+        self.vids = dict(zip(self.axes_ids, self.axes_vids))
+        self.vids.update(zip(self.elements_ids, self.elements_vids))
+        self._nb_vertices = g.nb_vertices()
+
+    def _check_topology(self):
+        """Walk the MTG again if its number of vertices changed. Call :meth:`refresh` after any other change of the topology."""
+        if self.g.nb_vertices() != self._nb_vertices:
+            self.refresh()
+
+    def _read(self, properties, vids, names, record_type):
+        """Gather the properties `names` of `vids`, and build the records of the vertices which have all of them."""
+        columns = [[properties.get(name, {}).get(vid) for vid in vids] for name in names]
+        all_records = []
+        for values in zip(*columns):
+            all_records.append(None if None in values else record_type(zip(names, values)))
+        return all_records
+
+    def read_inputs(self):
+        """
+        Read the inputs of Senesc-Wheat from the MTG. Only the roots, axes and elements which have all their inputs are read.
+
+        :return: The inputs, with the structure of :attr:`simulation.Simulation.inputs`.
+        :rtype: dict
+        """
+        self._check_topology()
+        properties = self.g.properties()
+        all_roots_inputs = {}
+        roots_properties = properties.get(ROOTS_PROPERTY, {})
+        for axis_id, axis_vid in zip(self.axes_ids, self.axes_vids):
+            roots_inputs = roots_properties.get(axis_vid)
+            if roots_inputs is not None and all(name in roots_inputs for name in converter.SENESCWHEAT_ROOTS_INPUTS):
+                all_roots_inputs[axis_id] = records.RootsRecord((name, roots_inputs[name]) for name in converter.SENESCWHEAT_ROOTS_INPUTS)
+        all_axes_inputs = {}
+        for axis_id, axis_inputs in zip(self.axes_ids, self._read(properties, self.axes_vids, converter.SENESCWHEAT_AXES_INPUTS, dict)):
+            if axis_inputs is not None:
+                all_axes_inputs[axis_id] = axis_inputs
+        all_elements_inputs = {}
+        for element_id, element_inputs in zip(self.elements_ids, self._read(properties, self.elements_vids, converter.SENESCWHEAT_ELEMENTS_INPUTS, records.ElementRecord)):
+            if element_inputs is not None:
+                all_elements_inputs[element_id] = element_inputs
+        return {'roots': all_roots_inputs, 'axes': all_axes_inputs, 'elements': all_elements_inputs}
+
+    def write_outputs(self, outputs):
+        """
+        Write the outputs of Senesc-Wheat to the MTG. Only the values which differ from the values of the MTG are written.
+
+        :param dict outputs: the outputs, with the structure of :attr:`simulation.Simulation.outputs`.
+
+        :return: The number of values written.
+        :rtype: int
+        """
+        self._check_topology()
+        g = self.g
+        nb_values = 0
+        properties = g.properties()
+
+        # roots
+        if ROOTS_PROPERTY not in properties:
+            g.add_property(ROOTS_PROPERTY)
+        roots_properties = g.property(ROOTS_PROPERTY)
+        for roots_id, roots_outputs in outputs.get('roots', {}).items():
+            roots_inputs = roots_properties.setdefault(self.vids[roots_id], {})
+            changed = {name: value for name, value in roots_outputs.items() if not _same(roots_inputs.get(name, _MISSING), value)}
+            roots_inputs.update(changed)
+            nb_values += len(changed)
+
+        # elements, by property
+        all_elements_outputs = outputs.get('elements', {})
+        elements_vids = [self.vids[element_id] for element_id in all_elements_outputs]
+        if isinstance(all_elements_outputs, views.OutputsView):
+            # the values are read by column, without building the records
+            names = all_elements_outputs.variables
+            optional_names = all_elements_outputs.optional_variables
+
+            def property_values(name):
+                values = all_elements_outputs.column(name).tolist()
+                if name in optional_names:
+                    values = [_MISSING if value != value else value for value in values]  # NaN if the element does not have this output
+                return values
+        else:
+            all_records = list(all_elements_outputs.values())
+            names = set()
+            for element_outputs in all_records:
+                names.update(element_outputs.keys())
+
+            def property_values(name):
+                return [element_outputs.get(name, _MISSING) for element_outputs in all_records]
+        for name in sorted(names):
+            if name not in properties:
+                g.add_property(name)
+            element_property = g.property(name)
+            changed = {}
+            for vid, value in zip(elements_vids, property_values(name)):
+                if value is not _MISSING and not _same(element_property.get(vid, _MISSING), value):
+                    changed[vid] = value
+            element_property.update(changed)
+            nb_values += len(changed)
+        return nb_values
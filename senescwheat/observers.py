@@ -0,0 +1,171 @@
+# -*- coding: latin-1 -*-
+
+from collections.abc import Mapping
+
+import numpy as np
+
+"""
+    senescwheat.observers
+    ~~~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.observers` defines the observers of the steps of the :mod:`engine <senescwheat.engine>`.
+
+    An observer is a function called before or after the steps of :meth:`simulation.Simulation.run_steps` and :meth:`simulation.Simulation.iter_run`,
+    for example to monitor a long run, to plot it live or to stop it early. It is called with the index of the step in the run, the time of the step,
+    and read-only :class:`StateView` of the roots and of the elements. It returns True to stop the run, see :func:`stop_when_all_over`.
+    See :meth:`simulation.Simulation.add_observer`.
+
+    The observers are only looked for when at least one observer is registered: the runs without observer are unchanged.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the observers called before a step, on the state before the step
+BEFORE_STEP = 'before'
+
+#: the observers called after a step, on the state reached by the step
+AFTER_STEP = 'after'
+
+
+class StateView(Mapping):
+    """Read-only mapping of the columns of a state of the engine, by variable name. The arrays are read-only views, not copies:
+    they are only valid during the call of the observer.
+    """
+
+    def __init__(self, state, extra_columns=None):
+        """
+        :param engine.State state: the state of the roots or of the elements.
+        :param dict extra_columns: other variables, by variable name, with one value by row of the state.
+        """
+        #: the ids of the rows, in rows order
+        self.ids = state.ids
+        #: the row of each id
+        self.index = state.index
+        #: True for the rows computed by the model, or None for the roots
+        self.is_computed = getattr(state, 'is_computed', None)
+        if self.is_computed is not None:
+            self.is_computed = self.is_computed.view()
+            self.is_computed.flags.writeable = False
+        self._columns = state.columns if not extra_columns else dict(state.columns, **extra_columns)
+
+    def __getitem__(self, name):
+        array = self._columns[name].view()
+        array.flags.writeable = False
+        return array
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+
+def stop_when_all_over(step, t, roots, elements):
+    """
+    Observer which stops the run when all the computed elements are over, i.e. fully senescent.
+
+    :return: True if all the computed elements are over.
+    :rtype: bool
+    """
+    return bool(np.all(elements['is_over'][elements.is_computed]))
+
+
+class Observers(object):
+    """The observers registered on a simulation, with the period of each observer.
+    """
+
+    def __init__(self):
+        #: the observers called before each step: [(observer, every), ...]
+        self.before_step = []
+        #: the observers called after each step: [(observer, every), ...]
+        self.after_step = []
+        #: the index of the step at which the last run was stopped by an observer, or None if the last run was not stopped
+        self.stopped_step = None
+
+    def __len__(self):
+        return len(self.before_step) + len(self.after_step)
+
+    def add(self, observer, when=AFTER_STEP, every=1):
+        """
+        Register an observer.
+
+        :param observer: the function called at the steps: ``observer(step, t, roots, elements)``, `roots` and `elements` being :class:`StateView`.
+                         After a step, `roots` has the column `rate_mstruct_death` and `elements` has the column `N_content_total`.
+                         The observer returns True to stop the run.
+        :param str when: :attr:`BEFORE_STEP` or :attr:`AFTER_STEP`.
+        :param int every: call the observer at one step out of `every`, from the first step of each run.
+
+        :raises ValueError: if `when` or `every` is not valid.
+        """
+        if when not in (BEFORE_STEP, AFTER_STEP):
+            raise ValueError('Unknown observation time: {}. Must be {} or {}'.format(when, BEFORE_STEP, AFTER_STEP))
+        if every < 1:
+            raise ValueError('The period of an observer must be at least 1, not {}'.format(every))
+        (self.before_step if when == BEFORE_STEP else self.after_step).append((observer, every))
+
+    def remove(self, observer):
+        """
+        Unregister an observer.
+
+        :param observer: the observer, as given to :meth:`add`.
+
+        :raises ValueError: if the observer is not registered.
+        """
+        nb_observers = len(self)
+        self.before_step = [(registered, every) for registered, every in self.before_step if registered is not observer]
+        self.after_step = [(registered, every) for registered, every in self.after_step if registered is not observer]
+        if len(self) == nb_observers:
+            raise ValueError('Unknown observer: {!r}'.format(observer))
+
+    def copy(self):
+        """Return a copy of the registrations. The observers themselves are shared."""
+        new_observers = Observers()
+        new_observers.before_step = list(self.before_step)
+        new_observers.after_step = list(self.after_step)
+        return new_observers
+
+    def _notify(self, registered_observers, step, t, roots, elements):
+        stop = False
+        for observer, every in registered_observers:
+            if step % every == 0 and observer(step, t, roots, elements):
+                stop = True
+        if stop:
+            self.stopped_step = step
+        return stop
+
+    def notify_before_step(self, step, t, roots_state, elements_state):
+        """
+        Call the observers of :attr:`before_step` due at a step.
+
+        :param int step: the index of the step in the run.
+        :param t: the time of the step.
+        :param engine.RootsState roots_state: the state of the roots before the step.
+        :param engine.ElementsState elements_state: the state of the elements before the step.
+
+        :return: True if an observer requested to stop the run. The step must not be run.
+        :rtype: bool
+        """
+        if not any(step % every == 0 for _, every in self.before_step):
+            return False
+        return self._notify(self.before_step, step, t, StateView(roots_state), StateView(elements_state))
+
+    def notify_after_step(self, step, t, roots_state, elements_state, rate_mstruct_death, N_content_total):
+        """
+        Call the observers of :attr:`after_step` due at a step.
+
+        :param int step: the index of the step in the run.
+        :param t: the time of the step.
+        :param engine.RootsState roots_state: the state of the roots after the step.
+        :param engine.ElementsState elements_state: the state of the elements after the step.
+        :param numpy.ndarray rate_mstruct_death: the rate of mstruct loss of each roots at the step.
+        :param numpy.ndarray N_content_total: the N content of each element at the step.
+
+        :return: True if an observer requested to stop the run after this step.
+        :rtype: bool
+        """
+        if not any(step % every == 0 for _, every in self.after_step):
+            return False
+        return self._notify(self.after_step, step, t, StateView(roots_state, {'rate_mstruct_death': rate_mstruct_death}),
+                            StateView(elements_state, {'N_content_total': N_content_total}))
@@ -0,0 +1,212 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from senescwheat import engine
+
+"""
+    senescwheat.parallel
+    ~~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.parallel` runs the :mod:`engine <senescwheat.engine>` on one canopy with several worker processes.
+
+    The roots and the elements are independent of each other within a step, and each one only reads the inputs of its own axis.
+    The canopy is thus split by plant into shards, and each worker runs all the steps on its shard.
+    The state is copied once into :mod:`shared memory <multiprocessing.shared_memory>`, with the rows of each shard contiguous:
+    each worker updates its slice in place, and the state is never pickled. The results are the same as the ones of a serial run.
+
+    This module needs Python >= 3.8.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def partition_plants(roots_state, elements_state, nb_shards):
+    """
+    Split the plants in shards with balanced numbers of active elements, i.e. the computed elements which are not over.
+
+    :param engine.RootsState roots_state: the state of the roots.
+    :param engine.ElementsState elements_state: the state of the elements.
+    :param int nb_shards: the number of shards.
+
+    :return: The plants of each shard. Some shards are empty if there are less plants than shards.
+    :rtype: list [list]
+    """
+    active_elements = elements_state.is_computed & ~elements_state.columns['is_over']
+    loads = {id_[0]: 0 for id_ in roots_state.ids + elements_state.ids}
+    for id_, active in zip(elements_state.ids, active_elements):
+        loads[id_[0]] += int(active)
+    shards = [[] for _ in range(nb_shards)]
+    shards_loads = [0] * nb_shards
+    # longest processing time first: give each plant, from the most loaded one, to the least loaded shard
+    for plant in sorted(loads, key=lambda plant: loads[plant], reverse=True):
+        shard = int(np.argmin(shards_loads))
+        shards[shard].append(plant)
+        shards_loads[shard] += max(loads[plant], 1)
+    return shards
+
+
+def _shard_order(ids, plants_shards):
+    """Return the rows ordered by shard, and the range of the rows of each shard in this order."""
+    plants_positions = {plant: shard for shard, plants in enumerate(plants_shards) for plant in plants}
+    shards = np.array([plants_positions[id_[0]] for id_ in ids], dtype=int)
+    order = np.argsort(shards, kind='stable')
+    bounds = np.searchsorted(shards[order], np.arange(len(plants_shards) + 1))
+    return order, list(zip(bounds[:-1], bounds[1:]))
+
+
+def _share(columns, order, shared_memories):
+    """Copy the columns in shared memory, with rows in `order`. Return the shared arrays and the specifications to attach them."""
+    shared_columns = {}
+    specifications = {}
+    for name, array in columns.items():
+        shared_memory_ = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        shared_memories.append(shared_memory_)
+        shared_columns[name] = np.ndarray(array.shape, dtype=array.dtype, buffer=shared_memory_.buf)
+        shared_columns[name][...] = array[order]
+        specifications[name] = (shared_memory_.name, array.dtype.str, array.shape)
+    return shared_columns, specifications
+
+
+def _attach(specifications, start, stop, shared_memories):
+    """Attach the slice [start:stop] of shared arrays created by the parent process."""
+    columns = {}
+    for name, (shared_memory_name, dtype, shape) in specifications.items():
+        # the workers share the resource tracker of the parent process, which unlinks the memory
+        shared_memory_ = shared_memory.SharedMemory(name=shared_memory_name)
+        shared_memories.append(shared_memory_)
+        columns[name] = np.ndarray(shape, dtype=dtype, buffer=shared_memory_.buf)[start:stop]
+    return columns
+
+
+def _run_attached_shard(task, shared_memories):
+    roots_columns = _attach(task['roots_specifications'], task['roots_range'][0], task['roots_range'][1], shared_memories)
+    elements_columns = _attach(task['elements_specifications'], task['elements_range'][0], task['elements_range'][1], shared_memories)
+    rate_mstruct_death_buffer = roots_columns.pop('rate_mstruct_death')
+    N_content_total_buffer = elements_columns.pop('N_content_total')
+    roots_state = engine.RootsState(task['roots_ids'], roots_columns, task['roots_present'])
+    elements_state = engine.ElementsState(task['elements_ids'], elements_columns, task['elements_present'])
+
+    rate_mstruct_death, N_content_total, all_aggregates = engine.run_steps(roots_state, elements_state, task['roots_delta_teq'], task['elements_delta_teq'],
+                                                                           task['resolved_parameters'], task['nb_steps'], task['update_max_protein'],
+                                                                           task['opt_full_remob'], task['postflowering_stages'], task['aggregations'],
+                                                                           task['nb_threads'], task['chunk_size'], task['forced_green_area'],
+                                                                           task['event_log'], task['t'], task['balance_checker'], task['variables'],
+                                                                           task['reference_verifier'])
+    rate_mstruct_death_buffer[...] = rate_mstruct_death
+    N_content_total_buffer[...] = N_content_total
+    return (elements_state.unique_axes_ids, all_aggregates, roots_state.present, elements_state.present, task['event_log'], task['balance_checker'],
+            task['reference_verifier'])
+
+
+def _run_shard(task):
+    """Run all the steps on one shard, in a worker process."""
+    shared_memories = []
+    try:
+        # the views on the shared memory are released when _run_attached_shard returns
+        return _run_attached_shard(task, shared_memories)
+    finally:
+        for shared_memory_ in shared_memories:
+            shared_memory_.close()
+
+
+def run_steps(roots_state, elements_state, roots_delta_teq, elements_delta_teq, resolved_parameters, nb_steps, update_max_protein=True, opt_full_remob=False,
+              postflowering_stages=False, aggregations=None, nb_threads=1, chunk_size=engine.DEFAULT_CHUNK_SIZE, forced_green_area=None, event_log=None, t=0,
+              balance_checker=None, variables=None, reference_verifier=None, nb_workers=None):
+    """
+    Run several steps of the model with several worker processes, the canopy being split by plant. The states are updated in place.
+
+    The parameters and the results are the same as the ones of :func:`engine.run_steps`.
+
+    :param int nb_workers: the number of worker processes. The number of CPUs by default.
+    """
+    if not nb_steps:
+        return None, None, []
+    nb_workers = nb_workers or multiprocessing.cpu_count()
+    plants_shards = [plants for plants in partition_plants(roots_state, elements_state, nb_workers) if plants]
+    if not plants_shards:
+        # empty canopy: no worker is needed
+        return engine.run_steps(roots_state, elements_state, roots_delta_teq, elements_delta_teq, resolved_parameters, nb_steps, update_max_protein, opt_full_remob,
+                                postflowering_stages, aggregations, nb_threads, chunk_size, forced_green_area, event_log, t, balance_checker, variables,
+                                reference_verifier)
+    roots_order, roots_ranges = _shard_order(roots_state.ids, plants_shards)
+    elements_order, elements_ranges = _shard_order(elements_state.ids, plants_shards)
+    nb_elements = len(elements_state)
+    update_max_protein = np.broadcast_to(update_max_protein, (nb_elements,))
+
+    shared_memories = []
+    try:
+        roots_columns = dict(roots_state.columns, rate_mstruct_death=np.zeros(len(roots_state)))
+        elements_columns = dict(elements_state.columns, N_content_total=np.zeros(nb_elements))
+        shared_roots_columns, roots_specifications = _share(roots_columns, roots_order, shared_memories)
+        shared_elements_columns, elements_specifications = _share(elements_columns, elements_order, shared_memories)
+
+        tasks = []
+        for (roots_start, roots_stop), (elements_start, elements_stop) in zip(roots_ranges, elements_ranges):
+            roots_rows = roots_order[roots_start:roots_stop]
+            elements_rows = elements_order[elements_start:elements_stop]
+            elements_ids = [elements_state.ids[row] for row in elements_rows]
+            tasks.append({'roots_specifications': roots_specifications, 'roots_range': (roots_start, roots_stop),
+                          'elements_specifications': elements_specifications, 'elements_range': (elements_start, elements_stop),
+                          'roots_ids': [roots_state.ids[row] for row in roots_rows], 'roots_present': roots_state.present,
+                          'elements_ids': elements_ids, 'elements_present': elements_state.present,
+                          'roots_delta_teq': roots_delta_teq[roots_rows], 'elements_delta_teq': elements_delta_teq[elements_rows],
+                          'resolved_parameters': engine.take_rows(resolved_parameters, elements_rows, nb_elements),
+                          'update_max_protein': update_max_protein[elements_rows], 'nb_steps': nb_steps,
+                          'opt_full_remob': opt_full_remob, 'postflowering_stages': postflowering_stages, 'aggregations': aggregations,
+                          'nb_threads': nb_threads, 'chunk_size': chunk_size,
+                          'forced_green_area': None if forced_green_area is None else forced_green_area[:, elements_rows],
+                          'event_log': None if event_log is None else event_log.subset(elements_ids), 't': t,
+                          'balance_checker': None if balance_checker is None else balance_checker.empty_copy(), 'variables': variables,
+                          'reference_verifier': None if reference_verifier is None else reference_verifier.empty_copy()})
+
+        pool = multiprocessing.Pool(min(nb_workers, len(tasks)))
+        try:
+            shards_results = pool.map(_run_shard, tasks)
+        finally:
+            pool.close()
+            pool.join()
+
+        # copy the shared state back to the states, in the original order of the rows
+        for columns, shared_columns, order in ((roots_columns, shared_roots_columns, roots_order), (elements_columns, shared_elements_columns, elements_order)):
+            for name, shared_array in shared_columns.items():
+                columns[name][order] = shared_array
+        del shared_roots_columns, shared_elements_columns, shared_columns, shared_array
+        for _, _, roots_present, elements_present, shard_event_log, shard_balance_checker, shard_reference_verifier in shards_results:
+            roots_state.present.update(roots_present)
+            elements_state.present.update(elements_present)
+            if event_log is not None:
+                event_log.merge(shard_event_log)
+            if balance_checker is not None:
+                balance_checker.merge(shard_balance_checker)
+            if reference_verifier is not None:
+                reference_verifier.merge(shard_reference_verifier)
+    finally:
+        for shared_memory_ in shared_memories:
+            try:
+                shared_memory_.close()
+            except BufferError:  # an exception was raised while the shared arrays were still referenced
+                pass
+            shared_memory_.unlink()
+
+    # merge the aggregates of the shards
+    axes_positions = {axis_id: position for position, axis_id in enumerate(elements_state.unique_axes_ids)}
+    all_aggregates = []
+    for step in range(nb_steps if aggregations else 0):
+        step_aggregates = {}
+        for shard_axes_ids, shard_aggregates, _, _, _, _, _ in shards_results:
+            positions = [axes_positions[axis_id] for axis_id in shard_axes_ids]
+            for aggregate_name, values in shard_aggregates[step].items():
+                if aggregate_name not in step_aggregates:
+                    step_aggregates[aggregate_name] = np.zeros(len(axes_positions), dtype=values.dtype)
+                step_aggregates[aggregate_name][positions] = values
+        all_aggregates.append(step_aggregates)
+
+    return roots_columns['rate_mstruct_death'], elements_columns['N_content_total'], all_aggregates
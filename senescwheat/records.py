@@ -0,0 +1,132 @@
+# -*- coding: latin-1 -*-
+
+from collections.abc import MutableMapping
+
+from senescwheat import converter
+
+"""
+    senescwheat.records
+    ~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.records` defines the compact records which hold the inputs/outputs of one roots or one element.
+
+    A record behaves like a dictionary, but the variables of Senesc-Wheat are stored in `__slots__` instead of a per-record
+    hash table. Any other variable is stored in a dictionary created on demand.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the value of the variables missing from a record
+_MISSING = object()
+
+
+class Record(MutableMapping):
+    """Mapping of the variables of one roots or one element, stored in slots.
+    """
+
+    __slots__ = ('_extra',)
+
+    #: the variables stored in slots
+    KEYS = ()
+
+    _KEYS_SET = frozenset()
+
+    def __init__(self, *args, **kwargs):
+        self._extra = None
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        if key in self._KEYS_SET:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        if self._extra is None:
+            raise KeyError(key)
+        return self._extra[key]
+
+    def __setitem__(self, key, value):
+        if key in self._KEYS_SET:
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._KEYS_SET:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        elif self._extra is None:
+            raise KeyError(key)
+        else:
+            del self._extra[key]
+
+    def __contains__(self, key):
+        if key in self._KEYS_SET:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for key in self.KEYS:
+            if hasattr(self, key):
+                yield key
+        if self._extra is not None:
+            for key in self._extra:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def copy(self):
+        """Return a shallow copy of the record."""
+        new_record = self.__class__()
+        for key in self.KEYS:
+            value = getattr(self, key, _MISSING)
+            if value is not _MISSING:
+                setattr(new_record, key, value)
+        if self._extra is not None:
+            new_record._extra = self._extra.copy()
+        return new_record
+
+    def values_key(self):
+        """Return a hashable key of the variables of the record and of their values: the records with the same variables
+        and the same values have the same key. The key is cheaper to compute than a key built from :meth:`items`."""
+        key = tuple([getattr(self, name, _MISSING) for name in self.KEYS])
+        if self._extra:
+            key += tuple(sorted(self._extra.items(), key=lambda item: item[0]))
+        return key
+
+    def __repr__(self):
+        return '{}({!r})'.format(self.__class__.__name__, dict(self.items()))
+
+
+class RootsRecord(Record):
+    """Inputs/outputs of one roots."""
+
+    KEYS = tuple(converter.SENESCWHEAT_ROOTS_INPUTS_OUTPUTS)
+
+    _KEYS_SET = frozenset(KEYS)
+
+    __slots__ = KEYS
+
+
+class ElementRecord(Record):
+    """Inputs/outputs of one element."""
+
+    KEYS = tuple(converter.SENESCWHEAT_ELEMENTS_INPUTS_OUTPUTS)
+
+    _KEYS_SET = frozenset(KEYS)
+
+    __slots__ = KEYS
@@ -0,0 +1,159 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import converter
+from senescwheat import engine
+
+"""
+    senescwheat.replay
+    ~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.replay` computes the outputs of Senesc-Wheat along prescribed trajectories of the inputs,
+    for example the inputs recorded at each step of a run of a coupled model.
+
+    The inputs of all the steps are known beforehand: the steps do not depend on each other, but for the variables of
+    :attr:`RECURSIVE_VARIABLES`, which Senesc-Wheat carries from one step to the next. :func:`replay` first scans these
+    variables along time, then computes all the steps at once with the kernels of the :mod:`engine <senescwheat.engine>`,
+    the time being the leading dimension of the arrays.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the variables of the elements carried by Senesc-Wheat from one step to the next, i.e. read from the outputs of the previous step instead of the inputs
+RECURSIVE_VARIABLES = ['max_proteins', 'senesced_length_element']
+
+
+def _grid(inputs_df, topology_columns, times):
+    """Return the ids of a long-format dataframe, and the time row and id column of each of its lines in a (time x id) grid."""
+    lines_ids = list(inputs_df[topology_columns].itertuples(index=False, name=None))
+    ids = sorted(set(lines_ids))
+    index = {id_: column for column, id_ in enumerate(ids)}
+    time_rows = np.searchsorted(times, inputs_df[converter.TIME_COLUMN].values)
+    id_columns = np.array([index[id_] for id_ in lines_ids], dtype=int)
+    return ids, time_rows, id_columns
+
+
+def _state_from_dataframe(state_type, inputs_df, times):
+    """Create a state whose rows are the ids of a long-format dataframe, with the time as leading dimension, and the grid of the known inputs."""
+    ids, time_rows, id_columns = _grid(inputs_df, state_type.TOPOLOGY_COLUMNS, times)
+    shape = (len(times), len(ids))
+    known = np.zeros(shape, dtype=bool)
+    known[time_rows, id_columns] = True
+    columns = {}
+    for name in state_type.VARIABLES:
+        columns[name] = np.full(shape, np.nan)
+        if name in inputs_df:
+            columns[name][time_rows, id_columns] = inputs_df[name].values
+    for name in state_type.FLAGS:
+        # the unknown elements are considered growing, so that the kernels leave them unchanged
+        columns[name] = np.zeros(shape, dtype=bool) if name != 'is_growing' else ~known
+        if name in inputs_df:
+            columns[name][time_rows, id_columns] = inputs_df[name].values.astype(bool)
+    present = set(inputs_df.columns).intersection(state_type.VARIABLES, state_type.FLAGS)
+    return state_type(ids, columns, present), known
+
+
+def _axes_forcings(axes_inputs, times, axes_ids, name):
+    """Gather the values of an axis input at each time for each row of a state, NaN for the unknown values."""
+    ids, time_rows, id_columns = _grid(axes_inputs, converter.AXES_TOPOLOGY_COLUMNS, times)
+    # the last column holds the values of the unknown axes
+    values = np.full((len(times), len(ids) + 1), np.nan)
+    if name in axes_inputs:
+        values[time_rows, id_columns] = axes_inputs[name].values
+    index = {id_: column for column, id_ in enumerate(ids)}
+    return values[:, [index.get(axis_id, -1) for axis_id in axes_ids]]
+
+
+def _scan(elements_state, known, delta_teq, resolved_parameters, update_max_protein, postflowering_stages, recursive_variables):
+    """Scan the recursive variables along time. The values of the inputs of each step are replaced in `elements_state`."""
+    columns = elements_state.columns
+    carried = {name: np.full(len(elements_state), np.nan) for name in recursive_variables}
+    seen = np.zeros(len(elements_state), dtype=bool)
+    for step in range(known.shape[0]):
+        step_columns = {name: array[step] for name, array in columns.items()}
+        # the values of an element are read from the inputs at the first time it is known
+        first_known = known[step] & ~seen
+        seen |= known[step]
+        for name, carried_values in carried.items():
+            carried_values[first_known] = step_columns[name][first_known]
+            step_columns[name][...] = carried_values
+        is_over, is_senescing = engine.elements_phases(elements_state, step_columns, resolved_parameters)
+        _, new_senesced_length, _, new_max_proteins = engine.senescence(elements_state, step_columns, is_senescing, delta_teq[step], resolved_parameters,
+                                                                        update_max_protein, postflowering_stages)
+        if 'max_proteins' in carried:
+            carried['max_proteins'][...] = np.where(is_senescing, new_max_proteins, step_columns['max_proteins'])
+        if 'senesced_length_element' in carried:
+            carried['senesced_length_element'][...] = np.where(is_senescing, new_senesced_length,
+                                                               np.where(is_over, step_columns['length'], step_columns['senesced_length_element']))
+
+
+def _to_dataframe(state, times, rows_mask, extra_columns):
+    """Convert a state with the time as leading dimension to a long-format dataframe, keeping the (time, row) of `rows_mask`."""
+    time_rows, rows = np.nonzero(rows_mask)
+    dataframe = pd.DataFrame([state.ids[row] for row in rows], columns=state.TOPOLOGY_COLUMNS)
+    dataframe.insert(0, converter.TIME_COLUMN, times[time_rows])
+    data = {name: array for name, array in state.columns.items() if name in state.present}
+    data.update(extra_columns)
+    for name in state.RECORD_TYPE.KEYS:
+        if name in data:
+            dataframe[name] = data[name][time_rows, rows]
+    return dataframe
+
+
+def replay(roots_inputs, axes_inputs, elements_inputs, forced_max_protein_elements=None, opt_full_remob=False, postflowering_stages=False,
+           recursive_variables=RECURSIVE_VARIABLES):
+    """
+    Compute the outputs of Senesc-Wheat at each time of prescribed trajectories of the inputs.
+
+    The outputs at a time are the outputs of :meth:`simulation.Simulation.run` from the inputs at this time, except that
+    the variables of `recursive_variables` are read from the outputs at the previous time, once an element is known.
+    The replay of the inputs recorded before each step of a run thus gives the outputs of each step of this run.
+
+    Only the variables of the model are replayed: the other columns of the inputs are ignored.
+
+    :param pandas.DataFrame roots_inputs: the inputs of the roots, with one line by time and roots: the column :attr:`converter.TIME_COLUMN`,
+                                          the columns :attr:`converter.ROOTS_TOPOLOGY_COLUMNS` and one column by input.
+    :param pandas.DataFrame axes_inputs: the inputs of the axes, with one line by time and axis: the column :attr:`converter.TIME_COLUMN`,
+                                         the columns :attr:`converter.AXES_TOPOLOGY_COLUMNS` and one column by input.
+    :param pandas.DataFrame elements_inputs: the inputs of the elements, with one line by time and element: the column :attr:`converter.TIME_COLUMN`,
+                                             the columns :attr:`converter.ELEMENTS_TOPOLOGY_COLUMNS` and one column by input.
+    :param set forced_max_protein_elements: The elements ids with fixed max proteins.
+    :param bool opt_full_remob: whether all proteins should be remobilised
+    :param bool postflowering_stages: True to run a simulation with postflo parameter
+    :param list recursive_variables: the variables carried from one step to the next, among :attr:`RECURSIVE_VARIABLES`.
+                                     An empty list reads all the variables from the inputs: the times are then independent.
+
+    :return: The outputs of the roots and of the computed elements, with one line by time and roots or element,
+             in the layout of the inputs (the column :attr:`converter.TIME_COLUMN` then the topology columns).
+    :rtype: (pandas.DataFrame, pandas.DataFrame)
+    """
+    unknown_variables = set(recursive_variables).difference(RECURSIVE_VARIABLES)
+    if unknown_variables:
+        raise ValueError('Not recursive variables: {}'.format(', '.join(sorted(unknown_variables))))
+    times = np.union1d(roots_inputs[converter.TIME_COLUMN].values, elements_inputs[converter.TIME_COLUMN].values)
+
+    roots_state, roots_known = _state_from_dataframe(engine.RootsState, roots_inputs, times)
+    elements_state, elements_known = _state_from_dataframe(engine.ElementsState, elements_inputs, times)
+    roots_delta_teq = _axes_forcings(axes_inputs, times, roots_state.axes_ids, 'delta_teq_roots')
+    elements_delta_teq = _axes_forcings(axes_inputs, times, elements_state.axes_ids, 'delta_teq')
+    resolved_parameters = engine.resolve_parameters(elements_state)
+    forced_max_protein_elements = forced_max_protein_elements or set()
+    update_max_protein = np.array([id_ not in forced_max_protein_elements for id_ in elements_state.ids], dtype=bool)
+
+    if recursive_variables:
+        # the carried variables are known from the first step on, as in a run
+        elements_state.present.update(recursive_variables)
+        _scan(elements_state, elements_known, elements_delta_teq, resolved_parameters, update_max_protein, postflowering_stages, recursive_variables)
+
+    rate_mstruct_death = engine.run_roots(roots_state, roots_delta_teq, resolved_parameters, postflowering_stages)
+    N_content_total, _, _ = engine.run_elements(elements_state, elements_delta_teq, resolved_parameters, update_max_protein, opt_full_remob, postflowering_stages)
+
+    roots_outputs = _to_dataframe(roots_state, times, roots_known, {'rate_mstruct_death': rate_mstruct_death})
+    elements_outputs = _to_dataframe(elements_state, times, elements_known & elements_state.is_computed, {'N_content_total': N_content_total})
+    return roots_outputs, elements_outputs
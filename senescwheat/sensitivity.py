@@ -0,0 +1,245 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import engine
+
+"""
+    senescwheat.sensitivity
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.sensitivity` defines a global sensitivity analysis of Senesc-Wheat outputs
+    to the parameters of :mod:`senescwheat.parameters`.
+
+    Two methods are available:
+
+        * the Morris method (elementary effects), see :func:`morris_design` and :func:`morris_indices`,
+        * the Sobol method (variance decomposition, Saltelli design, Saltelli 2010 first order and Jansen total estimators),
+          see :func:`sobol_design` and :func:`sobol_indices`.
+
+    The designs are evaluated with :func:`evaluate`, which runs the samples as members of :func:`engine.run_ensemble`,
+    by chunks of `chunk_size` samples to bound the memory.
+
+    A `problem` is a dictionary of the parameters to study, with their bounds: ``{parameter_name: (lower_bound, upper_bound), ...}``.
+    The parameter names are the ones of :func:`engine.resolve_parameters`, for example ``'SENESCENCE_MAX_RATE'`` or ``'FRACTION_N_MAX.blade'``.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def total_green_area(initial_roots_state, initial_elements_state, final_roots_state, final_elements_state):
+    """Sum of the green area of the elements at the end of the run (m2)."""
+    return np.sum(final_elements_state.columns['green_area'], axis=-1)
+
+
+def total_Nresidual(initial_roots_state, initial_elements_state, final_roots_state, final_elements_state):
+    """Sum of the residual N of the elements at the end of the run (g)."""
+    return np.sum(final_elements_state.columns['Nresidual'], axis=-1)
+
+
+def total_remobilised_N(initial_roots_state, initial_elements_state, final_roots_state, final_elements_state):
+    """Sum of the proteins remobilised into amino acids by the elements during the run (mol N)."""
+    return np.sum(final_elements_state.columns['amino_acids'] - initial_elements_state.columns['amino_acids'], axis=-1)
+
+
+def total_roots_senesced_mstruct(initial_roots_state, initial_elements_state, final_roots_state, final_elements_state):
+    """Sum of the structural mass of the roots lost by turnover during the run (g)."""
+    return np.sum(final_roots_state.columns['senesced_mstruct'] - initial_roots_state.columns['senesced_mstruct'], axis=-1)
+
+
+#: the outputs which can be designated by name in :func:`evaluate`
+OUTPUTS = {'green_area': total_green_area,
+           'Nresidual': total_Nresidual,
+           'remobilised_N': total_remobilised_N,
+           'roots_senesced_mstruct': total_roots_senesced_mstruct}
+
+
+def morris_design(problem, nb_trajectories, nb_levels=4, seed=None):
+    """
+    Generate a Morris design: `nb_trajectories` trajectories of ``len(problem) + 1`` points,
+    each parameter varying once along a trajectory.
+
+    :param dict problem: the parameters to study, with their bounds.
+    :param int nb_trajectories: the number of trajectories.
+    :param int nb_levels: the number of levels of the grid.
+    :param int seed: the seed of the random generator.
+
+    :return: The samples, with one row by point and one column by parameter.
+    :rtype: numpy.ndarray
+    """
+    random_state = np.random.RandomState(seed)
+    nb_parameters = len(problem)
+    delta = nb_levels / (2 * (nb_levels - 1))
+    # lower triangular matrix of the one-at-a-time changes
+    B = np.tril(np.ones((nb_parameters + 1, nb_parameters)), -1)
+    trajectories = []
+    for _ in range(nb_trajectories):
+        x_star = random_state.randint(0, nb_levels // 2, nb_parameters) / (nb_levels - 1)
+        D_star = np.diag(random_state.choice([-1, 1], nb_parameters))
+        P_star = np.eye(nb_parameters)[random_state.permutation(nb_parameters)]
+        J = np.ones((nb_parameters + 1, nb_parameters))
+        B_star = (J * x_star + (delta / 2) * ((2 * B - J).dot(D_star) + J)).dot(P_star)
+        trajectories.append(B_star)
+    unit_samples = np.vstack(trajectories)
+    return _scale(problem, unit_samples)
+
+
+def sobol_design(problem, nb_samples, seed=None):
+    """
+    Generate a Saltelli design for the estimation of the first order and total Sobol indices:
+    the matrices A, B and the ``len(problem)`` matrices AB_i, stacked in this order.
+
+    :param dict problem: the parameters to study, with their bounds.
+    :param int nb_samples: the number of rows of A and B.
+    :param int seed: the seed of the random generator.
+
+    :return: The samples, with ``nb_samples * (len(problem) + 2)`` rows and one column by parameter.
+    :rtype: numpy.ndarray
+    """
+    random_state = np.random.RandomState(seed)
+    nb_parameters = len(problem)
+    A = random_state.random_sample((nb_samples, nb_parameters))
+    B = random_state.random_sample((nb_samples, nb_parameters))
+    matrices = [A, B]
+    for i in range(nb_parameters):
+        AB_i = A.copy()
+        AB_i[:, i] = B[:, i]
+        matrices.append(AB_i)
+    return _scale(problem, np.vstack(matrices))
+
+
+def _scale(problem, unit_samples):
+    """Scale samples from the unit hypercube to the bounds of the parameters."""
+    bounds = np.array(list(problem.values()), dtype=float).reshape(-1, 2)
+    return bounds[:, 0] + unit_samples * (bounds[:, 1] - bounds[:, 0])
+
+
+def evaluate(inputs, problem, samples, outputs=('green_area', 'Nresidual', 'remobilised_N', 'roots_senesced_mstruct'), nb_steps=1, chunk_size=100, **run_kwargs):
+    """
+    Evaluate the outputs of the model for each sample.
+
+    The samples are run by chunks of `chunk_size` members of an ensemble (see :func:`engine.run_ensemble`).
+
+    :param dict inputs: the inputs of the simulation, with the same structure as :attr:`simulation.Simulation.inputs`.
+    :param dict problem: the parameters to study, with their bounds.
+    :param numpy.ndarray samples: the samples, with one row by sample and one column by parameter of `problem`.
+    :param tuple outputs: the outputs to compute. Either a name of :attr:`OUTPUTS`, or a function
+                          ``output(initial_roots_state, initial_elements_state, final_roots_state, final_elements_state)``
+                          which returns one value by member.
+    :param int nb_steps: the number of steps to run.
+    :param int chunk_size: the maximal number of samples run at once.
+    :param run_kwargs: the other arguments of :func:`engine.run_ensemble`.
+
+    :return: The values of the outputs, with one row by sample and one column by output.
+    :rtype: pandas.DataFrame
+    """
+    outputs = [(output, OUTPUTS[output]) if isinstance(output, str) else (output.__name__, output) for output in outputs]
+    initial_roots_state = engine.RootsState.from_dict(inputs['roots'])
+    initial_elements_state = engine.ElementsState.from_dict(inputs['elements'])
+    results = {output_name: [] for output_name, _ in outputs}
+    for chunk_start in range(0, len(samples), chunk_size):
+        chunk = samples[chunk_start:chunk_start + chunk_size]
+        parameters_sets = {name: chunk[:, i] for i, name in enumerate(problem)}
+        final_roots_state, final_elements_state = engine.run_ensemble(inputs, parameters_sets, nb_steps, **run_kwargs)
+        for output_name, output_function in outputs:
+            output_values = output_function(initial_roots_state, initial_elements_state, final_roots_state, final_elements_state)
+            results[output_name].append(np.broadcast_to(output_values, len(chunk)))
+    return pd.DataFrame({output_name: np.concatenate(values) for output_name, values in results.items()}, columns=[output_name for output_name, _ in outputs])
+
+
+def morris_indices(problem, samples, outputs_values):
+    """
+    Compute the Morris indices from the samples of :func:`morris_design` and their outputs.
+
+    :param dict problem: the parameters studied, with their bounds.
+    :param numpy.ndarray samples: the samples returned by :func:`morris_design`.
+    :param pandas.DataFrame outputs_values: the values of the outputs, as returned by :func:`evaluate`.
+
+    :return: The indices `mu`, `mu_star` and `sigma`, with one row by (output, parameter).
+    :rtype: pandas.DataFrame
+    """
+    nb_parameters = len(problem)
+    bounds = np.array(list(problem.values()), dtype=float).reshape(-1, 2)
+    trajectories = samples.reshape(-1, nb_parameters + 1, nb_parameters)
+    # index of the parameter changed between consecutive points, and relative size of the change
+    steps = np.diff(trajectories, axis=1) / (bounds[:, 1] - bounds[:, 0])
+    changed_parameters = np.argmax(np.abs(steps), axis=2)
+    deltas = np.take_along_axis(steps, changed_parameters[..., np.newaxis], axis=2)[..., 0]
+    indices = []
+    for output_name in outputs_values.columns:
+        Y = outputs_values[output_name].values.reshape(-1, nb_parameters + 1)
+        elementary_effects = np.diff(Y, axis=1) / deltas
+        for i, parameter_name in enumerate(problem):
+            effects = elementary_effects[changed_parameters == i]
+            indices.append({'output': output_name, 'parameter': parameter_name, 'mu': effects.mean(),
+                            'mu_star': np.abs(effects).mean(), 'sigma': effects.std(ddof=1) if len(effects) > 1 else np.nan})
+    return pd.DataFrame(indices, columns=['output', 'parameter', 'mu', 'mu_star', 'sigma'])
+
+
+def sobol_indices(problem, outputs_values):
+    """
+    Compute the first order and total Sobol indices from the outputs of the samples of :func:`sobol_design`.
+    `S1` is computed with the estimator of Saltelli et al. (2010), `ST` with the estimator of Jansen (1999).
+
+    :param dict problem: the parameters studied, with their bounds.
+    :param pandas.DataFrame outputs_values: the values of the outputs, as returned by :func:`evaluate`.
+
+    :return: The indices `S1` and `ST`, with one row by (output, parameter).
+    :rtype: pandas.DataFrame
+    """
+    nb_parameters = len(problem)
+    indices = []
+    for output_name in outputs_values.columns:
+        Y = outputs_values[output_name].values.reshape(nb_parameters + 2, -1)
+        Y_A, Y_B, Y_AB = Y[0], Y[1], Y[2:]
+        variance = np.var(np.concatenate([Y_A, Y_B]))
+        for i, parameter_name in enumerate(problem):
+            if variance == 0:
+                S1 = ST = np.nan
+            else:
+                S1 = np.mean(Y_B * (Y_AB[i] - Y_A)) / variance
+                ST = 0.5 * np.mean((Y_A - Y_AB[i]) ** 2) / variance
+            indices.append({'output': output_name, 'parameter': parameter_name, 'S1': S1, 'ST': ST})
+    return pd.DataFrame(indices, columns=['output', 'parameter', 'S1', 'ST'])
+
+
+def morris(inputs, problem, nb_trajectories, nb_levels=4, seed=None, **evaluate_kwargs):
+    """
+    Run a Morris analysis: generate the design, evaluate it, and compute the indices.
+
+    :param dict inputs: the inputs of the simulation, with the same structure as :attr:`simulation.Simulation.inputs`.
+    :param dict problem: the parameters to study, with their bounds.
+    :param int nb_trajectories: the number of trajectories.
+    :param int nb_levels: the number of levels of the grid.
+    :param int seed: the seed of the random generator.
+    :param evaluate_kwargs: the other arguments of :func:`evaluate`.
+
+    :return: The Morris indices, see :func:`morris_indices`.
+    :rtype: pandas.DataFrame
+    """
+    samples = morris_design(problem, nb_trajectories, nb_levels, seed)
+    outputs_values = evaluate(inputs, problem, samples, **evaluate_kwargs)
+    return morris_indices(problem, samples, outputs_values)
+
+
+def sobol(inputs, problem, nb_samples, seed=None, **evaluate_kwargs):
+    """
+    Run a Sobol analysis: generate the design, evaluate it, and compute the indices.
+
+    :param dict inputs: the inputs of the simulation, with the same structure as :attr:`simulation.Simulation.inputs`.
+    :param dict problem: the parameters to study, with their bounds.
+    :param int nb_samples: the number of rows of the matrices A and B of the design.
+    :param int seed: the seed of the random generator.
+    :param evaluate_kwargs: the other arguments of :func:`evaluate`.
+
+    :return: The Sobol indices, see :func:`sobol_indices`.
+    :rtype: pandas.DataFrame
+    """
+    samples = sobol_design(problem, nb_samples, seed)
+    outputs_values = evaluate(inputs, problem, samples, **evaluate_kwargs)
+    return sobol_indices(problem, outputs_values)
@@ -2,8 +2,22 @@
 
 from __future__ import division  # use "//" to do integer division
 
+import copy
+import functools
+import numbers
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import converter
+from senescwheat import engine
+from senescwheat import events
+from senescwheat import forcing
 from senescwheat import model
+from senescwheat import observers
 from senescwheat import parameters
+from senescwheat import records
+from senescwheat import views
 
 """
     senescwheat.simulation
@@ -11,17 +25,135 @@ from senescwheat import parameters
 
     The module :mod:`senescwheat.simulation` is the front-end to run the Senesc-Wheat :mod:`model <senescwheat.model>`.
 
+    :meth:`Simulation.run` runs one step element by element. :meth:`Simulation.run_steps` runs several steps
+    with the vectorized :mod:`engine <senescwheat.engine>`, and :meth:`Simulation.iter_run` runs the engine over
+    a series of axes forcings, yielding the outputs of each step.
+
     :copyright: Copyright 2014-2015 INRA-ECOSYS, see AUTHORS.
     :license: see LICENSE for details.
 
 """
 
 
+#: aggregations of the elements by axis commonly used, see :attr:`Simulation.aggregations`
+DEFAULT_AGGREGATIONS = {'green_area': ('green_area', 'sum'),
+                        'senesced_mstruct': ('senesced_mstruct', 'sum'),
+                        'amino_acids': ('amino_acids', 'sum'),
+                        'Nresidual': ('Nresidual', 'sum'),
+                        'nb_elements_over': ('is_over', 'count')}
+
+#: the topology columns, the inputs needed and the type of the records of each type of inputs
+INPUTS_TYPES = {'roots': (converter.ROOTS_TOPOLOGY_COLUMNS, converter.SENESCWHEAT_ROOTS_INPUTS, records.RootsRecord),
+                'axes': (converter.AXES_TOPOLOGY_COLUMNS, converter.SENESCWHEAT_AXES_INPUTS, dict),
+                'elements': (converter.ELEMENTS_TOPOLOGY_COLUMNS, converter.SENESCWHEAT_ELEMENTS_INPUTS, records.ElementRecord)}
+
+#: the outputs of each type of inputs, which can also be updated by :meth:`Simulation.update_inputs`
+OUTPUTS_NAMES = {'roots': converter.SENESCWHEAT_ROOTS_OUTPUTS,
+                 'axes': converter.SENESCWHEAT_AXES_OUTPUTS,
+                 'elements': converter.SENESCWHEAT_ELEMENTS_OUTPUTS}
+
+
+def _outputs_from_states(roots_state, elements_state, rate_mstruct_death, N_content_total, variables=None):
+    """Build the views on the outputs of the roots and of the computed elements from the states reached by the engine, with only `variables` if not None."""
+    all_roots_outputs = views.OutputsView(roots_state, extra_columns={'rate_mstruct_death': rate_mstruct_death},
+                                          variables=None if variables is None else variables['roots'])
+    all_elements_outputs = views.OutputsView(elements_state, rows=np.flatnonzero(elements_state.is_computed), optional_columns={'N_content_total': N_content_total},
+                                             variables=None if variables is None else variables['elements'])
+    return all_roots_outputs, all_elements_outputs
+
+
+def _merge_plant_parameters(plant_parameters):
+    """
+    Check the parameters of a plant, and merge their dictionary values over the values of :mod:`senescwheat.parameters`.
+
+    :param dict plant_parameters: the values of the parameters of the plant, by parameter name.
+
+    :return: The values of the parameters of the plant, the dictionary values being complete.
+    :rtype: dict
+
+    :raises ValueError: if a parameter cannot differ between plants, or if an entry of a dictionary value is unknown.
+    """
+    unknown_parameters = set(plant_parameters).difference(engine.PLANTS_PARAMETERS)
+    if unknown_parameters:
+        raise ValueError('Parameters which cannot differ between plants: {}'.format(', '.join(sorted(unknown_parameters))))
+    merged_parameters = {}
+    for name, value in plant_parameters.items():
+        default_value = getattr(parameters, name)
+        if isinstance(default_value, dict):
+            if name == 'RATIO_N_MSTRUCT':  # by phytomer rank
+                unknown_keys = [key for key in value if isinstance(key, bool) or not isinstance(key, numbers.Integral)]
+            else:
+                unknown_keys = [key for key in value if key not in default_value]
+            if unknown_keys:
+                raise ValueError('Unknown entries of the parameter {}: {}'.format(name, ', '.join(map(repr, unknown_keys))))
+            merged_value = dict(default_value)
+            merged_value.update(value)
+            value = merged_value
+        merged_parameters[name] = value
+    return merged_parameters
+
+
+class StepOutputs(object):
+    """View on the outputs of one step of :meth:`Simulation.iter_run`.
+
+    The outputs are read from the state of the engine only when they are requested. The state is updated in place
+    by the next step: a view must be consumed before the generator of :meth:`Simulation.iter_run` is resumed.
+    """
+
+    __slots__ = ('step', 'roots_state', 'elements_state', 'rate_mstruct_death', 'N_content_total', 'aggregates', 'variables')
+
+    def __init__(self, step, roots_state, elements_state, rate_mstruct_death, N_content_total, aggregates=None, variables=None):
+        #: the index of the step, from 0
+        self.step = step
+        #: the state of the roots after the step, see :class:`engine.RootsState`
+        self.roots_state = roots_state
+        #: the state of the elements after the step, see :class:`engine.ElementsState`
+        self.elements_state = elements_state
+        #: the rate of mstruct loss of each roots
+        self.rate_mstruct_death = rate_mstruct_death
+        #: the N content of each element, NaN for the elements which are not senescing
+        self.N_content_total = N_content_total
+        #: the aggregates defined by :attr:`Simulation.aggregations`, by aggregate name, with one value by axis of :attr:`axes_ids`
+        self.aggregates = aggregates or {}
+        #: the variables of the outputs by scale, see :attr:`Simulation.computed_variables`, or None for all the variables
+        self.variables = variables
+
+    @property
+    def axes_ids(self):
+        """The ids of the axes of :attr:`aggregates`."""
+        return self.elements_state.unique_axes_ids
+
+    def to_dict(self):
+        """
+        Convert the outputs to the format of :attr:`Simulation.outputs`. The outputs are copied from the state of the engine
+        to :class:`views.OutputsView`, which remain valid after the next step.
+
+        :return: The outputs of the roots and of the elements.
+        :rtype: dict
+        """
+        all_roots_outputs, all_elements_outputs = _outputs_from_states(self.roots_state, self.elements_state, self.rate_mstruct_death, self.N_content_total, self.variables)
+        return {'roots': all_roots_outputs, 'elements': all_elements_outputs}
+
+    def to_dataframes(self):
+        """
+        Convert the outputs to dataframes, with the layout of the dataframes of :func:`converter.to_dataframes`.
+
+        :return: One dataframe for roots outputs, one dataframe for elements outputs.
+        :rtype: (pandas.DataFrame, pandas.DataFrame)
+        """
+        roots_df = self.roots_state.to_dataframe(extra_columns={'rate_mstruct_death': self.rate_mstruct_death})
+        elements_df = self.elements_state.to_dataframe(rows=np.flatnonzero(self.elements_state.is_computed), extra_columns={'N_content_total': self.N_content_total})
+        if self.variables is not None:
+            roots_df = converter.select_columns(roots_df, converter.ROOTS_TOPOLOGY_COLUMNS, self.variables['roots'])
+            elements_df = converter.select_columns(elements_df, converter.ELEMENTS_TOPOLOGY_COLUMNS, self.variables['elements'])
+        return roots_df, elements_df
+
+
 class Simulation(object):
     """The Simulation class permits to initialize and run a simulation.
     """
 
-    def __init__(self, delta_t=1, update_parameters=None):
+    def __init__(self, delta_t=1, update_parameters=None, aggregations=None, record_events=False, deduplicate_plants=False, outputs_variables=None):
 
         #: The inputs of Senesc-Wheat.
         #:
@@ -35,11 +167,62 @@ class Simulation(object):
         #: `outputs` is a dictionary of dictionaries:
         #:     {'roots': {(plant_index, axis_label): {roots_output_name: roots_output_value, ...}, ...},
         #:      'elements': {(plant_index, axis_label, metamer_index, organ_label, element_label): {element_output_name: element_output_value, ...}, ...}}
+        #:
+        #: The outputs of each roots and each element are stored in a :class:`records.RootsRecord` and a :class:`records.ElementRecord` respectively.
+        #: After :meth:`run_steps` and :meth:`iter_run`, the dictionaries of the roots and of the elements are read-only :class:`views.OutputsView`,
+        #: which build the records only when they are accessed, and read a variable of all the roots or elements with :meth:`views.OutputsView.column`.
         self.outputs = {}
 
         #: the delta t of the simulation (in seconds)
         self.delta_t = delta_t
 
+        #: The aggregations of the elements by axis computed at each step of :meth:`run_steps`.
+        #:
+        #: `aggregations` is a dictionary: {aggregate_name: (element_variable_name, reduction), ...},
+        #: `reduction` being one of :attr:`engine.REDUCTIONS`. See :attr:`DEFAULT_AGGREGATIONS` for an example.
+        self.aggregations = aggregations or {}
+
+        #: The observed green area forced on the senescing elements, or None if the green area is not forced. See :meth:`force_green_area`.
+        self.forced_green_area = None
+
+        #: The log of the events of the elements (start of senescence, end, overwriting of max proteins), or None if the events are not recorded.
+        #: See :class:`events.EventLog`.
+        self.event_log = events.EventLog() if record_events else None
+
+        #: The values of the parameters of the elements of some plants, which overwrite the values of :mod:`senescwheat.parameters`
+        #: for these plants. See :meth:`set_plants_parameters`.
+        #:
+        #: `plants_parameters` is a dictionary: {plant_index: {parameter_name: parameter_value, ...}, ...}.
+        self.plants_parameters = {}
+
+        #: If True, :meth:`run` computes the plants whose state and forcings are identical only once, see :attr:`plants_replicas`.
+        #: The vectorized :meth:`run_steps` and :meth:`iter_run` do not deduplicate the plants.
+        #: This speeds up the canopies made of replicates of a few plants. The replicates are detected again at each step,
+        #: so that a plant which diverges from its replicates, for example after being perturbed by a coupled model, is computed on its own.
+        self.deduplicate_plants = deduplicate_plants
+
+        #: The replicas of each plant at the last step of :meth:`run` when :attr:`deduplicate_plants` is True:
+        #: {plant_index: [replica_plant_index, ...], ...}. The replicas got the outputs of the plant, copied.
+        #: Only :meth:`run` deduplicates the plants: :meth:`run_steps` and :meth:`iter_run` compute all the plants, and empty `plants_replicas`.
+        self.plants_replicas = {}
+
+        #: The checker of the mass balances of the steps, or None to check nothing. See :class:`balance.BalanceChecker`.
+        self.balance_checker = None
+
+        #: The verifier of samples of the elements computed by :meth:`run_steps` and :meth:`iter_run` against :meth:`run`,
+        #: or None to verify nothing. See :class:`verification.ReferenceVerifier`.
+        self.reference_verifier = None
+
+        #: The observers of the steps of :meth:`run_steps` and :meth:`iter_run`, see :meth:`add_observer`.
+        self.observers = observers.Observers()
+
+        #: The names of the outputs needed, of the roots or of the elements, or None for all the outputs.
+        #: Only these outputs and the variables they depend on are computed and stored in :attr:`outputs`, see :attr:`computed_variables`.
+        #: The other variables of :attr:`inputs` are left unchanged by the steps.
+        self.outputs_variables = outputs_variables
+        if outputs_variables is not None:
+            engine.computed_variables(outputs_variables)  # check the names
+
         #: Update parameters if specified
         if update_parameters:
             parameters.__dict__.update(update_parameters)
@@ -53,13 +236,219 @@ class Simulation(object):
         self.inputs.clear()
         self.inputs.update(inputs)
 
-    def run(self, forced_max_protein_elements=None, opt_full_remob=False, postflowering_stages=False):
+    @property
+    def computed_variables(self):
+        """The variables computed and stored at each step, by scale: ``{'roots': set, 'elements': set}``, or None if all the variables are.
+        See :attr:`outputs_variables` and :func:`engine.computed_variables`."""
+        if self.outputs_variables is None:
+            return None
+        return engine.computed_variables(self.outputs_variables)
+
+    def update_inputs(self, updates):
+        """
+        Update some variables of some roots, axes or elements of :attr:`inputs`, for example with the variables computed by a coupled model,
+        instead of initializing the whole canopy again.
+
+        The updates of a type of inputs are given either by id, with the same structure as :attr:`inputs`,
+        or as a dataframe with the topology columns of the type of inputs (see :attr:`INPUTS_TYPES`) and one column by updated variable.
+        The missing values of a dataframe are skipped. The updated records are replaced, not updated in place (see :meth:`fork`).
+
+        :param dict updates: the updates, by type of inputs: ``{'elements': {element_id: {'proteins': 50.2, ...}, ...}, 'axes': axes_updates_df, ...}``.
+
+        :raises KeyError: if an id of `updates` is not in :attr:`inputs`. See :meth:`add_inputs` to add roots, axes or elements.
+        :raises ValueError: if a variable of `updates` is neither an input or an output of Senesc-Wheat (see :attr:`INPUTS_TYPES` and :attr:`OUTPUTS_NAMES`)
+                            nor a variable of the updated record, for example a misspelt variable.
+        """
+        all_checked_updates = []
+        for inputs_type, all_updates in updates.items():
+            if isinstance(all_updates, pd.DataFrame):
+                topology_columns = INPUTS_TYPES[inputs_type][0]
+                columns = all_updates.columns.difference(topology_columns)
+                all_updates = [(inputs_id, {name: value for name, value in inputs_updates.items() if not pd.isnull(value)})
+                               for inputs_id, inputs_updates in zip(all_updates[topology_columns].itertuples(index=False, name=None), all_updates[columns].to_dict('records'))]
+            else:
+                all_updates = list(all_updates.items())
+            all_inputs = self.inputs[inputs_type]
+            unknown_ids = [inputs_id for inputs_id, _ in all_updates if inputs_id not in all_inputs]
+            if unknown_ids:
+                raise KeyError('Unknown {} ids: {}'.format(inputs_type, ', '.join(map(str, unknown_ids))))
+            known_names = set(INPUTS_TYPES[inputs_type][1]).union(OUTPUTS_NAMES[inputs_type])
+            for inputs_id, inputs_updates in all_updates:
+                unknown_names = [name for name in inputs_updates if name not in known_names and name not in all_inputs[inputs_id]]
+                if unknown_names:
+                    raise ValueError('Unknown variables of the {} {}: {}'.format(inputs_type, inputs_id, ', '.join(unknown_names)))
+            all_checked_updates.append((all_inputs, all_updates))
+
+        for all_inputs, all_updates in all_checked_updates:
+            for inputs_id, inputs_updates in all_updates:
+                inputs_dict = all_inputs[inputs_id].copy()
+                inputs_dict.update(inputs_updates)
+                all_inputs[inputs_id] = inputs_dict
+
+    def apply_outputs(self):
+        """
+        Update :attr:`inputs` with :attr:`outputs`, to use the outputs of a step of :meth:`run` as the inputs of the next step.
+        The updated records are replaced, not updated in place: the records shared with a forked simulation are not changed (see :meth:`fork`).
+        """
+        for inputs_type in ('roots', 'elements'):
+            all_inputs = self.inputs[inputs_type]
+            all_outputs = self.outputs.get(inputs_type, {})
+            if isinstance(all_outputs, views.OutputsView):
+                all_outputs.update_records(all_inputs)
+                continue
+            for inputs_id, outputs_dict in all_outputs.items():
+                inputs_dict = all_inputs[inputs_id].copy()
+                inputs_dict.update(outputs_dict)
+                all_inputs[inputs_id] = inputs_dict
+
+    def add_inputs(self, inputs):
+        """
+        Add roots, axes or elements to :attr:`inputs`, for example the elements which appear in a coupled model.
+
+        :param dict inputs: the inputs of the new roots, axes or elements, with the same structure as :attr:`inputs`.
+                            Each of them must have all the inputs needed by Senesc-Wheat (see :attr:`INPUTS_TYPES`).
+
+        :raises ValueError: if an id of `inputs` is already in :attr:`inputs`, or if inputs are missing.
+        """
+        for inputs_type, all_new_inputs in inputs.items():
+            all_inputs = self.inputs.get(inputs_type, {})
+            inputs_names = INPUTS_TYPES[inputs_type][1]
+            for inputs_id, inputs_dict in all_new_inputs.items():
+                if inputs_id in all_inputs:
+                    raise ValueError('The {} {} are already in the inputs'.format(inputs_type, inputs_id))
+                missing_inputs = [name for name in inputs_names if name not in inputs_dict]
+                if missing_inputs:
+                    raise ValueError('Missing inputs of the {} {}: {}'.format(inputs_type, inputs_id, ', '.join(missing_inputs)))
+
+        for inputs_type, all_new_inputs in inputs.items():
+            record_type = INPUTS_TYPES[inputs_type][2]
+            all_inputs = self.inputs.setdefault(inputs_type, {})
+            for inputs_id, inputs_dict in all_new_inputs.items():
+                all_inputs[inputs_id] = record_type(inputs_dict)
+
+    def remove_inputs(self, ids):
+        """
+        Remove roots, axes or elements from :attr:`inputs`, and their outputs from :attr:`outputs`.
+
+        :param dict ids: the ids to remove, by type of inputs: ``{'elements': [element_id, ...], ...}``.
+
+        :raises KeyError: if an id of `ids` is not in :attr:`inputs`.
+        """
+        for inputs_type, inputs_ids in ids.items():
+            all_inputs = self.inputs[inputs_type]
+            unknown_ids = [inputs_id for inputs_id in inputs_ids if inputs_id not in all_inputs]
+            if unknown_ids:
+                raise KeyError('Unknown {} ids: {}'.format(inputs_type, ', '.join(map(str, unknown_ids))))
+
+        for inputs_type, inputs_ids in ids.items():
+            all_inputs = self.inputs[inputs_type]
+            all_outputs = self.outputs.get(inputs_type, {})
+            for inputs_id in inputs_ids:
+                del all_inputs[inputs_id]
+            if isinstance(all_outputs, views.OutputsView):
+                self.outputs[inputs_type] = all_outputs.drop(inputs_ids)
+            else:
+                for inputs_id in inputs_ids:
+                    all_outputs.pop(inputs_id, None)
+
+    def set_plants_parameters(self, groups_parameters, plants_groups=None):
+        """
+        Give different values of the parameters to the elements of different plants, for example to simulate a mixture of cultivars in one canopy.
+
+        The plants can be grouped, for example by genotype: `plants_groups` then gives the group of each plant, and
+        `groups_parameters` the parameters of each group. Otherwise, `groups_parameters` gives the parameters of each plant.
+        The parameters of the plants not given keep the values of :mod:`senescwheat.parameters`.
+
+        :param dict groups_parameters: the values of the parameters, by group or by plant index: ``{group: {parameter_name: parameter_value, ...}, ...}``.
+                                       The parameter names are among :attr:`engine.PLANTS_PARAMETERS`, and the values have the structure of the values of
+                                       :mod:`senescwheat.parameters`, for example ``{'FRACTION_N_MAX': {'blade': 0.45, 'stem': 0.4}, 'SENESCENCE_LENGTH_MAX_RATE': 2e-7}``.
+                                       The dictionary values can be partial: their entries are merged over the values of :mod:`senescwheat.parameters`,
+                                       for example ``{'FRACTION_N_MAX': {'blade': 0.45}}`` keeps the value of `FRACTION_N_MAX` for the stems.
+        :param dict plants_groups: the group of each plant index, or None if `groups_parameters` is by plant index.
+
+        :raises ValueError: if a parameter cannot differ between plants, or if an entry of a dictionary value is unknown.
+        """
+        merged_groups_parameters = {group: _merge_plant_parameters(group_parameters) for group, group_parameters in groups_parameters.items()}
+        if plants_groups is None:
+            self.plants_parameters = merged_groups_parameters
+        else:
+            self.plants_parameters = {plant: dict(merged_groups_parameters[group]) for plant, group in plants_groups.items() if group in merged_groups_parameters}
+
+    def add_observer(self, observer, when=observers.AFTER_STEP, every=1):
+        """
+        Register an observer of the steps of :meth:`run_steps` and :meth:`iter_run`, for example to monitor the run or to stop it early.
+
+        :param observer: the function called at the steps: ``observer(step, t, roots, elements)``, `step` being the index of the step in the run,
+                         `t` the time of the step, and `roots` and `elements` read-only :class:`observers.StateView` of the arrays of the state.
+                         The observer returns True to stop the run: then :attr:`outputs` and :attr:`inputs` hold the state at the stop,
+                         and :attr:`observers.Observers.stopped_step <observers>` the index of the step. See :func:`observers.stop_when_all_over`.
+        :param str when: :attr:`observers.BEFORE_STEP` to call the observer on the state before the step, :attr:`observers.AFTER_STEP` on the state after the step.
+        :param int every: call the observer at one step out of `every`, from the first step of each run.
+        """
+        self.observers.add(observer, when, every)
+
+    def remove_observer(self, observer):
+        """
+        Unregister an observer registered by :meth:`add_observer`.
+
+        :param observer: the observer.
+
+        :raises ValueError: if the observer is not registered.
+        """
+        self.observers.remove(observer)
+
+    def force_green_area(self, observations):
+        """
+        Force the green area of the senescing elements with observed kinetics.
+
+        At a time where an element is observed, its green area is set to the observed value instead of being computed,
+        and the remobilisation follows from the relative variation of its green area.
+        The elements not observed at this time are computed as usual.
+        The observations are loaded once in :attr:`forced_green_area`, see :class:`forcing.ForcedGreenArea`.
+
+        :param pandas.DataFrame observations: the observed green area, with one line by time and element: the column :attr:`converter.TIME_COLUMN`,
+                                              the columns :attr:`converter.ELEMENTS_TOPOLOGY_COLUMNS` and the column `green_area`.
+                                              None to stop forcing the green area.
+        """
+        self.forced_green_area = None if observations is None else forcing.ForcedGreenArea(observations)
+
+    def fork(self):
+        """
+        Create a child simulation which starts from the current state of this simulation, for example to run
+        several scenarios after a common spin-up.
+
+        The fork is cheap: the child shares the records of :attr:`inputs` and :attr:`outputs` with this simulation, copy-on-write.
+        The simulations never update a shared record in place, but replace it by an updated copy
+        (see :meth:`run_steps`, :meth:`iter_run`, :meth:`apply_outputs` and :meth:`update_inputs`). A driver which updates the records
+        must use these methods: updating a record of :attr:`inputs` in place would change it in the forked simulations too.
+        The child also shares :attr:`forced_green_area`, and gets a copy of :attr:`event_log`, :attr:`balance_checker`, :attr:`reference_verifier`,
+        :attr:`observers` and :attr:`aggregations`.
+
+        :return: The child simulation.
+        :rtype: Simulation
+        """
+        child = self.__class__.__new__(self.__class__)
+        child.__dict__.update(self.__dict__)
+        child.inputs = {inputs_type: dict(all_inputs) for inputs_type, all_inputs in self.inputs.items()}
+        # the views on the outputs are read-only, and are shared as they are
+        child.outputs = {outputs_type: all_outputs if isinstance(all_outputs, views.OutputsView) else dict(all_outputs) for outputs_type, all_outputs in self.outputs.items()}
+        child.aggregations = dict(self.aggregations)
+        child.plants_parameters = dict(self.plants_parameters)
+        child.event_log = copy.deepcopy(self.event_log)
+        child.balance_checker = copy.deepcopy(self.balance_checker)
+        child.reference_verifier = copy.deepcopy(self.reference_verifier)
+        child.observers = self.observers.copy()
+        return child
+
+    def run(self, forced_max_protein_elements=None, opt_full_remob=False, postflowering_stages=False, t=None):
         """
         Compute Senesc-Wheat outputs from :attr:`inputs`, and update :attr:`outputs`.
 
         :param set forced_max_protein_elements: The elements ids with fixed max proteins.
         :param bool postflowering_stages: True to run a simulation with postflo parameter
         :param bool opt_full_remob: whether all proteins should be remobilised
+        :param t: the time of the step, to read :attr:`forced_green_area` and to log the events in :attr:`event_log`.
+                  Must be given if the green area is forced or if the events are recorded.
 
         .. todo:: remove forced_max_protein_elements
 
@@ -68,15 +457,42 @@ class Simulation(object):
         if postflowering_stages:
             opt_full_remob = True
 
+        if t is None and (self.forced_green_area is not None or self.event_log is not None):
+            raise ValueError('The time of the step must be given when the green area is forced or when the events are recorded')
+
         self.outputs.update({inputs_type: {} for inputs_type in self.inputs.keys()})
 
+        # the mass balances of the elements before the step, if the step is checked
+        pools_before = None
+        if self.balance_checker is not None and self.balance_checker.sample():
+            pools_before = self.balance_checker.pools(engine.ElementsState.from_dict(self.inputs['elements']))
+
+        # the plants identical to another plant are not computed, but get its outputs
+        plants_replicas = self.plants_replicas = self._plants_replicas(forced_max_protein_elements, t) if self.deduplicate_plants else {}
+        replicas = set()
+        for plant_replicas in plants_replicas.values():
+            replicas.update(plant_replicas)
+
         # axes
         all_axes_inputs = self.inputs['axes']
 
+        # the variables to compute, see outputs_variables
+        roots_variables = elements_variables = None
+        computed_variables = self.computed_variables
+        if computed_variables is not None:
+            roots_variables, elements_variables = computed_variables['roots'], computed_variables['elements']
+        computes_proteins = engine.computes_pool(elements_variables, 'proteins')
+        computes_carbon = engine.computes_pool(elements_variables, 'carbon')
+        computes_cytokinins = engine.computes_pool(elements_variables, 'cytokinins')
+        computes_nitrates = engine.computes_pool(elements_variables, 'nitrates')
+
         # Roots
         all_roots_inputs = self.inputs['roots']
         all_roots_outputs = self.outputs['roots']
         for roots_inputs_id, roots_inputs_dict in all_roots_inputs.items():
+            if roots_inputs_id[0] in replicas or roots_variables == set():
+                continue
+
             # Temperature-compensated time (delta_teq)
             delta_teq = all_axes_inputs[roots_inputs_id]['delta_teq_roots']
 
@@ -87,46 +503,76 @@ class Simulation(object):
             # loss of cytokinins (losses of nitrates, amino acids and sucrose are neglected)
             loss_cytokinins = model.SenescenceModel.calculate_remobilisation(roots_inputs_dict['cytokinins'], relative_delta_mstruct)
             # Update of root outputs
-            all_roots_outputs[roots_inputs_id] = {'mstruct': roots_inputs_dict['mstruct'] - delta_mstruct,
-                                                  'senesced_mstruct': roots_inputs_dict['senesced_mstruct'] + delta_mstruct,
-                                                  'rate_mstruct_death': rate_mstruct_death,
-                                                  'Nstruct': roots_inputs_dict['Nstruct'] - delta_Nstruct,
-                                                  'cytokinins': roots_inputs_dict['cytokinins'] - loss_cytokinins}
+            all_roots_outputs[roots_inputs_id] = records.RootsRecord(mstruct=roots_inputs_dict['mstruct'] - delta_mstruct,
+                                                                     senesced_mstruct=roots_inputs_dict['senesced_mstruct'] + delta_mstruct,
+                                                                     rate_mstruct_death=rate_mstruct_death,
+                                                                     Nstruct=roots_inputs_dict['Nstruct'] - delta_Nstruct,
+                                                                     cytokinins=roots_inputs_dict['cytokinins'] - loss_cytokinins)
+            if roots_variables is not None:
+                all_roots_outputs[roots_inputs_id] = records.RootsRecord((name, value) for name, value in all_roots_outputs[roots_inputs_id].items() if name in roots_variables)
+            for replica in plants_replicas.get(roots_inputs_id[0], ()):
+                all_roots_outputs[(replica,) + roots_inputs_id[1:]] = all_roots_outputs[roots_inputs_id].copy()
 
         # Elements
         all_elements_inputs = self.inputs['elements']
         all_elements_outputs = self.outputs['elements']
+        # the values of the parameters of each plant, see plants_parameters
+        default_parameters = {name: getattr(parameters, name) for name in engine.PLANTS_PARAMETERS}
+        all_plants_parameters = {plant: dict(default_parameters, **plant_parameters) for plant, plant_parameters in self.plants_parameters.items()}
         for element_inputs_id, element_inputs_dict in all_elements_inputs.items():
 
             axe_label = element_inputs_id[1]
             if axe_label != 'MS':  # TODO: Calculation only for the main stem
                 continue
 
+            if element_inputs_id[0] in replicas:
+                continue
+            # the element and the same element of the replicas of its plant
+            elements_ids = [element_inputs_id] + [(replica,) + element_inputs_id[1:] for replica in plants_replicas.get(element_inputs_id[0], ())]
+
+            plant_parameters = all_plants_parameters.get(element_inputs_id[0], default_parameters)
+            fraction_N_max = plant_parameters['FRACTION_N_MAX']['blade' if element_inputs_id[3] == 'blade' else 'stem']
+
             # Temperature-compensated time (delta_teq)
             axe_id = element_inputs_id[:2]
             delta_teq = all_axes_inputs[axe_id]['delta_teq']
 
             # Senescence
-            element_outputs_dict = element_inputs_dict.copy()
+            element_outputs_dict = records.ElementRecord(element_inputs_dict)
 
-            if model.SenescenceModel.calculate_if_element_is_over(element_inputs_dict['green_area'], element_inputs_dict['is_growing'], element_inputs_dict['mstruct']):
+            if model.SenescenceModel.calculate_if_element_is_over(element_inputs_dict['green_area'], element_inputs_dict['is_growing'], element_inputs_dict['mstruct'],
+                                                                  plant_parameters['MIN_GREEN_AREA']):
                 element_outputs_dict['green_area'] = 0.0
                 element_outputs_dict['senesced_length_element'] = element_inputs_dict['length']
                 element_outputs_dict['mstruct'] = 0
                 element_outputs_dict['senesced_mstruct'] += element_inputs_dict['mstruct']
                 element_outputs_dict['is_over'] = True
+                if self.event_log is not None:
+                    for element_id in elements_ids:
+                        self._log_element_events(t, element_id, element_inputs_dict, element_outputs_dict, None)
             elif not element_inputs_dict['is_growing']:
                 update_max_protein = forced_max_protein_elements is None or element_inputs_id not in forced_max_protein_elements
+                forced_green_area = np.nan if self.forced_green_area is None else self.forced_green_area.get(t, element_inputs_id)
+
+                if not np.isnan(forced_green_area):
+                    new_green_area, relative_delta_green_area = model.SenescenceModel.calculate_relative_delta_forced_green_area(element_inputs_dict['green_area'],
+                                                                                                                               forced_green_area)
+                    prev_senesced_length = element_inputs_dict.get('senesced_length_element', 0)
+                    new_senesced_length = prev_senesced_length + relative_delta_green_area * (element_inputs_dict['length'] - prev_senesced_length)
+                    max_proteins = element_inputs_dict['max_proteins']
+                    senescence_event = events.SENESCENCE_FORCED
 
-                if postflowering_stages:
+                elif postflowering_stages:
                     new_green_area, relative_delta_green_area, max_proteins = model.SenescenceModel.calculate_relative_delta_green_area(element_inputs_id[3], element_inputs_dict['green_area'],
                                                                                                                                         element_inputs_dict['proteins'] / element_inputs_dict[
                                                                                                                                             'mstruct'],
                                                                                                                                         element_inputs_dict['max_proteins'], delta_teq,
-                                                                                                                                        update_max_protein)
+                                                                                                                                        update_max_protein, fraction_N_max,
+                                                                                                                                        plant_parameters['SENESCENCE_MAX_RATE'])
 
                     # Temporaire
                     new_senesced_length = relative_delta_green_area * (element_inputs_dict['length'] - element_inputs_dict.get('senesced_length_element', 0))
+                    senescence_event = events.SENESCENCE_PROTEINS
 
                 else:
                     # Temporaire
@@ -136,58 +582,311 @@ class Simulation(object):
                                                                                                                                                        element_inputs_dict['proteins'] /
                                                                                                                                                        element_inputs_dict['mstruct'],
                                                                                                                                                        element_inputs_dict['max_proteins'], delta_teq,
-                                                                                                                                                       update_max_protein)
+                                                                                                                                                       update_max_protein, fraction_N_max,
+                                                                                                                                                       plant_parameters['SENESCENCE_LENGTH_MAX_RATE'])
+                    senescence_event = events.SENESCENCE_PROTEINS
                     # Senescence with element age
-                    if element_inputs_id[3] != 'internode' and relative_delta_senesced_length == 0 and element_inputs_dict['age'] > parameters.AGE_EFFECT_SENESCENCE:
+                    if element_inputs_id[3] != 'internode' and relative_delta_senesced_length == 0 and element_inputs_dict['age'] > plant_parameters['AGE_EFFECT_SENESCENCE']:
+                        senescence_event = events.SENESCENCE_AGE
                         new_senesced_length, relative_delta_senesced_length, max_proteins = model.SenescenceModel.calculate_relative_delta_senesced_length(element_inputs_id[3],
                                                                                                                                                            element_inputs_dict['senesced_length_element'],
                                                                                                                                                            element_inputs_dict['length'],
                                                                                                                                                            0,
                                                                                                                                                            max_proteins, delta_teq,
-                                                                                                                                                           update_max_protein)
+                                                                                                                                                           update_max_protein, fraction_N_max,
+                                                                                                                                                           plant_parameters['SENESCENCE_LENGTH_MAX_RATE'])
                     # Temporaire :
                     relative_delta_green_area = relative_delta_senesced_length
                     new_green_area = element_inputs_dict['green_area'] * (1 - relative_delta_green_area)
 
-                # Remobilisation
-                N_content_total = model.SenescenceModel.calculate_N_content_total(element_inputs_dict['proteins'], element_inputs_dict['amino_acids'], element_inputs_dict['nitrates'],
-                                                                                  element_inputs_dict['Nstruct'], element_inputs_dict['max_mstruct'], element_inputs_dict['Nresidual'])
-
-                remob_starch = model.SenescenceModel.calculate_remobilisation(element_inputs_dict['starch'], relative_delta_green_area)
-                remob_fructan = model.SenescenceModel.calculate_remobilisation(element_inputs_dict['fructan'], relative_delta_green_area)
-                remob_proteins, delta_aa, delta_Nresidual = model.SenescenceModel.calculate_remobilisation_proteins(element_inputs_id[3], element_inputs_id[2], element_inputs_dict['proteins'],
-                                                                                                                    relative_delta_green_area, N_content_total, opt_full_remob)
-                loss_cytokinins = model.SenescenceModel.calculate_remobilisation(element_inputs_dict['cytokinins'], relative_delta_green_area)
-                loss_nitrates = model.SenescenceModel.calculate_remobilisation(element_inputs_dict['nitrates'], relative_delta_green_area)
-
                 # Loss of mstruct and Nstruct
                 delta_mstruct, delta_Nstruct = model.SenescenceModel.calculate_delta_mstruct_shoot(relative_delta_green_area, element_inputs_dict['mstruct'], element_inputs_dict['Nstruct'])
                 new_mstruct = element_inputs_dict['mstruct'] - delta_mstruct
                 new_Nstruct = element_inputs_dict['Nstruct'] - delta_Nstruct
 
-                delta_Nresidual += element_inputs_dict['Nstruct'] - new_Nstruct
-
                 if new_mstruct == 0:
                     is_over = True
                 else:
                     is_over = False
 
                 # Turn 'is_over' to True when the element is fully senescent (to delete the element in the shared elements inputs/outputs)
-                element_outputs_dict = {'green_area': new_green_area,
-                                        'senesced_length_element': new_senesced_length,
-                                        'mstruct': new_mstruct,
-                                        'senesced_mstruct': element_inputs_dict['senesced_mstruct'] + delta_mstruct,
-                                        'Nstruct': new_Nstruct,
-                                        'starch': element_inputs_dict['starch'] - remob_starch,
-                                        'sucrose': element_inputs_dict['sucrose'] + remob_starch + remob_fructan,
-                                        'fructan': element_inputs_dict['fructan'] - remob_fructan,
-                                        'proteins': element_inputs_dict['proteins'] - remob_proteins,
-                                        'amino_acids': element_inputs_dict['amino_acids'] + delta_aa,
-                                        'cytokinins': element_inputs_dict['cytokinins'] - loss_cytokinins,
-                                        'nitrates': element_inputs_dict['nitrates'] - loss_nitrates,
-                                        'max_proteins': max_proteins,
-                                        'Nresidual': element_inputs_dict['Nresidual'] + delta_Nresidual,
-                                        'N_content_total': N_content_total,
-                                        'is_over': is_over}
-
+                element_outputs_dict = records.ElementRecord(green_area=new_green_area,
+                                                             senesced_length_element=new_senesced_length,
+                                                             mstruct=new_mstruct,
+                                                             senesced_mstruct=element_inputs_dict['senesced_mstruct'] + delta_mstruct,
+                                                             Nstruct=new_Nstruct,
+                                                             max_proteins=max_proteins,
+                                                             is_over=is_over)
+
+                # Remobilisation, of the pools needed only
+                if computes_proteins:
+                    N_content_total = model.SenescenceModel.calculate_N_content_total(element_inputs_dict['proteins'], element_inputs_dict['amino_acids'],
+                                                                                      element_inputs_dict['nitrates'], element_inputs_dict['Nstruct'],
+                                                                                      element_inputs_dict['max_mstruct'], element_inputs_dict['Nresidual'])
+                    ratio_N_mstruct = plant_parameters['RATIO_N_MSTRUCT'].get(element_inputs_id[2], plant_parameters['DEFAULT_RATIO_N_MSTRUCT'])
+                    remob_proteins, delta_aa, delta_Nresidual = model.SenescenceModel.calculate_remobilisation_proteins(element_inputs_id[3], element_inputs_id[2],
+                                                                                                                        element_inputs_dict['proteins'], relative_delta_green_area,
+                                                                                                                        N_content_total, opt_full_remob, ratio_N_mstruct)
+                    delta_Nresidual += element_inputs_dict['Nstruct'] - new_Nstruct
+                    element_outputs_dict['proteins'] = element_inputs_dict['proteins'] - remob_proteins
+                    element_outputs_dict['amino_acids'] = element_inputs_dict['amino_acids'] + delta_aa
+                    element_outputs_dict['Nresidual'] = element_inputs_dict['Nresidual'] + delta_Nresidual
+                    element_outputs_dict['N_content_total'] = N_content_total
+                if computes_carbon:
+                    remob_starch = model.SenescenceModel.calculate_remobilisation(element_inputs_dict['starch'], relative_delta_green_area)
+                    remob_fructan = model.SenescenceModel.calculate_remobilisation(element_inputs_dict['fructan'], relative_delta_green_area)
+                    element_outputs_dict['starch'] = element_inputs_dict['starch'] - remob_starch
+                    element_outputs_dict['sucrose'] = element_inputs_dict['sucrose'] + remob_starch + remob_fructan
+                    element_outputs_dict['fructan'] = element_inputs_dict['fructan'] - remob_fructan
+                if computes_cytokinins:
+                    loss_cytokinins = model.SenescenceModel.calculate_remobilisation(element_inputs_dict['cytokinins'], relative_delta_green_area)
+                    element_outputs_dict['cytokinins'] = element_inputs_dict['cytokinins'] - loss_cytokinins
+                if computes_nitrates:
+                    loss_nitrates = model.SenescenceModel.calculate_remobilisation(element_inputs_dict['nitrates'], relative_delta_green_area)
+                    element_outputs_dict['nitrates'] = element_inputs_dict['nitrates'] - loss_nitrates
+
+                if self.event_log is not None:
+                    for element_id in elements_ids:
+                        self._log_element_events(t, element_id, element_inputs_dict, element_outputs_dict, senescence_event if relative_delta_green_area > 0 else None)
+
+            if elements_variables is not None:
+                element_outputs_dict = records.ElementRecord((name, value) for name, value in element_outputs_dict.items() if name in elements_variables)
             all_elements_outputs[element_inputs_id] = element_outputs_dict
+            for element_id in elements_ids[1:]:
+                all_elements_outputs[element_id] = element_outputs_dict.copy()
+
+        if pools_before is not None:
+            elements_state = engine.ElementsState.from_dict({element_id: all_elements_outputs.get(element_id, element_inputs_dict)
+                                                              for element_id, element_inputs_dict in all_elements_inputs.items()})
+            self.balance_checker.check(self.balance_checker.nb_steps - 1 if t is None else t, elements_state, pools_before)
+
+    def _plants_replicas(self, forced_max_protein_elements, t):
+        """
+        Find the plants which are replicas of another plant for the next step of :meth:`run`: the plants whose roots, axes and elements have the same inputs,
+        with the same forcings (forced max proteins and forced green area) and the same :attr:`plants_parameters`.
+        The inputs are compared by value, NaN being different from NaN: the plants with NaN inputs are not replicas.
+
+        :param set forced_max_protein_elements: The elements ids with fixed max proteins.
+        :param t: the time of the step, to read :attr:`forced_green_area`.
+
+        :return: The replicas of each plant which has replicas: {plant_index: [replica_plant_index, ...], ...}.
+                 The plant is the first of the plants with identical states, in the order of the inputs.
+        :rtype: dict
+        """
+        plants_states = {}
+        for inputs_type in ('roots', 'axes', 'elements'):
+            for inputs_id, inputs_dict in self.inputs[inputs_type].items():
+                inputs_key = inputs_dict.values_key() if isinstance(inputs_dict, records.Record) else frozenset(inputs_dict.items())
+                plants_states.setdefault(inputs_id[0], []).append((inputs_type, inputs_id[1:], inputs_key))
+        for element_id in forced_max_protein_elements or ():
+            if element_id[0] in plants_states:
+                plants_states[element_id[0]].append(('forced_max_protein', element_id[1:]))
+        if self.forced_green_area is not None:
+            for element_id in self.inputs['elements']:
+                forced_green_area = self.forced_green_area.get(t, element_id)
+                if not np.isnan(forced_green_area):
+                    plants_states[element_id[0]].append(('forced_green_area', element_id[1:], forced_green_area))
+
+        plants_replicas = {}
+        representatives = {}
+        for plant, plant_state in plants_states.items():
+            plant_state = (frozenset(plant_state), repr(sorted(self.plants_parameters.get(plant, {}).items())))
+            representative = representatives.setdefault(plant_state, plant)
+            if representative != plant:
+                plants_replicas.setdefault(representative, []).append(plant)
+        return plants_replicas
+
+    def _log_element_events(self, t, element_id, element_inputs_dict, element_outputs_dict, senescence_event):
+        """Log the events of one element computed by :meth:`run` in :attr:`event_log`."""
+        if senescence_event == events.SENESCENCE_PROTEINS:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                value = np.float64(element_inputs_dict['proteins'] / element_inputs_dict['mstruct']) / element_inputs_dict['max_proteins']
+            self.event_log.append(t, element_id, senescence_event, value)
+        elif senescence_event == events.SENESCENCE_AGE:
+            self.event_log.append(t, element_id, senescence_event, element_inputs_dict['age'])
+        elif senescence_event == events.SENESCENCE_FORCED:
+            self.event_log.append(t, element_id, senescence_event, element_outputs_dict['green_area'])
+        if element_outputs_dict['max_proteins'] != element_inputs_dict['max_proteins']:
+            self.event_log.append(t, element_id, events.MAX_PROTEINS_OVERWRITTEN, element_outputs_dict['max_proteins'])
+        if element_outputs_dict['is_over'] and not element_inputs_dict.get('is_over', False):
+            self.event_log.append(t, element_id, events.OVER, element_outputs_dict['senesced_mstruct'])
+
+    def run_steps(self, nb_steps, forced_max_protein_elements=None, opt_full_remob=False, postflowering_stages=False, nb_workers=1, nb_threads=1,
+                  chunk_size=engine.DEFAULT_CHUNK_SIZE, t=0, dtype=float):
+        """
+        Run `nb_steps` steps with the vectorized :mod:`engine <senescwheat.engine>`, the outputs of each step being the inputs of the next step.
+        The inputs of the axes are constant.
+
+        The state is kept in arrays between the steps: the outputs are only built at the end of the run.
+        Then :attr:`outputs` holds the outputs of the last step, with the variables of the roots and elements of :attr:`computed_variables`
+        (all the variables if :attr:`outputs_variables` is None), and :attr:`inputs` is updated with these outputs.
+        The run ends before `nb_steps` steps if an observer requests it, see :meth:`add_observer`.
+
+        :param int nb_steps: the number of steps to run.
+        :param set forced_max_protein_elements: The elements ids with fixed max proteins.
+        :param bool opt_full_remob: whether all proteins should be remobilised
+        :param bool postflowering_stages: True to run a simulation with postflo parameter
+        :param int nb_workers: the number of worker processes. If greater than 1, the canopy is split by plant between
+                               the workers, see :func:`parallel.run_steps`.
+        :param int nb_threads: the number of threads computing the elements (of each worker). If greater than 1,
+                               the elements are split in chunks of `chunk_size` elements, see :func:`engine.run_steps`.
+        :param int chunk_size: the number of elements computed at once by a thread.
+        :param int t: the time of the first step, to read :attr:`forced_green_area` and to log the events in :attr:`event_log`.
+                      The step `i` of the run is at time `t + i`.
+        :param numpy.dtype dtype: the floating point type of the state of the engine, for example `numpy.float32` to halve the memory used
+                                  by the large canopies. The variables :attr:`engine.DEFAULT_FULL_PRECISION_VARIABLES` are kept in float64.
+                                  See :func:`engine.precision_report` to measure the deviation from a float64 run.
+
+        :return: The aggregates defined by :attr:`aggregations` at each step, with one line by step and axis, or None if :attr:`aggregations` is empty.
+        :rtype: pandas.DataFrame
+
+        :raises ValueError: if observers are registered and `nb_workers` is greater than 1.
+        """
+        roots_state = engine.RootsState.from_dict(self.inputs['roots'], dtype)
+        elements_state = engine.ElementsState.from_dict(self.inputs['elements'], dtype)
+        resolved_parameters = engine.resolve_parameters(elements_state, plants_parameters=self.plants_parameters)
+        computed_variables = self.computed_variables
+        roots_delta_teq = engine.axes_forcings(self.inputs['axes'], roots_state.axes_ids, 'delta_teq_roots', dtype)
+        elements_delta_teq = engine.axes_forcings(self.inputs['axes'], elements_state.axes_ids, 'delta_teq', dtype)
+        forced_max_protein_elements = forced_max_protein_elements or set()
+        update_max_protein = np.array([id_ not in forced_max_protein_elements for id_ in elements_state.ids], dtype=bool)
+        forced_green_area = None
+        if self.forced_green_area is not None:
+            forced_green_area = self.forced_green_area.table(range(t, t + nb_steps), self.forced_green_area.positions(elements_state.ids))
+
+        self.plants_replicas = {}
+        if self.reference_verifier is not None:
+            self.reference_verifier.configure(self.plants_parameters, self.outputs_variables)
+        if len(self.observers) and nb_workers > 1:
+            raise ValueError('The observers of the steps cannot be called from worker processes: nb_workers must be 1')
+
+        if nb_workers > 1:
+            # imported here, so that the runs on one process do not load multiprocessing
+            from senescwheat import parallel
+            run_steps = functools.partial(parallel.run_steps, nb_workers=nb_workers)
+        else:
+            run_steps = functools.partial(engine.run_steps, observers=self.observers if len(self.observers) else None)
+        rate_mstruct_death, N_content_total, all_aggregates = run_steps(roots_state, elements_state, roots_delta_teq, elements_delta_teq, resolved_parameters, nb_steps,
+                                                                        update_max_protein, opt_full_remob, postflowering_stages, self.aggregations,
+                                                                        nb_threads, chunk_size, forced_green_area=forced_green_area, event_log=self.event_log, t=t,
+                                                                        balance_checker=self.balance_checker,
+                                                                        variables=None if computed_variables is None else computed_variables['elements'],
+                                                                        reference_verifier=self.reference_verifier)
+
+        if rate_mstruct_death is not None:
+            self._update_from_states(roots_state, elements_state, rate_mstruct_death, N_content_total, computed_variables)
+
+        if not self.aggregations:
+            return None
+        return self._aggregates_to_dataframe(elements_state.unique_axes_ids, all_aggregates, t)
+
+    def iter_run(self, forcings, forced_max_protein_elements=None, opt_full_remob=False, postflowering_stages=False, nb_threads=1,
+                 chunk_size=engine.DEFAULT_CHUNK_SIZE, t=0, dtype=float):
+        """
+        Run one step with the vectorized :mod:`engine <senescwheat.engine>` for each item of `forcings`, the outputs of each step being the inputs of the next step.
+
+        This is a generator: the steps are run lazily, as the outputs are consumed, and the memory used does not depend on the number of steps.
+        Each item of `forcings` gives the axes inputs of one step (for example `delta_teq`, `delta_teq_roots` and `sum_TT`),
+        with the same structure as :attr:`inputs['axes'] <inputs>`. The axes or inputs missing from an item keep their previous value.
+        See :func:`converter.iter_axes_forcings` to read the forcings from a dataframe.
+
+        When the generator is exhausted or closed, :attr:`outputs` holds the outputs of the last step run, and :attr:`inputs` is updated
+        with these outputs and with the last forcings, as with :meth:`run_steps`. The generator is exhausted early if an observer requests it,
+        see :meth:`add_observer`.
+
+        :param forcings: the axes inputs of each step.
+        :param set forced_max_protein_elements: The elements ids with fixed max proteins.
+        :param bool opt_full_remob: whether all proteins should be remobilised
+        :param bool postflowering_stages: True to run a simulation with postflo parameter
+        :param int nb_threads: the number of threads computing the elements, see :func:`engine.iter_steps`.
+        :param int chunk_size: the number of elements computed at once by a thread.
+        :param int t: the time of the first step, to read :attr:`forced_green_area` and to log the events in :attr:`event_log`.
+                      The step `i` of the run is at time `t + i`.
+        :param numpy.dtype dtype: the floating point type of the state of the engine, see :meth:`run_steps`.
+
+        :return: A generator of the outputs of each step. A :class:`StepOutputs` is a view on the state of the engine,
+                 which is only valid until the next step.
+        :rtype: generator [StepOutputs]
+        """
+        roots_state = engine.RootsState.from_dict(self.inputs['roots'], dtype)
+        elements_state = engine.ElementsState.from_dict(self.inputs['elements'], dtype)
+        resolved_parameters = engine.resolve_parameters(elements_state, plants_parameters=self.plants_parameters)
+        computed_variables = self.computed_variables
+        all_axes_inputs = self.inputs['axes']
+        roots_delta_teq = engine.axes_forcings(all_axes_inputs, roots_state.axes_ids, 'delta_teq_roots', dtype)
+        elements_delta_teq = engine.axes_forcings(all_axes_inputs, elements_state.axes_ids, 'delta_teq', dtype)
+        forced_max_protein_elements = forced_max_protein_elements or set()
+        update_max_protein = np.array([id_ not in forced_max_protein_elements for id_ in elements_state.ids], dtype=bool)
+
+        # the rows of each axis, to force the temperature-compensated times in place
+        roots_rows = {}
+        for row, axis_id in enumerate(roots_state.axes_ids):
+            roots_rows.setdefault(axis_id, []).append(row)
+        elements_rows = {}
+        for row, axis_id in enumerate(elements_state.axes_ids):
+            elements_rows.setdefault(axis_id, []).append(row)
+        forced_green_area = forced_green_area_positions = None
+        if self.forced_green_area is not None:
+            forced_green_area = np.empty(len(elements_state), dtype)
+            forced_green_area_positions = self.forced_green_area.positions(elements_state.ids)
+
+        self.plants_replicas = {}
+        if self.reference_verifier is not None:
+            self.reference_verifier.configure(self.plants_parameters, self.outputs_variables)
+
+        steps = engine.iter_steps(roots_state, elements_state, roots_delta_teq, elements_delta_teq, resolved_parameters, update_max_protein,
+                                  opt_full_remob, postflowering_stages, nb_threads, chunk_size, forced_green_area, self.event_log, t,
+                                  None if computed_variables is None else computed_variables['elements'])
+        observers_ = self.observers if len(self.observers) else None
+        if observers_ is not None:
+            observers_.stopped_step = None
+        step_outputs = None
+        try:
+            for step, axes_forcings in enumerate(forcings):
+                if observers_ is not None and observers_.notify_before_step(step, t + step, roots_state, elements_state):
+                    break
+                for axis_id, axis_forcings in axes_forcings.items():
+                    all_axes_inputs[axis_id] = dict(all_axes_inputs.get(axis_id, {}), **axis_forcings)
+                    if 'delta_teq_roots' in axis_forcings and axis_id in roots_rows:
+                        roots_delta_teq[roots_rows[axis_id]] = axis_forcings['delta_teq_roots']
+                    if 'delta_teq' in axis_forcings and axis_id in elements_rows:
+                        elements_delta_teq[elements_rows[axis_id]] = axis_forcings['delta_teq']
+                if forced_green_area is not None:
+                    forced_green_area[...] = self.forced_green_area.at(t + step, forced_green_area_positions)
+                pools_before = self.balance_checker.pools(elements_state) if self.balance_checker is not None and self.balance_checker.sample() else None
+                sample = None
+                if self.reference_verifier is not None:
+                    sample = self.reference_verifier.sample(t + step, roots_state, elements_state, roots_delta_teq, elements_delta_teq, update_max_protein,
+                                                            forced_green_area, opt_full_remob, postflowering_stages)
+                rate_mstruct_death, N_content_total = next(steps)
+                if pools_before is not None:
+                    self.balance_checker.check(t + step, elements_state, pools_before)
+                if sample is not None:
+                    self.reference_verifier.check(sample, roots_state, elements_state, rate_mstruct_death, N_content_total)
+                aggregates = engine.aggregate_by_axis(elements_state, self.aggregations) if self.aggregations else None
+                step_outputs = StepOutputs(step, roots_state, elements_state, rate_mstruct_death, N_content_total, aggregates, computed_variables)
+                stop = observers_ is not None and observers_.notify_after_step(step, t + step, roots_state, elements_state, rate_mstruct_death, N_content_total)
+                yield step_outputs
+                if stop:
+                    break
+        finally:
+            steps.close()
+            if step_outputs is not None:
+                self._update_from_states(roots_state, elements_state, step_outputs.rate_mstruct_death, step_outputs.N_content_total, computed_variables)
+
+    def _update_from_states(self, roots_state, elements_state, rate_mstruct_death, N_content_total, variables=None):
+        """Build :attr:`outputs` from the states reached by the engine, with only `variables` if not None, and update :attr:`inputs` with these outputs."""
+        all_roots_outputs, all_elements_outputs = _outputs_from_states(roots_state, elements_state, rate_mstruct_death, N_content_total, variables)
+        self.outputs.update({inputs_type: {} for inputs_type in self.inputs.keys()})
+        self.outputs['roots'] = all_roots_outputs
+        self.outputs['elements'] = all_elements_outputs
+        self.apply_outputs()
+
+    def _aggregates_to_dataframe(self, axes_ids, all_aggregates, t=0):
+        """Convert the aggregates of each step to a dataframe with one line by step and axis, the first step being at time `t`."""
+        nb_axes = len(axes_ids)
+        aggregates_df = pd.DataFrame(axes_ids * len(all_aggregates), columns=converter.AXES_TOPOLOGY_COLUMNS)
+        aggregates_df.insert(0, converter.TIME_COLUMN, np.repeat(t + np.arange(len(all_aggregates)), nb_axes))
+        for aggregate_name in self.aggregations:
+            aggregates_df[aggregate_name] = np.concatenate([aggregates[aggregate_name] for aggregates in all_aggregates]) if all_aggregates else []
+        return aggregates_df
@@ -0,0 +1,45 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+from senescwheat import cache
+
+"""
+    senescwheat.spinup
+    ~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.spinup` defines a persistent cache of the states reached by a spin-up.
+
+    Several studies often share a long spin-up, for example up to flowering, then branch into several scenarios.
+    :meth:`SpinUpCache.spin_up` runs the spin-up of a simulation once and stores the state reached in a directory.
+    The next spin-ups of the same simulation, in the same process or not, load this state instead of running the steps.
+    The scenarios can then start from :meth:`forks <simulation.Simulation.fork>` of the simulation.
+
+    The state is identified as the results of :meth:`cache.ResultCache.run_steps`, by the inputs, the parameters of
+    :mod:`senescwheat.parameters`, the forced green area, the delta t of the simulation, its log of the events, and the arguments of the spin-up.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+class SpinUpCache(cache.ResultCache):
+    """Persistent cache of the states reached by the spin-ups of simulations.
+    """
+
+    def spin_up(self, simulation_, nb_steps, **run_kwargs):
+        """
+        Bring a simulation to the state reached after `nb_steps` steps of :meth:`simulation.Simulation.run_steps`,
+        loading this state from the cache if it was already computed.
+
+        :param simulation.Simulation simulation_: the simulation to spin up. It is updated in place.
+        :param int nb_steps: the number of steps of the spin-up.
+        :param run_kwargs: the other arguments of :meth:`simulation.Simulation.run_steps`.
+
+        :return: True if the state was loaded from the cache, False if the spin-up was run.
+        :rtype: bool
+        """
+        nb_hits = self.statistics['hits']
+        self.run_steps(simulation_, nb_steps, **run_kwargs)
+        return self.statistics['hits'] > nb_hits
@@ -0,0 +1,257 @@
+# -*- coding: latin-1 -*-
+
+from __future__ import division  # use "//" to do integer division
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import converter
+from senescwheat import parameters
+from senescwheat import simulation
+
+"""
+    senescwheat.verification
+    ~~~~~~~~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.verification` checks the steps of the :mod:`engine <senescwheat.engine>` against the reference simulation.
+
+    :class:`ReferenceVerifier` draws a sample of the computed elements before a step, with their roots, and computes the step of the sample
+    with :meth:`simulation.Simulation.run`, i.e. element by element with :class:`model.SenescenceModel`. The outputs of the reference
+    are compared with the state reached by the engine, and the mismatches are kept with the inputs and the forcings of the element.
+    The cost of a checked step is the cost of the reference on the sample, whatever the number of elements: the verifier can be left on in production.
+    See :attr:`simulation.Simulation.reference_verifier`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the default number of elements checked by step
+DEFAULT_SAMPLE_SIZE = 10
+
+#: the columns of the dataframes of the mismatches, after the time and the topology columns
+MISMATCHES_COLUMNS = ['variable', 'engine', 'reference', 'context']
+
+
+def edge_cases(elements_state):
+    """
+    Find the elements in a state where the branches of the model meet: the elements with no mstruct, with no max proteins,
+    which are fully senesced, or whose green area is under :attr:`parameters.MIN_GREEN_AREA`.
+
+    :param engine.ElementsState elements_state: the state of the elements, without ensemble dimension.
+
+    :return: True for the elements in an edge case.
+    :rtype: numpy.ndarray
+    """
+    columns = elements_state.columns
+    with np.errstate(invalid='ignore'):
+        return ((columns['mstruct'] == 0) | (columns['max_proteins'] == 0) | (columns['length'] == columns['senesced_length_element'])
+                | (columns['green_area'] < parameters.MIN_GREEN_AREA))
+
+
+class ReferenceVerifier(object):
+    """Check samples of the elements at the steps of the engine against the reference simulation, and keep the mismatches.
+
+    A value of the engine mismatches the reference when ``abs(engine - reference) > atol + rtol * abs(reference)``. NaN matches NaN.
+    The default tolerances are 0: the engine must give the same results as the reference.
+    """
+
+    def __init__(self, sample_size=DEFAULT_SAMPLE_SIZE, rtol=0., atol=0., sampling=1, seed=None, strict=False):
+        """
+        :param int sample_size: the number of elements checked at each checked step (and by worker process, see :func:`parallel.run_steps`).
+                                Up to half of the sample is drawn from the elements in an edge case, see :func:`edge_cases`.
+        :param float rtol: the relative tolerance.
+        :param float atol: the absolute tolerance.
+        :param int sampling: check one step out of `sampling`, from the first one.
+        :param int seed: the seed of the random generator.
+        :param bool strict: True to raise a ValueError at the first step with mismatches, False to only keep the mismatches.
+        """
+        #: the number of elements checked at each checked step
+        self.sample_size = sample_size
+        #: the relative tolerance
+        self.rtol = rtol
+        #: the absolute tolerance
+        self.atol = atol
+        #: check one step out of `sampling`
+        self.sampling = sampling
+        #: True to raise a ValueError at the first step with mismatches
+        self.strict = strict
+        #: the parameters of the plants of the simulation checked, see :meth:`configure`
+        self.plants_parameters = {}
+        #: the outputs variables of the simulation checked, see :meth:`configure`
+        self.outputs_variables = None
+        #: the number of steps offered to :meth:`sample`
+        self.nb_steps = 0
+        #: the number of steps checked
+        self.nb_checked_steps = 0
+        #: the number of elements checked
+        self.nb_checked_elements = 0
+        #: the mismatches of the roots: (t, roots_id, variable_name, engine_value, reference_value, context)
+        self.roots_mismatches = []
+        #: the mismatches of the elements: (t, element_id, variable_name, engine_value, reference_value, context)
+        self.elements_mismatches = []
+        self._random_state = np.random.RandomState(seed)
+
+    def configure(self, plants_parameters=None, outputs_variables=None):
+        """
+        Set the settings of the simulation which are not known by the engine.
+
+        :param dict plants_parameters: see :attr:`simulation.Simulation.plants_parameters`.
+        :param set outputs_variables: see :attr:`simulation.Simulation.outputs_variables`.
+        """
+        self.plants_parameters = plants_parameters or {}
+        self.outputs_variables = outputs_variables
+
+    def sample(self, t, roots_state, elements_state, roots_delta_teq, elements_delta_teq, update_max_protein=True, forced_green_area=None,
+               opt_full_remob=False, postflowering_stages=False):
+        """
+        Count a step, and, if the step must be checked, draw the elements to check and keep their inputs.
+        The arguments are the states before the step and the forcings of the step, see :func:`engine.iter_steps`.
+
+        :return: The inputs of the reference simulation of the sample, or None if the step is not checked.
+        :rtype: dict
+        """
+        sampled = self.nb_steps % self.sampling == 0
+        self.nb_steps += 1
+        computed_rows = np.flatnonzero(elements_state.is_computed)
+        if not sampled or not len(computed_rows) or not self.sample_size:
+            return None
+
+        # up to half of the sample in the edge cases
+        is_edge_case = edge_cases(elements_state)[computed_rows]
+        edge_rows, other_rows = computed_rows[is_edge_case], computed_rows[~is_edge_case]
+        nb_edge_rows = min(len(edge_rows), max(self.sample_size // 2, self.sample_size - len(other_rows)))
+        nb_other_rows = min(len(other_rows), self.sample_size - nb_edge_rows)
+        rows = np.sort(np.concatenate([self._random_state.choice(edge_rows, nb_edge_rows, replace=False),
+                                       self._random_state.choice(other_rows, nb_other_rows, replace=False)]))
+
+        update_max_protein = np.broadcast_to(update_max_protein, (len(elements_state),))
+        all_roots_inputs, all_axes_inputs, all_elements_inputs, contexts = {}, {}, {}, {}
+        for row in rows.tolist():
+            element_id = elements_state.ids[row]
+            axis_id = element_id[:2]
+            all_elements_inputs[element_id] = self._record(elements_state, row)
+            all_axes_inputs.setdefault(axis_id, {})['delta_teq'] = elements_delta_teq[row].item()
+            contexts[element_id] = dict(all_elements_inputs[element_id], delta_teq=elements_delta_teq[row].item(), update_max_protein=bool(update_max_protein[row]),
+                                        forced_green_area=np.nan if forced_green_area is None else forced_green_area[row].item())
+            if axis_id in roots_state.index and axis_id not in all_roots_inputs:
+                roots_row = roots_state.index[axis_id]
+                all_roots_inputs[axis_id] = self._record(roots_state, roots_row)
+                all_axes_inputs[axis_id]['delta_teq_roots'] = roots_delta_teq[roots_row].item()
+                contexts[axis_id] = dict(all_roots_inputs[axis_id], delta_teq_roots=roots_delta_teq[roots_row].item())
+        forced_green_area_rows = [] if forced_green_area is None else rows[~np.isnan(forced_green_area[rows])]
+        return {'t': t, 'inputs': {'roots': all_roots_inputs, 'axes': all_axes_inputs, 'elements': all_elements_inputs}, 'contexts': contexts,
+                'forced_max_protein_elements': set(elements_state.ids[row] for row in rows[~update_max_protein[rows]]),
+                'forced_green_area': [(t,) + elements_state.ids[row] + (forced_green_area[row].item(),) for row in forced_green_area_rows],
+                'opt_full_remob': opt_full_remob, 'postflowering_stages': postflowering_stages}
+
+    @staticmethod
+    def _record(state, row):
+        """The inputs of a row of a state, without the variables unknown to the engine."""
+        return state.RECORD_TYPE((name, array[row].item()) for name, array in state.columns.items() if name in state.present)
+
+    def _differ(self, engine_value, reference_value):
+        if isinstance(engine_value, bool) or isinstance(reference_value, bool):
+            return engine_value != reference_value
+        if np.isnan(engine_value) and np.isnan(reference_value):
+            return False
+        return not abs(engine_value - reference_value) <= self.atol + self.rtol * abs(reference_value)
+
+    def check(self, sample, roots_state, elements_state, rate_mstruct_death, N_content_total):
+        """
+        Compute the step of a sample with the reference simulation, and compare its outputs with the states reached by the engine.
+        The mismatches are kept in :attr:`roots_mismatches` and :attr:`elements_mismatches`.
+
+        :param dict sample: the sample, as returned by :meth:`sample`.
+        :param engine.RootsState roots_state: the state of the roots after the step.
+        :param engine.ElementsState elements_state: the state of the elements after the step.
+        :param numpy.ndarray rate_mstruct_death: the rate of mstruct loss of each roots at the step.
+        :param numpy.ndarray N_content_total: the N content of each element at the step.
+
+        :return: The number of mismatches of the step.
+        :rtype: int
+
+        :raises ValueError: if the engine mismatches the reference and :attr:`strict` is True.
+        """
+        t = sample['t']
+        reference_simulation = simulation.Simulation(outputs_variables=self.outputs_variables)
+        reference_simulation.initialize(sample['inputs'])
+        reference_simulation.plants_parameters = {plant: plant_parameters for plant, plant_parameters in self.plants_parameters.items()
+                                                  if any(element_id[0] == plant for element_id in sample['inputs']['elements'])}
+        if sample['forced_green_area']:
+            reference_simulation.force_green_area(pd.DataFrame(sample['forced_green_area'],
+                                                               columns=[converter.TIME_COLUMN] + converter.ELEMENTS_TOPOLOGY_COLUMNS + ['green_area']))
+        reference_simulation.run(forced_max_protein_elements=sample['forced_max_protein_elements'], opt_full_remob=sample['opt_full_remob'],
+                                 postflowering_stages=sample['postflowering_stages'], t=t)
+        self.nb_checked_steps += 1
+        self.nb_checked_elements += len(sample['inputs']['elements'])
+
+        nb_mismatches = 0
+        for state, extra_name, extra_values, mismatches in ((roots_state, 'rate_mstruct_death', rate_mstruct_death, self.roots_mismatches),
+                                                            (elements_state, 'N_content_total', N_content_total, self.elements_mismatches)):
+            scale = 'roots' if state is roots_state else 'elements'
+            for id_, reference_outputs in sorted(reference_simulation.outputs[scale].items()):
+                row = state.index[id_]
+                reference_values = dict(reference_outputs)
+                if extra_name not in reference_values and (self.outputs_variables is None or extra_name in reference_simulation.computed_variables[scale]):
+                    reference_values[extra_name] = np.nan  # the engine gives NaN when the reference does not compute the variable
+                for name, reference_value in sorted(reference_values.items()):
+                    if name == extra_name:
+                        engine_value = extra_values[row].item()
+                    elif name in state.columns:
+                        engine_value = state.columns[name][row].item()
+                    else:
+                        continue
+                    if self._differ(engine_value, reference_value):
+                        mismatches.append((t, id_, name, engine_value, reference_value, sample['contexts'][id_]))
+                        nb_mismatches += 1
+        if nb_mismatches and self.strict:
+            t_mismatches = [mismatch for mismatch in self.roots_mismatches + self.elements_mismatches if mismatch[0] == t]
+            raise ValueError('The engine mismatches the reference at t={}: {}'.format(
+                t, '; '.join('{} {}: engine {!r}, reference {!r}, inputs {!r}'.format(id_, name, engine_value, reference_value, context)
+                             for _, id_, name, engine_value, reference_value, context in t_mismatches)))
+        return nb_mismatches
+
+    def empty_copy(self):
+        """
+        Return a verifier with the same settings and count of steps, but without mismatches and with its own random generator. See :meth:`merge`.
+
+        :return: The new verifier.
+        :rtype: ReferenceVerifier
+        """
+        reference_verifier = ReferenceVerifier(self.sample_size, self.rtol, self.atol, self.sampling, self._random_state.randint(2 ** 31), self.strict)
+        reference_verifier.configure(self.plants_parameters, self.outputs_variables)
+        reference_verifier.nb_steps = self.nb_steps
+        reference_verifier.nb_checked_steps = self.nb_checked_steps
+        return reference_verifier
+
+    def merge(self, other):
+        """
+        Append the mismatches found by another verifier, for example the verifier of a worker process, and take its count of steps.
+
+        :param ReferenceVerifier other: the other verifier, as returned by :meth:`empty_copy`.
+        """
+        self.nb_steps = other.nb_steps
+        self.nb_checked_steps = other.nb_checked_steps
+        self.nb_checked_elements += other.nb_checked_elements
+        self.roots_mismatches.extend(other.roots_mismatches)
+        self.elements_mismatches.extend(other.elements_mismatches)
+
+    def to_dataframes(self):
+        """
+        Convert the mismatches to dataframes, sorted by time and id.
+
+        :return: One dataframe for the mismatches of the roots, one dataframe for the mismatches of the elements,
+                 with the columns :attr:`converter.TIME_COLUMN`, the topology columns and :attr:`MISMATCHES_COLUMNS`.
+                 The context of a mismatch is the dictionary of the inputs and the forcings of the roots or element.
+        :rtype: (pandas.DataFrame, pandas.DataFrame)
+        """
+        dataframes = []
+        for mismatches, topology_columns in ((self.roots_mismatches, converter.ROOTS_TOPOLOGY_COLUMNS), (self.elements_mismatches, converter.ELEMENTS_TOPOLOGY_COLUMNS)):
+            mismatches_df = pd.DataFrame([(t,) + tuple(id_) + (name, engine_value, reference_value, context)
+                                          for t, id_, name, engine_value, reference_value, context in mismatches],
+                                         columns=[converter.TIME_COLUMN] + topology_columns + MISMATCHES_COLUMNS)
+            mismatches_df.sort_values([converter.TIME_COLUMN] + topology_columns + ['variable'], inplace=True, kind='stable')
+            mismatches_df.reset_index(drop=True, inplace=True)
+            dataframes.append(mismatches_df)
+        return tuple(dataframes)
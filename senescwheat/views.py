@@ -0,0 +1,230 @@
+# -*- coding: latin-1 -*-
+
+from collections.abc import ItemsView, Mapping, ValuesView
+
+import numpy as np
+import pandas as pd
+
+"""
+    senescwheat.views
+    ~~~~~~~~~~~~~~~~~
+
+    The module :mod:`senescwheat.views` defines the lazy views on the outputs of the :mod:`engine <senescwheat.engine>`.
+
+    An :class:`OutputsView` is a read-only mapping of the outputs by id, like the dictionaries of :attr:`simulation.Simulation.outputs`,
+    but the outputs stay in the columns of the state reached by the engine: the record of a roots or an element is only built when it is accessed.
+    :meth:`OutputsView.column` reads a variable of all the roots or elements at once, without building any record.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+class _OutputsItemsView(ItemsView):
+    """The items of an :class:`OutputsView`, built column by column when iterated."""
+
+    def __iter__(self):
+        return zip(self._mapping.ids, self._mapping._iter_records())
+
+
+class _OutputsValuesView(ValuesView):
+    """The records of an :class:`OutputsView`, built column by column when iterated."""
+
+    def __iter__(self):
+        return self._mapping._iter_records()
+
+
+class OutputsView(Mapping):
+    """Read-only mapping of the outputs of some roots or elements by id, over the columns of a state of the engine.
+
+    The values of the state are copied when the view is created: the view is not changed by the next steps of the engine.
+    The records built by the view are new records at each access, so updating them does not update the view.
+    """
+
+    def __init__(self, state, rows=None, extra_columns=None, optional_columns=None, variables=None, member=None):
+        """
+        :param engine.State state: the state of the roots or of the elements.
+        :param list rows: the rows of the state in the view. All the rows by default.
+        :param dict extra_columns: other outputs, by variable name, with one value by row of the state.
+        :param dict optional_columns: other outputs, by variable name, with one value by row of the state, NaN for the rows which do not have this output.
+        :param set variables: the names of the variables in the view, or None for all the variables.
+        :param int member: the member of the ensemble to view. Must be given if the state has an ensemble dimension.
+        """
+        rows = np.arange(len(state.ids)) if rows is None else np.asarray(rows, dtype=int)
+        #: the ids of the roots or elements, in the order of the view
+        self.ids = [state.ids[row] for row in rows]
+        #: the type of the records built by the view
+        self.record_type = state.RECORD_TYPE
+        #: the topology columns of the ids
+        self.topology_columns = state.TOPOLOGY_COLUMNS
+        self._positions = None
+
+        def is_viewed(name):
+            return variables is None or name in variables
+
+        self._columns = {name: (array if member is None else array[member])[rows] for name, array in state.columns.items() if name in state.present and is_viewed(name)}
+        self._columns.update({name: np.asarray(values)[rows] for name, values in (extra_columns or {}).items() if is_viewed(name)})
+        self._optional_columns = {name: np.asarray(values)[rows] for name, values in (optional_columns or {}).items() if is_viewed(name)}
+        self._extra = {name: [values[row] for row in rows] for name, values in state.extra.items() if is_viewed(name)}
+
+    def _position(self, id_):
+        if self._positions is None:
+            self._positions = {viewed_id: position for position, viewed_id in enumerate(self.ids)}
+        return self._positions[id_]
+
+    def _record(self, position):
+        record = self.record_type()
+        for name, values in self._columns.items():
+            record[name] = values[position].item()
+        for name, values in self._extra.items():
+            record[name] = values[position]
+        for name, values in self._optional_columns.items():
+            value = values[position]
+            if not np.isnan(value):
+                record[name] = value.item()
+        return record
+
+    def _iter_records(self):
+        """Build the records of all the ids, reading each column once."""
+        columns = [(name, values.tolist()) for name, values in self._columns.items()] + [(name, values) for name, values in self._extra.items()]
+        optional_columns = [(name, values.tolist()) for name, values in self._optional_columns.items()]
+        for position in range(len(self.ids)):
+            record = self.record_type()
+            for name, values in columns:
+                record[name] = values[position]
+            for name, values in optional_columns:
+                value = values[position]
+                if value == value:  # not NaN
+                    record[name] = value
+            yield record
+
+    def __getitem__(self, id_):
+        return self._record(self._position(id_))
+
+    def __contains__(self, id_):
+        try:
+            self._position(id_)
+        except (KeyError, TypeError):
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def items(self):
+        return _OutputsItemsView(self)
+
+    def values(self):
+        return _OutputsValuesView(self)
+
+    def __repr__(self):
+        return '{}({} {})'.format(self.__class__.__name__, len(self.ids), self.record_type.__name__)
+
+    @property
+    def variables(self):
+        """The names of the variables of the view."""
+        return set(self._columns).union(self._optional_columns, self._extra)
+
+    @property
+    def optional_variables(self):
+        """The names of the variables which some records may not have: :meth:`column` gives NaN for these records."""
+        return set(self._optional_columns).difference(self._extra)
+
+    def column(self, name):
+        """
+        Read a variable of all the roots or elements of the view.
+
+        :param str name: the name of the variable.
+
+        :return: The values of the variable, in the order of :attr:`ids`. The value is NaN for the rows which do not have this variable.
+        :rtype: numpy.ndarray
+
+        :raises KeyError: if the variable is not in the view.
+        """
+        if name in self._columns:
+            return self._columns[name].copy()
+        if name in self._optional_columns:
+            return self._optional_column(name)
+        if name in self._extra:
+            return np.asarray(self._extra[name])
+        raise KeyError(name)
+
+    def _optional_column(self, name):
+        """The values of an optional column, completed by the values of the state for the rows which do not have this output."""
+        values = self._optional_columns[name]
+        if name in self._extra:
+            values = np.where(np.isnan(values), np.array(self._extra[name], dtype=float), values)
+        else:
+            values = values.copy()
+        return values
+
+    def update_records(self, all_records):
+        """
+        Update some records with the values of the view, column by column, without building the records of the view.
+        The records are replaced by updated copies, not updated in place.
+
+        :param dict all_records: the records by id, for example :attr:`simulation.Simulation.inputs['elements'] <simulation.Simulation.inputs>`.
+                                 Must have all the ids of the view.
+        """
+        new_records = [all_records[id_].copy() for id_ in self.ids]
+        # the variables stored in slots are set directly, if all the records are of the type of the records of the view
+        slots = set()
+        if all(type(record) is self.record_type for record in new_records):
+            slots.update(getattr(self.record_type, 'KEYS', ()))
+        for name, values in self._columns.items():
+            if name in slots:
+                for record, value in zip(new_records, values.tolist()):
+                    setattr(record, name, value)
+            else:
+                for record, value in zip(new_records, values.tolist()):
+                    record[name] = value
+        for name, values in self._optional_columns.items():
+            for position in np.flatnonzero(~np.isnan(values)).tolist():
+                new_records[position][name] = values[position].item()
+        all_records.update(zip(self.ids, new_records))
+
+    def drop(self, ids):
+        """
+        Return a view without some ids.
+
+        :param list ids: the ids to remove. The ids not in the view are ignored.
+
+        :return: The new view.
+        :rtype: OutputsView
+        """
+        dropped_ids = set(ids)
+        kept_positions = np.array([position for position, id_ in enumerate(self.ids) if id_ not in dropped_ids], dtype=int)
+        new_view = self.__class__.__new__(self.__class__)
+        new_view.__dict__.update(self.__dict__)
+        new_view.ids = [self.ids[position] for position in kept_positions]
+        new_view._positions = None
+        new_view._columns = {name: values[kept_positions] for name, values in self._columns.items()}
+        new_view._optional_columns = {name: values[kept_positions] for name, values in self._optional_columns.items()}
+        new_view._extra = {name: [values[position] for position in kept_positions] for name, values in self._extra.items()}
+        return new_view
+
+    def to_dataframe(self):
+        """
+        Convert the view to a dataframe, with the layout of the dataframes of :func:`converter.to_dataframes`.
+
+        :return: The outputs, with one line by id.
+        :rtype: pandas.DataFrame
+        """
+        data = dict(self._columns)
+        data.update(self._extra)
+        for name in self._optional_columns:
+            values = self._optional_column(name)
+            if name in self._extra or not np.isnan(values).all():
+                data[name] = values
+        dataframe = pd.DataFrame(self.ids, columns=self.topology_columns)
+        names = getattr(self.record_type, 'KEYS', sorted(data))
+        for name in names:
+            if name in data:
+                dataframe[name] = data[name]
+        dataframe.sort_values(by=self.topology_columns, inplace=True)
+        dataframe.reset_index(drop=True, inplace=True)
+        return dataframe
@@ -24,8 +24,8 @@ Notes:
 
 ez_setup.use_setuptools()
 
-if sys.version_info < (2, 7):
-    print('ERROR: Senesc-Wheat requires at least Python 2.7 to run.')
+if sys.version_info < (3, 8):
+    print('ERROR: Senesc-Wheat requires at least Python 3.8 to run.')
     sys.exit(1)
 
 setup(
@@ -33,9 +33,12 @@ setup(
     version=senescwheat.__version__,
     packages=find_packages(),
 
-    install_requires=['pandas>=0.18.0'],
+    python_requires='>=3.8',
+    install_requires=['numpy>=1.17.0', 'pandas>=0.18.0'],
     include_package_data=True,
 
+    entry_points={'console_scripts': ['senescwheat = senescwheat.cli:main']},
+
     # metadata for upload to PyPI
     author="M.Gauthier, C.Chambon, R.Barillot",
     author_email="camille.chambon@inra.fr, romain.barillot@inra.fr",
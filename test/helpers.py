@@ -0,0 +1,79 @@
+# -*- coding: latin-1 -*-
+import copy
+import os
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import simulation, converter
+
+"""
+    helpers
+    ~~~~~~~
+
+    The helpers shared by the tests of Senesc-Wheat: the test inputs and the reference simulation.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+# inputs directory path
+INPUTS_DIRPATH = 'inputs'
+
+# the file names of the inputs
+ROOTS_INPUTS_FILENAME = 'roots_inputs.csv'
+ELEMENTS_INPUTS_FILENAME = 'elements_inputs.csv'
+AXES_INPUTS_FILENAME = 'axes_inputs.csv'
+
+
+def read_senescing_inputs(nb_plants=1):
+    """Read the test inputs, turn the element into several senescing elements of different ranks and organs, and replicate the plant."""
+    roots_inputs_df = pd.read_csv(os.path.join(INPUTS_DIRPATH, ROOTS_INPUTS_FILENAME))
+    axes_inputs_df = pd.read_csv(os.path.join(INPUTS_DIRPATH, AXES_INPUTS_FILENAME))
+    elements_inputs_df = pd.read_csv(os.path.join(INPUTS_DIRPATH, ELEMENTS_INPUTS_FILENAME))
+    elements_inputs_df['is_growing'] = False
+    elements_inputs_df['senesced_length_element'] = 0.
+    elements_inputs_df['age'] = 500.
+    senescing_elements_inputs = []
+    for metamer, organ, element, proteins, max_proteins in ((5, 'blade', 'LeafElement1', 85, 85),
+                                                            (8, 'blade', 'LeafElement1', 20, 85),
+                                                            (8, 'sheath', 'StemElement', 20, 85),
+                                                            (9, 'internode', 'StemElement', 85, 0),
+                                                            (10, 'blade', 'LeafElement1', 100, 85)):
+        element_inputs_df = elements_inputs_df.copy()
+        element_inputs_df[['metamer', 'organ', 'element', 'proteins', 'max_proteins']] = [[metamer, organ, element, proteins, max_proteins]]
+        senescing_elements_inputs.append(element_inputs_df)
+    elements_inputs_df = pd.concat(senescing_elements_inputs, ignore_index=True)
+    all_inputs_df = []
+    for inputs_df in (roots_inputs_df, axes_inputs_df, elements_inputs_df):
+        plants_inputs_df = []
+        for plant in range(1, nb_plants + 1):
+            plant_inputs_df = inputs_df.copy()
+            plant_inputs_df['plant'] = plant
+            # make the plants different
+            for column in ('proteins', 'delta_teq'):
+                if column in plant_inputs_df:
+                    plant_inputs_df[column] *= 1 + 0.1 * (plant - 1)
+            plants_inputs_df.append(plant_inputs_df)
+        all_inputs_df.append(pd.concat(plants_inputs_df, ignore_index=True))
+    return converter.from_dataframes(*all_inputs_df)
+
+
+def run_reference(inputs, nb_steps, **run_kwargs):
+    """Run the reference simulation, using the outputs of each step as inputs of the next step."""
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(inputs))
+    for _ in range(nb_steps):
+        simulation_.run(**run_kwargs)
+        simulation_.apply_outputs()
+    return simulation_.inputs
+
+
+def assert_outputs_equal(actual_outputs, desired_outputs):
+    """Check that the outputs computed by the engine, which hold all the variables, match the outputs of the reference simulation."""
+    for outputs_type in ('roots', 'elements'):
+        assert set(actual_outputs[outputs_type]) == set(desired_outputs[outputs_type])
+        for outputs_id, desired_data in desired_outputs[outputs_type].items():
+            for name, desired_value in desired_data.items():
+                np.testing.assert_equal(actual_outputs[outputs_type][outputs_id][name], desired_value)
@@ -0,0 +1,48 @@
+# -*- coding: latin-1 -*-
+import copy
+
+import numpy as np
+
+from senescwheat import simulation, converter
+
+from helpers import read_senescing_inputs, run_reference
+
+"""
+    test_aggregations
+    ~~~~~~~~~~~~~~~~~
+
+    Test the runs of several steps with the engine, and the aggregations of the elements by axis.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_run_steps():
+    inputs = read_senescing_inputs()
+    desired_inputs = run_reference(inputs, 50)
+    simulation_ = simulation.Simulation(delta_t=3600, aggregations=simulation.DEFAULT_AGGREGATIONS)
+    simulation_.initialize(copy.deepcopy(inputs))
+    aggregates_df = simulation_.run_steps(50)
+    for inputs_type in ('roots', 'elements'):
+        for inputs_id, desired_data in desired_inputs[inputs_type].items():
+            for name in converter.SENESCWHEAT_ELEMENTS_OUTPUTS:
+                if name in desired_data and name != 'N_content_total':
+                    np.testing.assert_equal(simulation_.inputs[inputs_type][inputs_id][name], desired_data[name])
+    # the aggregates of the last step are the ones of the final state
+    _, _, elements_df = converter.to_dataframes(simulation_.inputs)
+    desired_aggregates_df = elements_df.groupby(converter.AXES_TOPOLOGY_COLUMNS).agg({'green_area': 'sum', 'Nresidual': 'sum', 'is_over': 'sum'})
+    actual_aggregates_df = aggregates_df[aggregates_df[converter.TIME_COLUMN] == 49].set_index(converter.AXES_TOPOLOGY_COLUMNS)
+    assert len(aggregates_df) == 50
+    np.testing.assert_allclose(actual_aggregates_df[['green_area', 'Nresidual', 'nb_elements_over']].values, desired_aggregates_df.values)
+    # the aggregates are stamped with the times of the steps
+    aggregates_df = simulation_.run_steps(3, t=50)
+    assert list(aggregates_df[converter.TIME_COLUMN]) == [50, 51, 52]
+
+
+if __name__ == '__main__':
+    test_run_steps()
@@ -0,0 +1,79 @@
+# -*- coding: latin-1 -*-
+import copy
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from senescwheat import archive, cli, converter, simulation
+
+from test_cli import write_inputs
+from helpers import read_senescing_inputs
+
+"""
+    test_archive
+    ~~~~~~~~~~~~
+
+    Test the archive of the outputs of the steps of a run.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def run_outputs(nb_steps):
+    """Run Senesc-Wheat and return the outputs of the elements at each step."""
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(read_senescing_inputs(nb_plants=3)))
+    elements_outputs_dfs = []
+    for step_outputs in simulation_.iter_run([{}] * nb_steps):
+        _, elements_outputs_df = step_outputs.to_dataframes()
+        elements_outputs_df.insert(0, converter.TIME_COLUMN, step_outputs.step)
+        elements_outputs_dfs.append(elements_outputs_df)
+    return pd.concat(elements_outputs_dfs, ignore_index=True)
+
+
+def test_archive():
+    elements_outputs_df = run_outputs(25)
+    working_dirpath = tempfile.mkdtemp()
+    try:
+        archive_filepath = os.path.join(working_dirpath, 'elements_outputs.archive')
+        with archive.ArchiveWriter(archive_filepath, converter.ELEMENTS_TOPOLOGY_COLUMNS, chunk_steps=10) as archive_writer:
+            for _, step_df in elements_outputs_df.groupby(converter.TIME_COLUMN):
+                # an element which appears later
+                if step_df[converter.TIME_COLUMN].iloc[0] < 12:
+                    step_df = step_df[step_df['plant'] != 3]
+                archive_writer.write(step_df)
+        elements_outputs_df = elements_outputs_df[(elements_outputs_df[converter.TIME_COLUMN] >= 12) | (elements_outputs_df['plant'] != 3)].reset_index(drop=True)
+
+        elements_archive = archive.Archive(archive_filepath)
+        assert elements_archive.times == list(range(25))
+        pd.testing.assert_frame_equal(elements_archive.read(), elements_outputs_df)
+
+        # a slice only decompresses the blocks of its chunks and variables
+        elements_archive.nb_blocks_read = 0
+        ids = [(1, 'MS', 8, 'blade', 'LeafElement1'), (3, 'MS', 5, 'blade', 'LeafElement1')]
+        slice_df = elements_archive.read(variables=['proteins', 'green_area'], ids=ids, start=5, stop=15)
+        assert elements_archive.nb_blocks_read == 2 * 3
+        desired_slice_df = elements_outputs_df[elements_outputs_df[converter.TIME_COLUMN].between(5, 14) &
+                                               pd.Series(list(elements_outputs_df[converter.ELEMENTS_TOPOLOGY_COLUMNS].itertuples(index=False, name=None))).isin(ids)]
+        desired_slice_df = desired_slice_df[[converter.TIME_COLUMN] + converter.ELEMENTS_TOPOLOGY_COLUMNS + ['green_area', 'proteins']].reset_index(drop=True)
+        pd.testing.assert_frame_equal(slice_df, desired_slice_df)
+
+        # the command line interface writes archives
+        write_inputs(read_senescing_inputs(nb_plants=2), working_dirpath)
+        outputs_dirpath = os.path.join(working_dirpath, 'outputs')
+        assert cli.main([working_dirpath, '--steps', '5', '--outputs', outputs_dirpath, '--format', 'archive']) == 0
+        roots_archive = archive.Archive(os.path.join(outputs_dirpath, cli.ROOTS_OUTPUTS_FILENAME + '.archive'))
+        assert len(roots_archive.read(variables=['mstruct'], start=3)) == 2 * 2
+    finally:
+        shutil.rmtree(working_dirpath)
+
+
+if __name__ == '__main__':
+    test_archive()
@@ -0,0 +1,68 @@
+# -*- coding: latin-1 -*-
+import copy
+
+from senescwheat import balance, engine, simulation
+
+from helpers import read_senescing_inputs
+
+"""
+    test_balance
+    ~~~~~~~~~~~~
+
+    Test the checks of the mass balances of the steps.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def make_simulation(inputs, balance_checker):
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(inputs))
+    simulation_.balance_checker = balance_checker
+    return simulation_
+
+
+def test_balance_checker():
+    inputs = read_senescing_inputs(nb_plants=3)
+
+    # the steps conserve the balances, whatever the way they are run
+    simulation_ = make_simulation(inputs, balance.BalanceChecker())
+    simulation_.run_steps(30)
+    for t in range(30, 40):
+        simulation_.run(t=t)
+        simulation_.apply_outputs()
+    for _ in simulation_.iter_run([{}] * 10, t=40):
+        pass
+    assert simulation_.balance_checker.nb_checked_steps == 50
+    assert simulation_.balance_checker.elements_violations == simulation_.balance_checker.axes_violations == []
+
+    # one step out of 4, in worker processes
+    simulation_ = make_simulation(inputs, balance.BalanceChecker(sampling=4))
+    simulation_.run_steps(30, nb_workers=2)
+    assert (simulation_.balance_checker.nb_steps, simulation_.balance_checker.nb_checked_steps) == (30, 8)
+
+    # a step which creates proteins
+    balance_checker = balance.BalanceChecker()
+    elements_state = engine.ElementsState.from_dict(inputs['elements'])
+    pools_before = balance_checker.pools(elements_state)
+    element_id = (2, 'MS', 8, 'blade', 'LeafElement1')
+    elements_state.columns['proteins'][elements_state.index[element_id]] += 1
+    assert balance_checker.check(7, elements_state, pools_before) == 2
+    axes_violations_df, elements_violations_df = balance_checker.to_dataframes()
+    assert list(elements_violations_df.iloc[0][['t', 'plant', 'axis', 'metamer', 'organ', 'element', 'balance']]) == [7] + list(element_id) + ['nitrogen']
+    assert list(axes_violations_df.iloc[0][['plant', 'axis', 'balance']]) == [2, 'MS', 'nitrogen']
+    try:
+        balance.BalanceChecker(strict=True).check(7, elements_state, pools_before)
+    except ValueError as error:
+        assert str(element_id) in str(error)
+    else:
+        assert False
+
+
+if __name__ == '__main__':
+    test_balance_checker()
@@ -0,0 +1,116 @@
+# -*- coding: latin-1 -*-
+import copy
+import numbers
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from senescwheat import balance, cache, parameters, simulation
+
+from helpers import read_senescing_inputs
+
+"""
+    test_cache
+    ~~~~~~~~~~
+
+    Test the cache of the results of simulations.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def make_simulation(inputs):
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(inputs))
+    return simulation_
+
+
+def test_result_cache():
+    inputs = read_senescing_inputs(nb_plants=2)
+    cache_dirpath = tempfile.mkdtemp()
+    try:
+        result_cache = cache.ResultCache(cache_dirpath)
+        desired_simulation = make_simulation(inputs)
+        assert not result_cache.run(desired_simulation)
+        simulation_ = make_simulation(inputs)
+        assert result_cache.run(simulation_)
+        assert simulation_.outputs == desired_simulation.outputs
+
+        # the key depends on the flags of the run, the parameters and the inputs
+        assert not result_cache.run(make_simulation(inputs), postflowering_stages=True)
+        assert not result_cache.run(make_simulation(inputs), forced_max_protein_elements={(1, 'MS', 10, 'blade', 'LeafElement1')})
+        age_effect_senescence = parameters.AGE_EFFECT_SENESCENCE
+        try:
+            parameters.AGE_EFFECT_SENESCENCE = 600
+            assert not result_cache.run(make_simulation(inputs))
+        finally:
+            parameters.AGE_EFFECT_SENESCENCE = age_effect_senescence
+        simulation_ = make_simulation(inputs)
+        simulation_.inputs['elements'][(1, 'MS', 8, 'blade', 'LeafElement1')]['proteins'] += 1
+        assert not result_cache.run(simulation_)
+        assert result_cache.statistics == {'hits': 1, 'misses': 5}
+
+        # several steps, the performance arguments not being part of the key
+        desired_simulation = make_simulation(inputs)
+        desired_simulation.aggregations = simulation.DEFAULT_AGGREGATIONS
+        desired_aggregates_df = result_cache.run_steps(desired_simulation, 10)
+        simulation_ = make_simulation(inputs)
+        simulation_.aggregations = simulation.DEFAULT_AGGREGATIONS
+        assert result_cache.run_steps(simulation_, 10, nb_threads=2).equals(desired_aggregates_df)
+        assert simulation_.inputs == desired_simulation.inputs
+        assert result_cache.statistics == {'hits': 2, 'misses': 6}
+
+        # the key does not depend on the types of the numbers: numpy or Python numbers, integers or floats
+        numbers_inputs = copy.deepcopy(inputs)
+        for inputs_type in ('roots', 'elements'):
+            for inputs_dict in numbers_inputs[inputs_type].values():
+                for name, value in inputs_dict.items():
+                    if isinstance(value, numbers.Real) and not isinstance(value, bool):
+                        inputs_dict[name] = np.float64(value)
+        assert result_cache.key(make_simulation(numbers_inputs), 'run_steps', {'nb_steps': 10}) == result_cache.key(make_simulation(inputs), 'run_steps', {'nb_steps': 10})
+
+        # nor on the arguments given with their default values
+        simulation_ = make_simulation(inputs)
+        assert result_cache.key(simulation_, 'run', {}) == result_cache.key(simulation_, 'run', {'postflowering_stages': False})
+        assert result_cache.key(simulation_, 'run_steps', {'nb_steps': 1}) == result_cache.key(simulation_, 'run_steps', {'nb_steps': 1, 'dtype': float})
+        assert result_cache.key(simulation_, 'run_steps', {'nb_steps': 1}) != result_cache.key(simulation_, 'run_steps', {'nb_steps': 1, 'dtype': np.float32})
+
+        # the runs of the simulations with a checker of the steps are not cached
+        for _ in range(2):
+            simulation_ = make_simulation(inputs)
+            simulation_.balance_checker = balance.BalanceChecker()
+            result_cache.run_steps(simulation_, 10)
+            assert simulation_.balance_checker.nb_steps == 10
+        assert result_cache.statistics == {'hits': 2, 'misses': 6}
+
+        # the least recently used results are evicted
+        result_cache.evict()
+        assert result_cache.size == 0
+        simulations = [make_simulation(inputs) for _ in range(3)]
+        result_cache.run_steps(simulations[0], 1)
+        result_size = result_cache.size
+        result_cache.max_size = 2 * result_size
+        time.sleep(0.01)
+        result_cache.run_steps(simulations[1], 2)
+        time.sleep(0.01)
+        assert result_cache.run_steps(make_simulation(inputs), 1) is None
+        time.sleep(0.01)
+        result_cache.run_steps(simulations[2], 3)
+        assert result_cache.size <= result_cache.max_size
+        nb_misses = result_cache.statistics['misses']
+        result_cache.run_steps(make_simulation(inputs), 1)
+        result_cache.run_steps(make_simulation(inputs), 2)
+        assert result_cache.statistics['misses'] == nb_misses + 1
+    finally:
+        shutil.rmtree(cache_dirpath)
+
+
+if __name__ == '__main__':
+    test_result_cache()
@@ -0,0 +1,52 @@
+# -*- coding: latin-1 -*-
+import numpy as np
+import pandas as pd
+
+from senescwheat import calibration, converter, engine
+
+from helpers import read_senescing_inputs
+
+"""
+    test_calibration
+    ~~~~~~~~~~~~~~~~
+
+    Test the calibration of the parameters of Senesc-Wheat.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+DESIRED_PARAMETERS = {'SENESCENCE_LENGTH_MAX_RATE': 2.5E-7}
+
+
+def make_observations(inputs, nb_steps):
+    """Run the engine with the desired parameters and keep the green area at each step."""
+    observations = []
+
+    def observe(step, roots_state, elements_state):
+        elements_df = converter.to_dataframes({'roots': {}, 'axes': {}, 'elements': elements_state.to_dict(0)})[2]
+        elements_df.insert(0, converter.TIME_COLUMN, step)
+        observations.append(elements_df[[converter.TIME_COLUMN] + converter.ELEMENTS_TOPOLOGY_COLUMNS + ['green_area']])
+
+    engine.run_ensemble(inputs, {name: [value] for name, value in DESIRED_PARAMETERS.items()}, nb_steps, callback=observe)
+    return pd.concat(observations, ignore_index=True)
+
+
+def test_calibration():
+    inputs = read_senescing_inputs()
+    calibration_ = calibration.Calibration(inputs, make_observations(inputs, 24), {'SENESCENCE_LENGTH_MAX_RATE': (1E-7, 5E-7)})
+    best_parameters, best_cost = calibration_.run(population_size=10, nb_generations=30, seed=0)
+    np.testing.assert_allclose(best_parameters['SENESCENCE_LENGTH_MAX_RATE'], DESIRED_PARAMETERS['SENESCENCE_LENGTH_MAX_RATE'], rtol=1E-2)
+    assert calibration_.statistics['abandoned'] > 0
+    # a second evaluation of the best candidate is found in the cache
+    cache_hits = calibration_.statistics['cache_hits']
+    calibration_.evaluate(np.array([list(best_parameters.values())]))
+    assert calibration_.statistics['cache_hits'] == cache_hits + 1
+
+
+if __name__ == '__main__':
+    test_calibration()
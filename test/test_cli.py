@@ -0,0 +1,90 @@
+# -*- coding: latin-1 -*-
+import copy
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import cli, converter, parameters, simulation
+
+from helpers import read_senescing_inputs
+
+"""
+    test_cli
+    ~~~~~~~~
+
+    Test the command line interface of Senesc-Wheat.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def write_inputs(inputs, inputs_dirpath):
+    """Write the inputs in the layout of an inputs directory."""
+    for inputs_df, inputs_filename in zip(converter.to_dataframes(inputs), (cli.ROOTS_INPUTS_FILENAME, cli.AXES_INPUTS_FILENAME, cli.ELEMENTS_INPUTS_FILENAME)):
+        inputs_df.to_csv(os.path.join(inputs_dirpath, inputs_filename), index=False)
+
+
+def test_parse_parameters():
+    update_parameters = cli.parse_parameters(['AGE_EFFECT_SENESCENCE=400', 'FRACTION_N_MAX.blade=0.45', 'RATIO_N_MSTRUCT.5=0.02'])
+    assert update_parameters['AGE_EFFECT_SENESCENCE'] == 400
+    assert update_parameters['FRACTION_N_MAX'] == dict(parameters.FRACTION_N_MAX, blade=0.45)
+    assert update_parameters['RATIO_N_MSTRUCT'][5] == 0.02
+    assert parameters.RATIO_N_MSTRUCT[5] == 0.0175
+    for assignment in ('UNKNOWN=1', 'AGE_EFFECT_SENESCENCE', 'MIN_GREEN_AREA.blade=1'):
+        try:
+            cli.parse_parameters([assignment])
+        except ValueError:
+            pass
+        else:
+            assert False, assignment
+
+
+def test_main():
+    inputs = read_senescing_inputs(nb_plants=2)
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(inputs))
+    simulation_.run_steps(10)
+    _, _, desired_elements_df = converter.to_dataframes(dict(simulation_.outputs, axes={}))
+
+    working_dirpath = tempfile.mkdtemp()
+    try:
+        write_inputs(inputs, working_dirpath)
+        outputs_dirpath = os.path.join(working_dirpath, 'outputs')
+        assert cli.main([working_dirpath, '--steps', '10', '--outputs', outputs_dirpath, '--variables', 'green_area,proteins']) == 0
+        elements_outputs_df = pd.read_csv(os.path.join(outputs_dirpath, cli.ELEMENTS_OUTPUTS_FILENAME + '.csv'))
+        assert list(elements_outputs_df.columns) == [converter.TIME_COLUMN] + converter.ELEMENTS_TOPOLOGY_COLUMNS + ['green_area', 'proteins']
+        assert list(elements_outputs_df[converter.TIME_COLUMN].unique()) == list(range(10))
+        last_step_df = elements_outputs_df[elements_outputs_df[converter.TIME_COLUMN] == 9]
+        np.testing.assert_allclose(last_step_df[['green_area', 'proteins']].values, desired_elements_df[['green_area', 'proteins']].values)
+
+        # the variables written must be outputs
+        try:
+            cli.main([working_dirpath, '--steps', '1', '--outputs', outputs_dirpath, '--variables', 'length'])
+        except SystemExit:
+            pass
+        else:
+            assert False, 'length is not an output'
+
+        # the forcings give the number of steps
+        forcings_df = pd.DataFrame([(t, plant, 'MS', 3600.) for t in range(4) for plant in (1, 2)],
+                                   columns=[converter.TIME_COLUMN] + converter.AXES_TOPOLOGY_COLUMNS + ['delta_teq'])
+        forcings_filepath = os.path.join(working_dirpath, 'forcings.csv')
+        forcings_df.to_csv(forcings_filepath, index=False)
+        assert cli.main([working_dirpath, '--forcings', forcings_filepath, '--outputs', outputs_dirpath, '--format', 'pickle']) == 0
+        roots_outputs_df = pd.read_pickle(os.path.join(outputs_dirpath, cli.ROOTS_OUTPUTS_FILENAME + '.pickle'))
+        assert len(roots_outputs_df) == 4 * 2
+    finally:
+        shutil.rmtree(working_dirpath)
+
+
+if __name__ == '__main__':
+    test_parse_parameters()
+    test_main()
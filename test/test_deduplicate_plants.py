@@ -0,0 +1,58 @@
+# -*- coding: latin-1 -*-
+import copy
+
+import pandas as pd
+
+from senescwheat import simulation
+
+from helpers import read_senescing_inputs
+
+"""
+    test_deduplicate_plants
+    ~~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the deduplication of the identical plants of a canopy.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_deduplicate_plants():
+    inputs = read_senescing_inputs(nb_plants=2)
+    # plants 1 to 4 are replicates of the plant 1, the plant 5 is the plant 2
+    replicated_inputs = {}
+    for inputs_type, all_inputs in inputs.items():
+        replicated_inputs[inputs_type] = {}
+        for inputs_id, inputs_dict in all_inputs.items():
+            for plant in ((1, 2, 3, 4) if inputs_id[0] == 1 else (5,)):
+                replicated_inputs[inputs_type][(plant,) + inputs_id[1:]] = copy.deepcopy(inputs_dict)
+
+    simulations = [simulation.Simulation(delta_t=3600, record_events=True, deduplicate_plants=deduplicate_plants) for deduplicate_plants in (False, True)]
+    for simulation_ in simulations:
+        simulation_.initialize(copy.deepcopy(replicated_inputs))
+    for t in range(50):
+        if t == 10:
+            # a coupled model perturbs the plant 3, which is not a replica anymore
+            for simulation_ in simulations:
+                proteins = simulation_.inputs['elements'][(3, 'MS', 8, 'blade', 'LeafElement1')]['proteins']
+                simulation_.update_inputs({'elements': {(3, 'MS', 8, 'blade', 'LeafElement1'): {'proteins': proteins * 0.5}}})
+        for simulation_ in simulations:
+            simulation_.run(t=t)
+            simulation_.apply_outputs()
+        assert simulations[1].plants_replicas == ({1: [2, 3, 4]} if t < 10 else {1: [2, 4]})
+        assert simulations[1].outputs == simulations[0].outputs
+    assert simulations[1].inputs == simulations[0].inputs
+    pd.testing.assert_frame_equal(simulations[1].event_log.to_dataframe(), simulations[0].event_log.to_dataframe())
+    assert simulations[0].plants_replicas == {}
+    # the engine does not deduplicate the plants
+    simulations[1].run_steps(1, t=50)
+    assert simulations[1].plants_replicas == {}
+
+
+if __name__ == '__main__':
+    test_deduplicate_plants()
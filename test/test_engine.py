@@ -0,0 +1,37 @@
+# -*- coding: latin-1 -*-
+import numpy as np
+
+from senescwheat import engine
+
+from helpers import read_senescing_inputs, run_reference
+
+"""
+    test_engine
+    ~~~~~~~~~~~
+
+    Test the vectorized engine of Senesc-Wheat against the reference simulation.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_run_ensemble():
+    inputs = read_senescing_inputs()
+    for postflowering_stages in (False, True):
+        desired_inputs = run_reference(inputs, 50, postflowering_stages=postflowering_stages)
+        roots_state, elements_state = engine.run_ensemble(inputs, {'AGE_EFFECT_SENESCENCE': [450, 450]}, 50, postflowering_stages=postflowering_stages)
+        for (state, desired_dict) in ((roots_state, desired_inputs['roots']), (elements_state, desired_inputs['elements'])):
+            for member in range(2):
+                actual_dict = state.to_dict(member)
+                for data_id, desired_data in desired_dict.items():
+                    for name in state.VARIABLES:
+                        np.testing.assert_equal(actual_dict[data_id][name], desired_data[name])
+
+
+if __name__ == '__main__':
+    test_run_ensemble()
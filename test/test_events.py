@@ -0,0 +1,59 @@
+# -*- coding: latin-1 -*-
+import copy
+
+import pandas as pd
+
+from senescwheat import simulation, converter
+
+from helpers import read_senescing_inputs
+
+"""
+    test_events
+    ~~~~~~~~~~~
+
+    Test the log of the senescence events of the elements.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_event_log():
+    inputs = read_senescing_inputs(nb_plants=2)
+    for axis_inputs in inputs['axes'].values():
+        axis_inputs['delta_teq'] *= 20
+    # the senescence of the last blade of the first plant is triggered by its proteins
+    inputs['elements'][(1, 'MS', 10, 'blade', 'LeafElement1')]['max_proteins'] = 5000.
+
+    # reference: run step by step
+    desired_simulation = simulation.Simulation(delta_t=3600, record_events=True)
+    desired_simulation.initialize(copy.deepcopy(inputs))
+    for t in range(10):
+        desired_simulation.run(t=t)
+        desired_simulation.apply_outputs()
+    desired_events_df = desired_simulation.event_log.to_dataframe()
+    assert set(desired_events_df.event) == {'senescence_proteins', 'senescence_age', 'max_proteins_overwritten', 'over'}
+    # the senescence starts once by element, and each element ends once
+    assert not desired_events_df[desired_events_df.event.str.startswith('senescence')].duplicated(converter.ELEMENTS_TOPOLOGY_COLUMNS).any()
+    assert not desired_events_df[desired_events_df.event == 'over'].duplicated(converter.ELEMENTS_TOPOLOGY_COLUMNS).any()
+
+    for run_kwargs in ({}, {'nb_threads': 2, 'chunk_size': 3}, {'nb_workers': 2}):
+        simulation_ = simulation.Simulation(delta_t=3600, record_events=True)
+        simulation_.initialize(copy.deepcopy(inputs))
+        simulation_.run_steps(4, **run_kwargs)
+        simulation_.run_steps(6, t=4, **run_kwargs)
+        pd.testing.assert_frame_equal(simulation_.event_log.to_dataframe(), desired_events_df)
+
+    # no event is recorded by default
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(inputs))
+    simulation_.run_steps(10)
+    assert simulation_.event_log is None
+
+
+if __name__ == '__main__':
+    test_event_log()
@@ -0,0 +1,68 @@
+# -*- coding: latin-1 -*-
+import copy
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import simulation, converter, forcing
+
+from helpers import read_senescing_inputs, assert_outputs_equal
+
+"""
+    test_forcing
+    ~~~~~~~~~~~~
+
+    Test the forced green area of the elements.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_forced_green_area():
+    inputs = read_senescing_inputs(nb_plants=2)
+    # observed kinetics of two blades, the first one is not observed at the times 3 and 4
+    observations = []
+    for element_id in ((1, 'MS', 5, 'blade', 'LeafElement1'), (2, 'MS', 8, 'blade', 'LeafElement1')):
+        initial_green_area = inputs['elements'][element_id]['green_area']
+        for t in range(10):
+            if element_id[0] == 1 and t in (3, 4):
+                continue
+            observations.append((t,) + element_id + (initial_green_area * (1 - 0.05 * (t + 1)),))
+    observations_df = pd.DataFrame(observations, columns=[converter.TIME_COLUMN] + converter.ELEMENTS_TOPOLOGY_COLUMNS + ['green_area'])
+    forced_green_area = forcing.ForcedGreenArea(observations_df)
+    assert forced_green_area.get(2, (1, 'MS', 5, 'blade', 'LeafElement1')) == observations_df.green_area.iloc[2]
+    assert np.isnan(forced_green_area.get(3, (1, 'MS', 5, 'blade', 'LeafElement1')))
+    assert np.isnan(forced_green_area.get(20, (1, 'MS', 5, 'blade', 'LeafElement1')))
+
+    # reference: run step by step
+    desired_simulation = simulation.Simulation(delta_t=3600)
+    desired_simulation.initialize(copy.deepcopy(inputs))
+    desired_simulation.force_green_area(observations_df)
+    for t in range(10):
+        desired_simulation.run(t=t)
+        assert desired_simulation.outputs['elements'][(2, 'MS', 8, 'blade', 'LeafElement1')]['green_area'] == forced_green_area.get(t, (2, 'MS', 8, 'blade', 'LeafElement1'))
+        desired_simulation.apply_outputs()
+
+    for run_kwargs in ({}, {'nb_threads': 2, 'chunk_size': 3}, {'nb_workers': 2}):
+        simulation_ = simulation.Simulation(delta_t=3600)
+        simulation_.initialize(copy.deepcopy(inputs))
+        simulation_.force_green_area(observations_df)
+        simulation_.run_steps(5, **run_kwargs)
+        simulation_.run_steps(5, t=5, **run_kwargs)
+        assert_outputs_equal(simulation_.outputs, desired_simulation.outputs)
+
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(inputs))
+    simulation_.force_green_area(observations_df)
+    for _ in simulation_.iter_run([{}] * 10):
+        pass
+    assert_outputs_equal(simulation_.outputs, desired_simulation.outputs)
+
+
+if __name__ == '__main__':
+    test_forced_green_area()
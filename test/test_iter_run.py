@@ -0,0 +1,68 @@
+# -*- coding: latin-1 -*-
+import copy
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import simulation, converter
+
+from helpers import read_senescing_inputs, assert_outputs_equal
+
+"""
+    test_iter_run
+    ~~~~~~~~~~~~~
+
+    Test the runs of the engine over a series of axes forcings.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_iter_run():
+    inputs = read_senescing_inputs(nb_plants=2)
+    # a forcing series where the temperature-compensated time of the plant 2 changes at each step
+    forcings_df = pd.DataFrame([(t, plant, 'MS', 3600. * (1 + 0.05 * t * (plant - 1)), 3600.) for t in range(20) for plant in (1, 2)],
+                               columns=[converter.TIME_COLUMN] + converter.AXES_TOPOLOGY_COLUMNS + ['delta_teq', 'delta_teq_roots'])
+    # reference: run step by step, patching the axes inputs by hand
+    desired_simulation = simulation.Simulation(delta_t=3600)
+    desired_simulation.initialize(copy.deepcopy(inputs))
+    desired_outputs = []
+    for axes_forcings in converter.iter_axes_forcings(forcings_df):
+        for axis_id, axis_forcings in axes_forcings.items():
+            desired_simulation.inputs['axes'][axis_id].update(axis_forcings)
+        desired_simulation.run()
+        desired_outputs.append(copy.deepcopy(desired_simulation.outputs))
+        desired_simulation.apply_outputs()
+
+    simulation_ = simulation.Simulation(delta_t=3600, aggregations=simulation.DEFAULT_AGGREGATIONS)
+    simulation_.initialize(copy.deepcopy(inputs))
+    for step_outputs in simulation_.iter_run(converter.iter_axes_forcings(forcings_df)):
+        actual_outputs = step_outputs.to_dict()
+        assert_outputs_equal(actual_outputs, desired_outputs[step_outputs.step])
+        roots_df, elements_df = step_outputs.to_dataframes()
+        desired_roots_df, _, desired_elements_df = converter.to_dataframes(dict(actual_outputs, axes={}))
+        pd.testing.assert_frame_equal(roots_df, desired_roots_df, check_dtype=False)
+        pd.testing.assert_frame_equal(elements_df, desired_elements_df[elements_df.columns], check_dtype=False)
+        np.testing.assert_allclose(step_outputs.aggregates['green_area'], elements_df.groupby(converter.AXES_TOPOLOGY_COLUMNS).green_area.sum().values)
+    assert step_outputs.step == 19
+    assert simulation_.inputs['axes'][(2, 'MS')]['delta_teq'] == forcings_df.delta_teq.iloc[-1]
+    assert_outputs_equal(simulation_.outputs, desired_simulation.outputs)
+
+    # the generator can be stopped before the end of the forcings
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(inputs))
+    steps = simulation_.iter_run(converter.iter_axes_forcings(forcings_df))
+    for step_outputs in steps:
+        if step_outputs.step == 4:
+            break
+    steps.close()
+    assert_outputs_equal(simulation_.outputs, desired_outputs[4])
+
+
+if __name__ == '__main__':
+    test_iter_run()
@@ -0,0 +1,86 @@
+# -*- coding: latin-1 -*-
+import itertools
+
+import numpy as np
+
+from senescwheat import model, parameters
+
+"""
+    test_model
+    ~~~~~~~~~~
+
+    Test the functions of the model of senescence on batches of elements against the same functions on scalars.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+DELTA_T = 3600
+
+
+def grid(**values):
+    """Return the combinations of the values, as one array by argument."""
+    names = sorted(values)
+    combinations = list(itertools.product(*[values[name] for name in names]))
+    return {name: np.array([combination[position] for combination in combinations]) for position, name in enumerate(names)}
+
+
+def assert_same_results(function, batch):
+    """Check that `function` called on `batch` gives the results of `function` called on each element of `batch`."""
+    batch_results = function(**batch)
+    if not isinstance(batch_results, tuple):
+        batch_results = (batch_results,)
+    for row in range(len(next(iter(batch.values())))):
+        scalar_results = function(**{name: values[row].item() for name, values in batch.items()})
+        if not isinstance(scalar_results, tuple):
+            scalar_results = (scalar_results,)
+        for batch_result, scalar_result in zip(batch_results, scalar_results):
+            assert batch_result.shape == batch[next(iter(batch))].shape
+            assert batch_result[row] == scalar_result
+
+
+def test_batches():
+    organs = ['blade', 'internode', 'sheath']
+    proteins = [0., 200., 1000.]
+    max_proteins = [0., 500., 900.]
+    assert_same_results(model.SenescenceModel.calculate_relative_delta_green_area,
+                        grid(organ_name=organs, prev_green_area=[1E-6, 1E-3], proteins=proteins, max_proteins=max_proteins, delta_t=[DELTA_T], update_max_protein=[False, True]))
+    assert_same_results(model.SenescenceModel.calculate_relative_delta_senesced_length,
+                        grid(organ_name=organs, prev_senesced_length=[0., 0.1], length=[0.1, 0.3], proteins=proteins, max_proteins=max_proteins, delta_t=[DELTA_T],
+                             update_max_protein=[False, True]))
+    assert_same_results(model.SenescenceModel.calculate_if_element_is_over,
+                        grid(green_area=[0., parameters.MIN_GREEN_AREA, 1E-3], is_growing=[False, True], mstruct=[0., 0.01]))
+    assert_same_results(model.SenescenceModel.calculate_remobilisation_proteins,
+                        grid(organ=organs, element_index=[1, 8, 12], proteins=proteins, relative_delta_green_area=[0., 0.1], ratio_N_mstruct_max=[0.001, 0.01, 0.03],
+                             full_remob=[False, True]))
+
+    # the parameters resolved for each element
+    assert_same_results(model.SenescenceModel.calculate_relative_delta_green_area,
+                        grid(organ_name=organs, prev_green_area=[1E-3], proteins=proteins, max_proteins=max_proteins, delta_t=[DELTA_T], update_max_protein=[True],
+                             fraction_N_max=[0.3, 0.6], senescence_max_rate=[1E-9, 1E-7]))
+    assert_same_results(model.SenescenceModel.calculate_relative_delta_senesced_length,
+                        grid(organ_name=organs, prev_senesced_length=[0.], length=[0.1], proteins=proteins, max_proteins=max_proteins, delta_t=[DELTA_T],
+                             update_max_protein=[True], fraction_N_max=[0.3, 0.6], senescence_length_max_rate=[1E-7, 1E-5]))
+    assert_same_results(model.SenescenceModel.calculate_if_element_is_over,
+                        grid(green_area=[parameters.MIN_GREEN_AREA, 1E-3], is_growing=[False], mstruct=[0.01], min_green_area=[1E-9, 1E-2]))
+    assert_same_results(model.SenescenceModel.calculate_remobilisation_proteins,
+                        grid(organ=organs, element_index=[1, 8], proteins=proteins, relative_delta_green_area=[0.1], ratio_N_mstruct_max=[0.001, 0.01, 0.03],
+                             full_remob=[False], ratio_N_mstruct=[0.005, 0.02]))
+    assert model.SenescenceModel.calculate_if_element_is_over(1E-3, False, 0.01, min_green_area=1E-2)
+
+    assert_same_results(model.SenescenceModel.calculate_roots_senescence,
+                        grid(mstruct=[0., 0.5], Nstruct=[0.01], postflowering_stages=[False, True]))
+    assert_same_results(model.SenescenceModel.calculate_delta_mstruct_shoot,
+                        grid(relative_delta_green_area=[0., 0.1], prev_mstruct=[0.01, 0.02], prev_Nstruct=[0.001]))
+
+    # the batches can mix arrays and scalars
+    new_green_area, relative_delta_green_area, _ = model.SenescenceModel.calculate_relative_delta_green_area('blade', np.array([1E-3, 2E-3]), 100., 900., DELTA_T, True)
+    assert np.array_equal(new_green_area, [1E-3 - parameters.SENESCENCE_MAX_RATE * DELTA_T, 2E-3 - parameters.SENESCENCE_MAX_RATE * DELTA_T])
+
+
+if __name__ == '__main__':
+    test_batches()
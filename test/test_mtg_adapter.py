@@ -0,0 +1,140 @@
+# -*- coding: latin-1 -*-
+import copy
+
+import pytest
+
+from senescwheat import converter, mtg_adapter, simulation
+
+from helpers import read_senescing_inputs
+
+"""
+    test_mtg_adapter
+    ~~~~~~~~~~~~~~~~
+
+    Test the exchange of the inputs and outputs of Senesc-Wheat with an MTG, with OpenAlea if it is installed,
+    and with :class:`FakeMTG` otherwise.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+class FakeMTG(object):
+    """Minimal stand-in of :class:`openalea.mtg.MTG`, with the methods used by :class:`mtg_adapter.MTGAdapter` and :func:`make_mtg` only."""
+
+    def __init__(self):
+        self.root = 0
+        self._components = {self.root: []}
+        self._labels = {self.root: None}
+        self._indices = {self.root: None}
+        self._properties = {}
+
+    def add_component(self, complex_id, label=None, index=None, **properties):
+        vid = len(self._components)
+        self._components[vid] = []
+        self._components[complex_id].append(vid)
+        self._labels[vid] = label
+        self._indices[vid] = index
+        for name, value in properties.items():
+            self._properties.setdefault(name, {})[vid] = value
+        return vid
+
+    def components_iter(self, vid):
+        return iter(self._components[vid])
+
+    def label(self, vid):
+        return self._labels[vid]
+
+    def index(self, vid):
+        return self._indices[vid]
+
+    def nb_vertices(self):
+        return len(self._components)
+
+    def properties(self):
+        return self._properties
+
+    def property(self, name):
+        return self._properties.get(name, {})
+
+    def add_property(self, name):
+        self._properties.setdefault(name, {})
+
+
+def make_mtg(inputs, g):
+    """Build the MTG of a canopy from inputs of Senesc-Wheat, in the empty MTG `g`."""
+    g.add_property(mtg_adapter.ROOTS_PROPERTY)
+    plants_vids = {}
+    for axis_id, axis_inputs in sorted(inputs['axes'].items()):
+        plant_index, axis_label = axis_id
+        if plant_index not in plants_vids:
+            plants_vids[plant_index] = g.add_component(g.root, label='plant', index=plant_index)
+        axis_vid = g.add_component(plants_vids[plant_index], label=axis_label, **axis_inputs)
+        g.property(mtg_adapter.ROOTS_PROPERTY)[axis_vid] = dict(inputs['roots'][axis_id])
+        for element_id, element_inputs in sorted(inputs['elements'].items()):
+            if element_id[:2] == axis_id:
+                metamer_vid = g.add_component(axis_vid, label='metamer', index=element_id[2])
+                organ_vid = g.add_component(metamer_vid, label=element_id[3])
+                g.add_component(organ_vid, label=element_id[4], **dict(element_inputs))
+    return g
+
+
+def check_mtg_adapter(g):
+    """Exchange the inputs and outputs of a canopy with the empty MTG `g`."""
+    inputs = read_senescing_inputs(nb_plants=2)
+    make_mtg(inputs, g)
+    adapter = mtg_adapter.MTGAdapter(g)
+    mtg_inputs = adapter.read_inputs()
+    assert sorted(mtg_inputs['elements']) == sorted(inputs['elements'])
+    for element_id, element_inputs in mtg_inputs['elements'].items():
+        assert dict(element_inputs) == {name: inputs['elements'][element_id][name] for name in converter.SENESCWHEAT_ELEMENTS_INPUTS}
+
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(mtg_inputs))
+    simulation_.run()
+    assert adapter.write_outputs(simulation_.outputs) > 0
+    # the values already in the MTG are not written again
+    assert adapter.write_outputs(simulation_.outputs) == 0
+    for element_id, element_outputs in simulation_.outputs['elements'].items():
+        element_vid = adapter.vids[element_id]
+        for name, value in element_outputs.items():
+            assert g.property(name)[element_vid] == value
+
+    # a new element is found by the next read
+    organ_vid = g.add_component(g.add_component(adapter.vids[(1, 'MS')], label='metamer', index=11), label='blade')
+    g.add_component(organ_vid, label='LeafElement1', **dict(inputs['elements'][(1, 'MS', 10, 'blade', 'LeafElement1')]))
+    assert (1, 'MS', 11, 'blade', 'LeafElement1') in adapter.read_inputs()['elements']
+
+    # the outputs of the engine are written by variable, with the values of the records of the views
+    growing_element_id = (2, 'MS', 10, 'blade', 'LeafElement1')
+    g.property('is_growing')[adapter.vids[growing_element_id]] = True
+    previous_N_content_total = g.property('N_content_total')[adapter.vids[growing_element_id]]
+    simulation_.initialize(adapter.read_inputs())
+    simulation_.run_steps(2)
+    assert adapter.write_outputs(simulation_.outputs) > 0
+    assert adapter.write_outputs(simulation_.outputs) == 0
+    for element_id, element_outputs in simulation_.outputs['elements'].items():
+        element_vid = adapter.vids[element_id]
+        for name, value in element_outputs.items():
+            assert g.property(name)[element_vid] == value
+    # the growing element does not have the output N_content_total: its value in the MTG is kept
+    assert 'N_content_total' not in simulation_.outputs['elements'][growing_element_id]
+    assert g.property('N_content_total')[adapter.vids[growing_element_id]] == previous_N_content_total
+
+
+def test_mtg_adapter():
+    openalea_mtg = pytest.importorskip('openalea.mtg')
+    check_mtg_adapter(openalea_mtg.MTG())
+
+
+def test_fake_mtg_adapter():
+    check_mtg_adapter(FakeMTG())
+
+
+if __name__ == '__main__':
+    test_mtg_adapter()
+    test_fake_mtg_adapter()
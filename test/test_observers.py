@@ -0,0 +1,104 @@
+# -*- coding: latin-1 -*-
+import copy
+
+from senescwheat import observers, simulation
+
+from helpers import read_senescing_inputs
+
+"""
+    test_observers
+    ~~~~~~~~~~~~~~
+
+    Test the observers of the steps of the engine.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def make_simulation(inputs):
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(inputs))
+    return simulation_
+
+
+def test_observers():
+    inputs = read_senescing_inputs(nb_plants=2)
+    element_id = (2, 'MS', 8, 'blade', 'LeafElement1')
+
+    # the observers see the states before and after the steps, at their period
+    observations = []
+
+    def observe_before(step, t, roots, elements):
+        observations.append(('before', step, t, elements['green_area'][elements.index[element_id]]))
+        try:
+            elements['green_area'][0] = 0.
+        except ValueError:  # the arrays are read-only
+            pass
+        else:
+            assert False
+
+    def observe_after(step, t, roots, elements):
+        observations.append(('after', step, t, elements['green_area'][elements.index[element_id]]))
+        assert 'N_content_total' in elements and 'rate_mstruct_death' in roots
+
+    simulation_ = make_simulation(inputs)
+    simulation_.add_observer(observe_before, observers.BEFORE_STEP)
+    simulation_.add_observer(observe_after, every=3)
+    simulation_.run_steps(7, t=10)
+    desired_simulation = make_simulation(inputs)
+    desired_green_area = [inputs['elements'][element_id]['green_area']]
+    for nb_steps in range(7):
+        desired_simulation.run_steps(1)
+        desired_green_area.append(desired_simulation.inputs['elements'][element_id]['green_area'])
+    desired_observations = []
+    for step in range(7):
+        desired_observations.append(('before', step, 10 + step, desired_green_area[step]))
+        if step % 3 == 0:
+            desired_observations.append(('after', step, 10 + step, desired_green_area[step + 1]))
+    assert observations == desired_observations
+    assert simulation_.inputs == desired_simulation.inputs and simulation_.observers.stopped_step is None
+    simulation_.remove_observer(observe_before)
+    simulation_.remove_observer(observe_after)
+    assert len(simulation_.observers) == 0
+
+    # stop the run when all the elements are over, the internodes being removed as they do not senesce here
+    simulation_ = make_simulation(inputs)
+    simulation_.remove_inputs({'elements': [element_id for element_id in inputs['elements'] if element_id[3] == 'internode']})
+    simulation_.add_observer(observers.stop_when_all_over)
+    simulation_.run_steps(1000)
+    stopped_step = simulation_.observers.stopped_step
+    assert 0 < stopped_step < 999
+    assert simulation_.outputs['elements'].column('is_over').all()
+    simulation_.observers.stopped_step = None
+    simulation_.run_steps(10)
+    assert simulation_.observers.stopped_step == 0
+    desired_simulation = make_simulation(inputs)
+    desired_simulation.remove_inputs({'elements': [element_id for element_id in inputs['elements'] if element_id[3] == 'internode']})
+    desired_simulation.run_steps(stopped_step)
+    assert not desired_simulation.outputs['elements'].column('is_over').all()
+
+    # stop before a step, in iter_run
+    simulation_ = make_simulation(inputs)
+    simulation_.add_observer(lambda step, t, roots, elements: step == 2, observers.BEFORE_STEP)
+    assert [step_outputs.step for step_outputs in simulation_.iter_run([{}] * 5)] == [0, 1]
+    assert simulation_.observers.stopped_step == 2
+    desired_simulation = make_simulation(inputs)
+    desired_simulation.run_steps(2)
+    assert simulation_.inputs == desired_simulation.inputs
+
+    # the observers are called in the process of the simulation
+    try:
+        simulation_.run_steps(2, nb_workers=2)
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+if __name__ == '__main__':
+    test_observers()
@@ -0,0 +1,64 @@
+# -*- coding: latin-1 -*-
+import copy
+
+import numpy as np
+
+from senescwheat import simulation, converter, engine
+
+from helpers import read_senescing_inputs, run_reference
+
+"""
+    test_outputs_variables
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the selection of the outputs variables to compute.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_outputs_variables():
+    inputs = read_senescing_inputs(nb_plants=2)
+    outputs_variables = {'green_area', 'Nresidual'}
+    computed_variables = engine.computed_variables(outputs_variables)
+    assert computed_variables['roots'] == set()
+    assert computed_variables['elements'] == {'green_area', 'senesced_length_element', 'proteins', 'mstruct', 'max_proteins', 'amino_acids', 'nitrates', 'Nstruct', 'Nresidual'}
+
+    desired_inputs = run_reference(inputs, 30)
+    simulation_ = simulation.Simulation(delta_t=3600, outputs_variables=outputs_variables)
+    simulation_.initialize(copy.deepcopy(inputs))
+    for _ in range(30):
+        simulation_.run()
+        assert simulation_.outputs['roots'] == {}
+        for element_outputs in simulation_.outputs['elements'].values():
+            assert set(element_outputs).issubset(computed_variables['elements'])
+        simulation_.apply_outputs()
+    engine_simulation = simulation.Simulation(delta_t=3600, outputs_variables=outputs_variables)
+    engine_simulation.initialize(copy.deepcopy(inputs))
+    engine_simulation.run_steps(30, nb_threads=2, chunk_size=4)
+    for element_id, desired_data in desired_inputs['elements'].items():
+        for name in computed_variables['elements']:
+            assert simulation_.inputs['elements'][element_id][name] == desired_data[name]
+            np.testing.assert_equal(engine_simulation.inputs['elements'][element_id][name], desired_data[name])
+        # the variables not needed are not computed
+        for name in ('starch', 'cytokinins'):
+            assert simulation_.inputs['elements'][element_id][name] == engine_simulation.inputs['elements'][element_id][name] == inputs['elements'][element_id][name]
+    assert 'N_content_total' not in engine_simulation.outputs['elements'][(1, 'MS', 8, 'blade', 'LeafElement1')]
+
+    _, _, elements_outputs_df = converter.to_dataframes(dict(simulation_.outputs, axes={}), outputs_variables)
+    assert list(elements_outputs_df.columns) == converter.ELEMENTS_TOPOLOGY_COLUMNS + ['Nresidual', 'green_area']
+    try:
+        simulation.Simulation(outputs_variables={'green_area', 'length'})
+    except ValueError:
+        pass
+    else:
+        assert False
+
+
+if __name__ == '__main__':
+    test_outputs_variables()
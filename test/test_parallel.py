@@ -0,0 +1,45 @@
+# -*- coding: latin-1 -*-
+import copy
+
+from senescwheat import simulation
+
+from helpers import read_senescing_inputs
+
+"""
+    test_parallel
+    ~~~~~~~~~~~~~
+
+    Test the runs of the engine split by plant between several processes.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_run_steps_parallel():
+    inputs = read_senescing_inputs(nb_plants=5)
+    simulations = []
+    # serial, with several processes, with several processes which run several threads on chunks which split the plants
+    for run_kwargs in ({}, {'nb_workers': 3}, {'nb_workers': 2, 'nb_threads': 2, 'chunk_size': 3}):
+        simulation_ = simulation.Simulation(delta_t=3600, aggregations=simulation.DEFAULT_AGGREGATIONS)
+        simulation_.initialize(copy.deepcopy(inputs))
+        aggregates_df = simulation_.run_steps(50, **run_kwargs)
+        simulations.append((simulation_, aggregates_df))
+    (serial_simulation, serial_aggregates_df) = simulations[0]
+    for parallel_simulation, parallel_aggregates_df in simulations[1:]:
+        assert parallel_simulation.outputs == serial_simulation.outputs
+        assert parallel_aggregates_df.equals(serial_aggregates_df)
+
+    # an empty canopy needs no worker
+    simulation_ = simulation.Simulation(delta_t=3600, aggregations=simulation.DEFAULT_AGGREGATIONS)
+    simulation_.initialize({'roots': {}, 'axes': {}, 'elements': {}})
+    assert simulation_.run_steps(2, nb_workers=2).empty
+    assert not simulation_.outputs['roots'] and not simulation_.outputs['elements']
+
+
+if __name__ == '__main__':
+    test_run_steps_parallel()
@@ -0,0 +1,91 @@
+# -*- coding: latin-1 -*-
+import copy
+
+import numpy as np
+
+from senescwheat import simulation, converter, engine, parameters
+
+from helpers import read_senescing_inputs, run_reference, assert_outputs_equal
+
+"""
+    test_plants_parameters
+    ~~~~~~~~~~~~~~~~~~~~~~
+
+    Test the parameters which differ from one plant to another.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_plants_parameters():
+    inputs = read_senescing_inputs(nb_plants=4)
+    groups_parameters = {'early': {'FRACTION_N_MAX': {'blade': 0.6, 'stem': 0.5}, 'SENESCENCE_LENGTH_MAX_RATE': 2 * parameters.SENESCENCE_LENGTH_MAX_RATE},
+                         'late': {'RATIO_N_MSTRUCT': {5: 0.03, 8: 0.01}, 'DEFAULT_RATIO_N_MSTRUCT': 0.01, 'AGE_EFFECT_SENESCENCE': 600}}
+    plants_groups = {1: 'early', 2: 'late', 3: 'early'}
+
+    # the reference: one simulation by group of plants, with the parameters of the group
+    desired_inputs = {'roots': {}, 'elements': {}}
+    for group in (None, 'early', 'late'):
+        group_plants = [plant for plant in range(1, 5) if plants_groups.get(plant) == group]
+        group_inputs = {inputs_type: {inputs_id: inputs_dict for inputs_id, inputs_dict in all_inputs.items() if inputs_id[0] in group_plants}
+                        for inputs_type, all_inputs in inputs.items()}
+        default_parameters = {name: getattr(parameters, name) for name in engine.PLANTS_PARAMETERS}
+        try:
+            parameters.__dict__.update(groups_parameters.get(group, {}))
+            group_desired_inputs = run_reference(group_inputs, 50)
+        finally:
+            parameters.__dict__.update(default_parameters)
+        for inputs_type in desired_inputs:
+            desired_inputs[inputs_type].update(group_desired_inputs[inputs_type])
+
+    # one simulation of the mixed canopy
+    reference_simulation = simulation.Simulation(delta_t=3600)
+    reference_simulation.set_plants_parameters(groups_parameters, plants_groups)
+    reference_simulation.initialize(copy.deepcopy(inputs))
+    for _ in range(50):
+        reference_simulation.run()
+        reference_simulation.apply_outputs()
+    assert reference_simulation.inputs['elements'] == desired_inputs['elements']
+    assert parameters.AGE_EFFECT_SENESCENCE == 450
+
+    for run_kwargs in ({}, {'nb_workers': 2}, {'nb_threads': 2, 'chunk_size': 4}):
+        simulation_ = simulation.Simulation(delta_t=3600)
+        simulation_.set_plants_parameters(groups_parameters, plants_groups)
+        simulation_.initialize(copy.deepcopy(inputs))
+        simulation_.run_steps(50, **run_kwargs)
+        for element_id, desired_data in desired_inputs['elements'].items():
+            for name in converter.SENESCWHEAT_ELEMENTS_OUTPUTS:
+                if name in desired_data and name != 'N_content_total':
+                    np.testing.assert_equal(simulation_.inputs['elements'][element_id][name], desired_data[name])
+
+    # the dictionary values are merged over the values of the module parameters
+    reference_outputs = []
+    for plant_parameters in ({'FRACTION_N_MAX': {'blade': 0.6}}, {'FRACTION_N_MAX': {'blade': 0.6, 'stem': parameters.FRACTION_N_MAX['stem']}}):
+        simulation_ = simulation.Simulation(delta_t=3600)
+        simulation_.set_plants_parameters({1: plant_parameters})
+        assert simulation_.plants_parameters[1]['FRACTION_N_MAX'] == {'blade': 0.6, 'stem': parameters.FRACTION_N_MAX['stem']}
+        simulation_.initialize(copy.deepcopy(inputs))
+        simulation_.run()
+        reference_outputs.append({outputs_type: dict(simulation_.outputs[outputs_type]) for outputs_type in ('roots', 'elements')})
+        simulation_.initialize(copy.deepcopy(inputs))
+        simulation_.run_steps(1)
+        assert_outputs_equal(simulation_.outputs, reference_outputs[-1])
+    assert reference_outputs[0] == reference_outputs[1]
+    assert parameters.FRACTION_N_MAX == {'blade': 0.5, 'stem': 0.425}
+
+    for plant_parameters in ({'N_MOLAR_MASS': 15}, {'FRACTION_N_MAX': {'leaf': 0.6}}, {'RATIO_N_MSTRUCT': {'5': 0.03}}):
+        try:
+            simulation_.set_plants_parameters({1: plant_parameters})
+        except ValueError:
+            pass
+        else:
+            assert False, plant_parameters
+
+
+if __name__ == '__main__':
+    test_plants_parameters()
@@ -0,0 +1,46 @@
+# -*- coding: latin-1 -*-
+import copy
+
+import numpy as np
+
+from senescwheat import simulation, engine
+
+from helpers import read_senescing_inputs
+
+"""
+    test_precision
+    ~~~~~~~~~~~~~~
+
+    Test the reduced precision states of the engine.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_precision_report():
+    precision_report = engine.precision_report(read_senescing_inputs(), 100)
+    assert (precision_report.max_relative_deviation < 1E-5).all()
+    full_precision = precision_report.variable.isin(engine.DEFAULT_FULL_PRECISION_VARIABLES)
+    assert (precision_report.dtype[full_precision] == 'float64').all()
+    assert (precision_report.dtype[~full_precision] == 'float32').all()
+
+    # the simulations run with a reduced precision state too, serial or with several processes
+    inputs = read_senescing_inputs(nb_plants=2)
+    desired_simulation = simulation.Simulation(delta_t=3600)
+    desired_simulation.initialize(copy.deepcopy(inputs))
+    desired_simulation.run_steps(100)
+    for run_kwargs in ({}, {'nb_workers': 2}):
+        simulation_ = simulation.Simulation(delta_t=3600)
+        simulation_.initialize(copy.deepcopy(inputs))
+        simulation_.run_steps(100, dtype=np.float32, **run_kwargs)
+        for name in ('green_area', 'mstruct', 'proteins', 'Nresidual'):
+            np.testing.assert_allclose(simulation_.outputs['elements'].column(name), desired_simulation.outputs['elements'].column(name), rtol=1E-5)
+
+
+if __name__ == '__main__':
+    test_precision_report()
@@ -0,0 +1,51 @@
+# -*- coding: latin-1 -*-
+import copy
+import pickle
+
+from senescwheat import records
+
+"""
+    test_records
+    ~~~~~~~~~~~~
+
+    Test the records which hold the inputs/outputs of Senesc-Wheat.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_element_record():
+    element_dict = {'green_area': 0.00228, 'mstruct': 0.05, 'is_growing': False, 'status': 'mature'}
+    element_record = records.ElementRecord(element_dict)
+    # the record behaves like the dictionary it was created from
+    assert element_record == element_dict
+    assert len(element_record) == len(element_dict)
+    assert 'status' in element_record and 'proteins' not in element_record
+    assert element_record.get('proteins', 0) == 0
+    element_record['senesced_mstruct'] = 0
+    element_record['mstruct'] += 0.01
+    del element_record['status']
+    assert dict(element_record) == {'green_area': 0.00228, 'mstruct': 0.060000000000000005, 'is_growing': False, 'senesced_mstruct': 0}
+    # variables of Senesc-Wheat are stored in slots
+    assert not hasattr(element_record, '__dict__')
+    assert element_record._extra == {}
+    # copies are independent
+    for element_record_copy in (element_record.copy(), copy.deepcopy(element_record), pickle.loads(pickle.dumps(element_record))):
+        assert element_record_copy == element_record
+        element_record_copy['green_area'] = 0
+        assert element_record['green_area'] == 0.00228
+    # the records with the same variables and values have the same key
+    element_record['status'] = 'senescent'
+    assert element_record.copy().values_key() == element_record.values_key()
+    assert records.ElementRecord(element_record, mstruct=0).values_key() != element_record.values_key()
+    del element_record['senesced_mstruct']
+    assert records.ElementRecord(element_record, senesced_mstruct=0).values_key() != element_record.values_key()
+
+
+if __name__ == '__main__':
+    test_element_record()
@@ -0,0 +1,80 @@
+# -*- coding: latin-1 -*-
+import copy
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import converter, replay, simulation
+
+from helpers import read_senescing_inputs
+
+"""
+    test_replay
+    ~~~~~~~~~~~
+
+    Test the replay of prescribed trajectories of the inputs.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+#: the outputs of the elements computed by :meth:`simulation.Simulation.run`
+ELEMENTS_OUTPUTS = converter.SENESCWHEAT_ELEMENTS_OUTPUTS + ['max_proteins']
+
+
+def record_run(nb_steps, **run_kwargs):
+    """Run Senesc-Wheat step by step with a varying temperature-compensated time, and record the inputs and the outputs of each step."""
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(read_senescing_inputs(nb_plants=2)))
+    all_inputs_dfs = ([], [], [])
+    all_outputs_dfs = ([], [])
+    for t in range(nb_steps):
+        for axis_inputs in simulation_.inputs['axes'].values():
+            axis_inputs['delta_teq'] *= 1.2
+        for inputs_dfs, inputs_df in zip(all_inputs_dfs, converter.to_dataframes(simulation_.inputs)):
+            inputs_df.insert(0, converter.TIME_COLUMN, t)
+            inputs_dfs.append(inputs_df)
+        simulation_.run(**run_kwargs)
+        roots_outputs_df, _, elements_outputs_df = converter.to_dataframes(dict(simulation_.outputs, axes={}))
+        for outputs_dfs, outputs_df in zip(all_outputs_dfs, (roots_outputs_df, elements_outputs_df)):
+            outputs_df.insert(0, converter.TIME_COLUMN, t)
+            outputs_dfs.append(outputs_df)
+        simulation_.apply_outputs()
+    return [pd.concat(inputs_dfs, ignore_index=True) for inputs_dfs in all_inputs_dfs], [pd.concat(outputs_dfs, ignore_index=True) for outputs_dfs in all_outputs_dfs]
+
+
+def assert_replayed(replayed_df, desired_df, outputs_names):
+    assert len(replayed_df) == len(desired_df)
+    for column in [converter.TIME_COLUMN] + outputs_names:
+        replayed_values, desired_values = replayed_df[column].values, desired_df[column].values
+        if column == 'N_content_total':
+            # the records of the elements which are over keep the N content of their inputs
+            senescing = ~np.isnan(replayed_values)
+            replayed_values, desired_values = replayed_values[senescing], desired_values[senescing]
+        np.testing.assert_array_equal(replayed_values.astype(desired_values.dtype), desired_values, err_msg=column)
+
+
+def test_replay():
+    for run_kwargs in ({}, {'postflowering_stages': True}):
+        (roots_inputs_df, axes_inputs_df, elements_inputs_df), (desired_roots_outputs_df, desired_elements_outputs_df) = record_run(30, **run_kwargs)
+        roots_outputs_df, elements_outputs_df = replay.replay(roots_inputs_df, axes_inputs_df, elements_inputs_df, **run_kwargs)
+        assert_replayed(roots_outputs_df, desired_roots_outputs_df, converter.SENESCWHEAT_ROOTS_OUTPUTS)
+        assert_replayed(elements_outputs_df, desired_elements_outputs_df, ELEMENTS_OUTPUTS)
+
+        # the recursive variables are read from the inputs at the first time only
+        for name in replay.RECURSIVE_VARIABLES:
+            elements_inputs_df.loc[elements_inputs_df[converter.TIME_COLUMN] > 0, name] = np.nan
+        _, elements_outputs_df = replay.replay(roots_inputs_df, axes_inputs_df, elements_inputs_df, **run_kwargs)
+        assert_replayed(elements_outputs_df, desired_elements_outputs_df, ELEMENTS_OUTPUTS)
+
+        # without recursive variables, each time is computed from its inputs only
+        _, elements_outputs_df = replay.replay(roots_inputs_df, axes_inputs_df, elements_inputs_df, recursive_variables=[], **run_kwargs)
+        assert np.isnan(elements_outputs_df.loc[elements_outputs_df[converter.TIME_COLUMN] > 0, 'max_proteins']).all()
+
+
+if __name__ == '__main__':
+    test_replay()
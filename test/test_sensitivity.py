@@ -0,0 +1,50 @@
+# -*- coding: latin-1 -*-
+import numpy as np
+
+from senescwheat import sensitivity
+
+from helpers import read_senescing_inputs
+
+"""
+    test_sensitivity
+    ~~~~~~~~~~~~~~~~
+
+    Test the sensitivity analysis of Senesc-Wheat.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+PROBLEM = {'SENESCENCE_LENGTH_MAX_RATE': (1E-7, 5E-7),
+           'FRACTION_N_MAX.blade': (0.3, 0.6),
+           'AGE_EFFECT_SENESCENCE': (400, 600),
+           'SENESCENCE_ROOTS_PREFLOWERING': (0, 5E-7)}
+
+
+def test_morris():
+    indices = sensitivity.morris(read_senescing_inputs(), PROBLEM, nb_trajectories=10, seed=0, nb_steps=24, chunk_size=7)
+    assert len(indices) == len(sensitivity.OUTPUTS) * len(PROBLEM)
+    green_area_indices = indices[indices.output == 'green_area'].set_index('parameter')
+    # faster senescence decreases the green area, later age-induced senescence increases it
+    assert green_area_indices.mu['SENESCENCE_LENGTH_MAX_RATE'] < 0
+    assert green_area_indices.mu['AGE_EFFECT_SENESCENCE'] > 0
+    # only the root turnover changes the senesced mstruct of the roots
+    roots_indices = indices[indices.output == 'roots_senesced_mstruct'].set_index('parameter')
+    assert roots_indices.mu['SENESCENCE_ROOTS_PREFLOWERING'] > 0
+    assert (roots_indices.mu_star.drop('SENESCENCE_ROOTS_PREFLOWERING') == 0).all()
+
+
+def test_sobol():
+    problem = {'SENESCENCE_LENGTH_MAX_RATE': PROBLEM['SENESCENCE_LENGTH_MAX_RATE']}
+    indices = sensitivity.sobol(read_senescing_inputs(), problem, nb_samples=512, seed=0, outputs=('green_area',), nb_steps=24, chunk_size=50)
+    # only one parameter: it explains all the variance
+    np.testing.assert_allclose(indices[['S1', 'ST']].values, 1, atol=0.1)
+
+
+if __name__ == '__main__':
+    test_morris()
+    test_sobol()
@@ -0,0 +1,86 @@
+# -*- coding: latin-1 -*-
+import copy
+import shutil
+import tempfile
+
+from senescwheat import simulation, spinup
+
+from helpers import read_senescing_inputs, assert_outputs_equal
+
+"""
+    test_spinup
+    ~~~~~~~~~~~
+
+    Test the forks of a simulation and the cache of the spin-ups.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_fork():
+    inputs = read_senescing_inputs(nb_plants=2)
+    parent_simulation = simulation.Simulation(delta_t=3600, record_events=True)
+    parent_simulation.initialize(copy.deepcopy(inputs))
+    parent_simulation.run_steps(10)
+    parent_inputs = copy.deepcopy(parent_simulation.inputs)
+    parent_nb_events = len(parent_simulation.event_log)
+
+    postflowering_simulation = parent_simulation.fork()
+    postflowering_simulation.run_steps(10, postflowering_stages=True, t=10)
+    default_simulation = parent_simulation.fork()
+    default_simulation.run_steps(10, t=10)
+
+    # the children share the records of the parent until they update them
+    assert postflowering_simulation.inputs['elements'] is not parent_simulation.inputs['elements']
+    assert parent_simulation.inputs == parent_inputs
+    assert len(parent_simulation.event_log) == parent_nb_events
+    assert postflowering_simulation.inputs['elements'] != default_simulation.inputs['elements']
+
+    # a driver running the steps of a fork one by one does not change the parent either
+    stepped_simulation = parent_simulation.fork()
+    for t in range(10, 13):
+        stepped_simulation.run(t=t)
+        stepped_simulation.apply_outputs()
+    assert parent_simulation.inputs == parent_inputs
+    assert stepped_simulation.inputs['elements'] != parent_inputs['elements']
+
+    desired_simulation = simulation.Simulation(delta_t=3600, record_events=True)
+    desired_simulation.initialize(copy.deepcopy(inputs))
+    desired_simulation.run_steps(20)
+    assert_outputs_equal(default_simulation.outputs, desired_simulation.outputs)
+    assert default_simulation.event_log.to_dataframe().equals(desired_simulation.event_log.to_dataframe())
+
+
+def test_spin_up_cache():
+    inputs = read_senescing_inputs(nb_plants=2)
+    cache_dirpath = tempfile.mkdtemp()
+    try:
+        spin_ups = []
+        for nb_steps in (10, 10, 5):
+            spin_up_cache = spinup.SpinUpCache(cache_dirpath)
+            simulation_ = simulation.Simulation(delta_t=3600)
+            simulation_.initialize(copy.deepcopy(inputs))
+            loaded = spin_up_cache.spin_up(simulation_, nb_steps, nb_threads=2)
+            spin_ups.append((loaded, simulation_))
+        (first_loaded, first_simulation), (second_loaded, second_simulation), (third_loaded, _) = spin_ups
+        assert not first_loaded and second_loaded and not third_loaded
+        assert second_simulation.inputs == first_simulation.inputs
+        assert_outputs_equal(second_simulation.outputs, first_simulation.outputs)
+
+        # the state depends on the arguments of the spin-up
+        simulation_ = simulation.Simulation(delta_t=3600)
+        simulation_.initialize(copy.deepcopy(inputs))
+        assert not spin_up_cache.spin_up(simulation_, 10, postflowering_stages=True)
+        assert spin_up_cache.statistics == {'hits': 0, 'misses': 2}
+    finally:
+        shutil.rmtree(cache_dirpath)
+
+
+if __name__ == '__main__':
+    test_fork()
+    test_spin_up_cache()
@@ -0,0 +1,39 @@
+# -*- coding: latin-1 -*-
+import copy
+
+from senescwheat import simulation
+
+from helpers import read_senescing_inputs
+
+"""
+    test_threads
+    ~~~~~~~~~~~~
+
+    Test the runs of the engine by chunks of elements computed by several threads.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_run_steps_threads():
+    inputs = read_senescing_inputs(nb_plants=5)
+    simulations = []
+    # serial, with several threads on chunks which split the plants, with one chunk by thread
+    for run_kwargs in ({}, {'nb_threads': 3, 'chunk_size': 4}, {'nb_threads': 2}):
+        simulation_ = simulation.Simulation(delta_t=3600, aggregations=simulation.DEFAULT_AGGREGATIONS)
+        simulation_.initialize(copy.deepcopy(inputs))
+        aggregates_df = simulation_.run_steps(50, **run_kwargs)
+        simulations.append((simulation_, aggregates_df))
+    (serial_simulation, serial_aggregates_df) = simulations[0]
+    for threads_simulation, threads_aggregates_df in simulations[1:]:
+        assert threads_simulation.outputs == serial_simulation.outputs
+        assert threads_aggregates_df.equals(serial_aggregates_df)
+
+
+if __name__ == '__main__':
+    test_run_steps_threads()
@@ -0,0 +1,72 @@
+# -*- coding: latin-1 -*-
+import copy
+
+import numpy as np
+import pandas as pd
+
+from senescwheat import simulation
+
+from helpers import read_senescing_inputs
+
+"""
+    test_update_inputs
+    ~~~~~~~~~~~~~~~~~~
+
+    Test the updates of the inputs of a simulation.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_update_inputs():
+    inputs = read_senescing_inputs(nb_plants=2)
+    element_id = (1, 'MS', 8, 'blade', 'LeafElement1')
+    new_element_id = (2, 'MS', 11, 'blade', 'LeafElement1')
+    desired_inputs = copy.deepcopy(inputs)
+    desired_inputs['elements'][element_id]['proteins'] = 10.
+    desired_inputs['axes'][(2, 'MS')]['delta_teq'] = 1800.
+    desired_inputs['elements'][new_element_id] = desired_inputs['elements'].pop((2, 'MS', 10, 'blade', 'LeafElement1'))
+    desired_simulation = simulation.Simulation(delta_t=3600)
+    desired_simulation.initialize(desired_inputs)
+    desired_simulation.run()
+
+    parent_simulation = simulation.Simulation(delta_t=3600)
+    parent_simulation.initialize(copy.deepcopy(inputs))
+    simulation_ = parent_simulation.fork()
+    simulation_.update_inputs({'elements': {element_id: {'proteins': 10.}},
+                               'axes': pd.DataFrame({'plant': [1, 2], 'axis': ['MS', 'MS'], 'delta_teq': [np.nan, 1800.]})})
+    simulation_.add_inputs({'elements': {new_element_id: inputs['elements'][(2, 'MS', 10, 'blade', 'LeafElement1')]}})
+    simulation_.remove_inputs({'elements': [(2, 'MS', 10, 'blade', 'LeafElement1')]})
+    # the outputs and the other variables of the records can be updated too
+    simulation_.update_inputs({'roots': {(1, 'MS'): {'rate_mstruct_death': 0.}}, 'elements': {element_id: {'senesced_length': 0}}})
+    simulation_.run()
+    assert simulation_.outputs == desired_simulation.outputs
+    # the records shared with the parent simulation are not updated
+    assert parent_simulation.inputs == inputs
+
+    for method, arguments in ((simulation_.update_inputs, {'elements': {(3, 'MS', 8, 'blade', 'LeafElement1'): {'proteins': 10.}}}),
+                              (simulation_.remove_inputs, {'elements': [(2, 'MS', 10, 'blade', 'LeafElement1')]})):
+        try:
+            method(arguments)
+        except KeyError:
+            pass
+        else:
+            assert False
+    for method, arguments in ((simulation_.update_inputs, {'elements': {element_id: {'protiens': 10.}}}),
+                              (simulation_.add_inputs, {'elements': {element_id: inputs['elements'][element_id]}}),
+                              (simulation_.add_inputs, {'elements': {new_element_id + ('bis',): {'proteins': 10.}}})):
+        try:
+            method(arguments)
+        except ValueError:
+            pass
+        else:
+            assert False
+
+
+if __name__ == '__main__':
+    test_update_inputs()
@@ -0,0 +1,87 @@
+# -*- coding: latin-1 -*-
+import copy
+
+import pandas as pd
+
+from senescwheat import converter, engine, parameters, simulation, verification
+
+from helpers import read_senescing_inputs
+
+"""
+    test_verification
+    ~~~~~~~~~~~~~~~~~
+
+    Test the verification of samples of the elements computed by the engine against the reference simulation.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def make_simulation(inputs, reference_verifier):
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(inputs))
+    simulation_.reference_verifier = reference_verifier
+    return simulation_
+
+
+def test_reference_verifier():
+    inputs = read_senescing_inputs(nb_plants=3)
+
+    # the engine matches the reference, with forced green area, parameters by plant and forced max proteins
+    simulation_ = make_simulation(inputs, verification.ReferenceVerifier(sample_size=4, seed=1))
+    element_id = (2, 'MS', 8, 'blade', 'LeafElement1')
+    simulation_.force_green_area(pd.DataFrame([(t,) + element_id + (inputs['elements'][element_id]['green_area'] * (1 - 0.05 * t),) for t in range(10)],
+                                              columns=[converter.TIME_COLUMN] + converter.ELEMENTS_TOPOLOGY_COLUMNS + ['green_area']))
+    simulation_.set_plants_parameters({'early': {'FRACTION_N_MAX': {'blade': 0.6, 'stem': 0.5}, 'AGE_EFFECT_SENESCENCE': 600}}, {1: 'early'})
+    simulation_.run_steps(80, forced_max_protein_elements={(3, 'MS', 8, 'blade', 'LeafElement1')})
+    for _ in simulation_.iter_run([{}] * 10, postflowering_stages=True, t=80):
+        pass
+    reference_verifier = simulation_.reference_verifier
+    assert (reference_verifier.nb_checked_steps, reference_verifier.nb_checked_elements) == (90, 360)
+    assert reference_verifier.roots_mismatches == reference_verifier.elements_mismatches == []
+
+    # one step out of 4, in worker processes
+    simulation_ = make_simulation(inputs, verification.ReferenceVerifier(sampling=4))
+    simulation_.run_steps(30, nb_workers=2)
+    assert (simulation_.reference_verifier.nb_steps, simulation_.reference_verifier.nb_checked_steps) == (30, 8)
+    assert simulation_.reference_verifier.elements_mismatches == []
+
+    # a step of the engine which differs from the reference
+    reference_verifier = verification.ReferenceVerifier(sample_size=100)
+    roots_state = engine.RootsState.from_dict(inputs['roots'])
+    elements_state = engine.ElementsState.from_dict(inputs['elements'])
+    roots_delta_teq = engine.axes_forcings(inputs['axes'], roots_state.axes_ids, 'delta_teq_roots')
+    elements_delta_teq = engine.axes_forcings(inputs['axes'], elements_state.axes_ids, 'delta_teq')
+    sample = reference_verifier.sample(7, roots_state, elements_state, roots_delta_teq, elements_delta_teq)
+    assert set(sample['inputs']['elements']) == set(inputs['elements'])
+    rate_mstruct_death, N_content_total = next(engine.iter_steps(roots_state, elements_state, roots_delta_teq, elements_delta_teq, engine.resolve_parameters(elements_state)))
+    elements_state.columns['proteins'][elements_state.index[element_id]] *= 1 + 1E-6
+    assert reference_verifier.check(sample, roots_state, elements_state, rate_mstruct_death, N_content_total) == 1
+    _, elements_mismatches_df = reference_verifier.to_dataframes()
+    assert list(elements_mismatches_df.iloc[0][['t', 'plant', 'axis', 'metamer', 'organ', 'element', 'variable']]) == [7] + list(element_id) + ['proteins']
+    assert elements_mismatches_df.context[0]['proteins'] == inputs['elements'][element_id]['proteins']
+    assert verification.ReferenceVerifier(rtol=1E-5).check(sample, roots_state, elements_state, rate_mstruct_death, N_content_total) == 0
+    try:
+        verification.ReferenceVerifier(strict=True).check(sample, roots_state, elements_state, rate_mstruct_death, N_content_total)
+    except ValueError as error:
+        assert str(element_id) in str(error)
+    else:
+        assert False
+
+    # half of the sample is drawn from the edge cases
+    for edge_case_id in (element_id, (1, 'MS', 5, 'blade', 'LeafElement1'), (3, 'MS', 10, 'blade', 'LeafElement1')):
+        elements_state.columns['max_proteins'][elements_state.index[edge_case_id]] = 0
+    is_edge_case = verification.edge_cases(elements_state)
+    assert is_edge_case.sum() == 3
+    sample = verification.ReferenceVerifier(sample_size=4).sample(8, roots_state, elements_state, roots_delta_teq, elements_delta_teq)
+    assert sum(is_edge_case[elements_state.index[sampled_id]] for sampled_id in sample['inputs']['elements']) == 2
+    assert parameters.FRACTION_N_MAX['blade'] == 0.5  # the parameters of the plants are restored
+
+
+if __name__ == '__main__':
+    test_reference_verifier()
@@ -0,0 +1,88 @@
+# -*- coding: latin-1 -*-
+import copy
+
+import numpy as np
+
+from senescwheat import converter, simulation, views
+
+from helpers import read_senescing_inputs
+
+"""
+    test_views
+    ~~~~~~~~~~
+
+    Test the lazy views on the outputs of the engine.
+
+    You must first install :mod:`senescwheat` (and add it to your PYTHONPATH)
+    before running this script with the command `python`.
+
+    :copyright: Copyright 2014-2016 INRA-ECOSYS, see AUTHORS.
+    :license: see LICENSE for details.
+
+"""
+
+
+def test_outputs_view():
+    inputs = read_senescing_inputs(nb_plants=2)
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(inputs))
+    simulation_.run_steps(20)
+    all_elements_outputs = simulation_.outputs['elements']
+    assert isinstance(all_elements_outputs, views.OutputsView)
+
+    # the view behaves like the dictionary of the records
+    all_elements_outputs_dict = {element_id: element_outputs for element_id, element_outputs in all_elements_outputs.items()}
+    assert all_elements_outputs == all_elements_outputs_dict
+    assert len(all_elements_outputs) == len(all_elements_outputs_dict)
+    element_id = (2, 'MS', 8, 'blade', 'LeafElement1')
+    assert element_id in all_elements_outputs and (3, 'MS', 8, 'blade', 'LeafElement1') not in all_elements_outputs
+    assert all_elements_outputs[element_id] == all_elements_outputs_dict[element_id]
+    assert 'N_content_total' in all_elements_outputs[element_id]
+
+    # bulk access to the columns
+    green_area = all_elements_outputs.column('green_area')
+    assert list(green_area) == [all_elements_outputs_dict[element_id]['green_area'] for element_id in all_elements_outputs]
+    assert np.array_equal(simulation_.outputs['roots'].column('rate_mstruct_death'),
+                          [roots_outputs['rate_mstruct_death'] for roots_outputs in simulation_.outputs['roots'].values()])
+    try:
+        all_elements_outputs.column('unknown')
+    except KeyError:
+        pass
+    else:
+        assert False
+
+    # the dataframes of the views are the dataframes of the records
+    all_outputs_dict = {'roots': dict(simulation_.outputs['roots'].items()), 'axes': {}, 'elements': all_elements_outputs_dict}
+    for actual_df, desired_df in zip(converter.to_dataframes(dict(simulation_.outputs, axes={})), converter.to_dataframes(all_outputs_dict)):
+        assert actual_df.equals(desired_df)
+
+    # the views are not changed by the next steps, and their records are removed with the inputs
+    child_simulation = simulation_.fork()
+    child_simulation.run_steps(5, t=20)
+    assert child_simulation.outputs['elements'] != all_elements_outputs
+    assert simulation_.outputs['elements'] == all_elements_outputs_dict
+    simulation_.remove_inputs({'elements': [element_id]})
+    assert element_id not in simulation_.outputs['elements'] and len(simulation_.outputs['elements']) == len(all_elements_outputs_dict) - 1
+
+
+def test_update_records():
+    inputs = read_senescing_inputs(nb_plants=2)
+    simulation_ = simulation.Simulation(delta_t=3600)
+    simulation_.initialize(copy.deepcopy(inputs))
+    simulation_.run_steps(5)
+    all_elements_outputs = simulation_.outputs['elements']
+
+    # the records are updated column by column, and replaced by updated copies
+    all_elements_records = {element_id: inputs['elements'][element_id] for element_id in all_elements_outputs}
+    all_elements_records_before = copy.deepcopy(all_elements_records)
+    all_elements_outputs.update_records(all_elements_records)
+    for element_id, element_outputs in all_elements_outputs.items():
+        assert all_elements_records[element_id] is not inputs['elements'][element_id]
+        assert inputs['elements'][element_id] == all_elements_records_before[element_id]
+        assert all_elements_records[element_id] == dict(all_elements_records_before[element_id], **element_outputs)
+        assert all_elements_records[element_id] == simulation_.inputs['elements'][element_id]
+
+
+if __name__ == '__main__':
+    test_outputs_view()
+    test_update_records()